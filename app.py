@@ -2,21 +2,35 @@ import os
 import csv
 import cv2
 import numpy as np
-import face_recognition
-import pickle
 import time
 import sqlite3
 import hashlib
 import secrets
+import atexit
 import smtplib
+import json
+import queue
+import random
 from datetime import datetime, date, time as dtime, timedelta
 from flask import Flask, Response, jsonify, request, send_from_directory, session, redirect, url_for
 from flask_cors import CORS
-from threading import Thread
+from threading import Thread, Lock, Condition, Event
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from itsdangerous import URLSafeTimedSerializer
 from flask import render_template_string # String se HTML render karne ke liye
+from face_matcher import FaceMatcher
+from encodings_store import DEFAULT_STORE_PATH, write_store
+from consolidate import TEMPLATES_STORE_PATH, read_gallery, write_templates
+from recognition_pool import create_backend
+from recognition import AdaptiveScheduler, MotionGate, FaceTracker
+from attendance_sink import AttendanceSinkError, SqliteAttendanceSink
+from camera_inventory import CameraInventory, fourcc_to_str
+from roster import Roster, AmbiguousRollNumber
+from gallery import GallerySnapshot, GalleryWatcher, load_snapshot, select_source, file_signature, compact_snapshot
+from enrollment import EnrollmentEncoder, safe_student_name, save_images
+import db
 
 # Email Configuration
 EMAIL_CONFIG = {
@@ -27,6 +41,151 @@ EMAIL_CONFIG = {
     'from_name': 'Face Attendance System'
 }
 
+# Face matching configuration
+# index: 'exact' (linear scan), 'ivf' (k-means partitioned) or 'auto' (ivf once gallery >= ivf_threshold)
+# nprobe: IVF partitions scanned per face -- higher = better recall, lower = faster
+MATCHER_CONFIG = {
+    'tolerance': 0.5,
+    'index': 'auto',
+    'ivf_threshold': 10000,
+    'nlist': None,  # None = sqrt(gallery size)
+    'nprobe': 8,
+    'exact_fallback': False,  # True = har 'Unknown' (har stranger bhi) par poora exact scan
+    'recall_sample': 200,  # har 200th match exact scan se compare; observed recall stats me
+}
+
+# Gallery hot-reload: encodings file badli to background me naya snapshot load hota hai
+GALLERY_CONFIG = {
+    'watch': True,
+    'poll_interval': 2.0,   # seconds; file ek poll tak stable rahe tabhi reload
+}
+
+# Online enrollment (/api/enroll): naye faces store ke log me append hote hain,
+# poora gallery dobara encode/index nahi hota
+ENROLLMENT_CONFIG = {
+    'workers': 2,            # encoding worker processes
+    'model': 'hog',          # 'hog' ya 'cnn' (encode_faces.py jaisa)
+    'dataset_dir': 'dataset',
+    'max_images': 20,        # ek request me zyada se zyada images
+    'capture_frames': 5,     # active camera se capture: kitne frames
+    'capture_interval': 0.4, # seconds between captured frames
+    'compact_after': 256,    # itne logged rows ke baad store me compact
+    'manifest': 'encodings.manifest.json', # encode_faces ka manifest, compaction ke baad bhi valid rakhna
+    'consolidate': {},       # compaction ke baad templates dobara: consolidate.py ke options (max_templates, ...)
+}
+
+# Face detection/encoding backend
+# backend: 'local' (session ke thread me) ya 'process' (worker processes, shared-memory frames)
+# max_inflight: ek session ke kitne frames ek saath pool me; zyada hone par naye frames drop
+RECOGNITION_CONFIG = {
+    'backend': 'local',
+    'workers': None,  # None = cpu_count - 1
+    'model': 'hog',
+    'max_inflight': 2,
+    'slot_bytes': 1920 * 1080 * 3,
+    'stale_after': 5.0,
+    'hang_timeout': 30.0,  # itni der busy worker ko atka maan kar restart
+}
+
+# Adaptive recognition scheduling (fixed "every 5th frame at 0.5x" ki jagah)
+# target_rate: recognitions/sec jab scene active ho; cpu_budget: recognition par max CPU fraction
+# max_interval: koi naya chehra na dikhe to backoff kitna tak; target_width: detection frame width (px)
+SCHEDULER_CONFIG = {
+    'target_rate': 6.0,
+    'cpu_budget': 0.5,
+    'max_interval': 2.0,
+    'backoff': 1.5,
+    'target_width': 640,
+    'min_width': 320,
+    'max_latency': 0.25,
+    'scene_change_threshold': 2.0,  # % pixels changed (MotionGate) jo backoff tod de
+}
+
+# Face detection se pehle motion gating (low-res background model)
+# Kuch nahi badla to detection skip, thoda badla to sirf us region (ROI) par detection
+MOTION_GATE_CONFIG = {
+    'enabled': True,
+    'width': 160,
+    'diff_threshold': 25,
+    'bg_alpha': 0.05,
+    'min_changed_fraction': 0.002,
+    'roi_max_fraction': 0.5,
+    'roi_padding': 0.5,
+    'force_full_interval': 10.0,  # itne seconds me kam se kam ek full-frame detection
+}
+
+# Detections ke beech face tracks; pehchane hue chehre har baar encode nahi hote
+TRACKER_CONFIG = {
+    'iou_threshold': 0.3,
+    'reverify_interval': 5.0,  # known track ko itne seconds baad dobara encode/match karna
+    'unknown_retry': 0.5,      # Unknown track ko kitni jaldi dobara try karna
+    'max_misses': 3,           # itni detections me na mile to track khatam
+    'max_age': 5.0,
+}
+
+# Attendance rows DB me background thread batched inserts se jaate hain
+ATTENDANCE_SINK_CONFIG = {
+    'flush_interval': 1.0,  # seconds
+    'max_batch': 256,       # itni rows queue me hon to turant flush
+    'fsync': 'close',       # 'never' | 'batch' (har batch ke baad) | 'close' (session stop par)
+    'max_backoff': 30.0,    # failed batch ka retry backoff (seconds) tak badhta hai
+    'close_retries': 3,     # session stop par itni baar aur; phir bhi fail ho to loud error
+}
+
+# Camera capture defaults; /api/start_session ke "capture" se per-session override.
+# None = driver default. MJPG par camera ke apne JPEG frames seedhe /video_feed me jaate hain
+# (jab frame par draw karne ko kuch na ho), decode + re-encode bachta hai.
+CAPTURE_CONFIG = {
+    'width': None,
+    'height': None,
+    'fps': None,
+    'fourcc': None,            # e.g. 'MJPG', 'YUYV'
+    'buffer_size': None,       # driver queue length (1 = sabse kam latency)
+    'mjpeg_passthrough': True,
+    'mode': 'auto',            # 'auto' (rtsp:// etc. = network) | 'device' | 'network'
+}
+
+# RTSP/IP cameras: FFmpeg backend, low-latency options, reconnect with exponential backoff.
+# mode='network' kisi local video file par bhi chal sakta hai (file khatam = reconnect), testing ke liye.
+NETWORK_CAPTURE_CONFIG = {
+    'rtsp_transport': 'tcp',   # 'tcp' | 'udp'; TCP par packet loss se smeared frames nahi aate
+    'open_timeout_ms': 5000,
+    'read_timeout_ms': 5000,
+    'buffer_size': 1,          # backend queue; baaki drain capture thread karta hai
+    'max_failed_reads': 10,    # lagatar itne failed reads = connection gaya
+    'stall_timeout': 5.0,      # seconds bina naye frame ke = reconnect
+    'backoff_initial': 0.5,    # seconds
+    'backoff_max': 30.0,
+}
+# /api/cameras cache se jawab deta hai; devices background me refresh hote hain
+CAMERA_INVENTORY_CONFIG = {
+    'refresh_interval': 30.0,  # seconds; ?refresh=1 se turant bhi
+    'fallback_indices': 5,     # non-Linux: itne indices probe (sirf background me)
+    'first_wait': 3.0,         # startup ke baad pehli request pehli refresh ka itna intezaar karegi
+}
+NETWORK_SCHEMES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://", "srt://")
+
+# Session events (SSE): har subscriber ki bounded queue; bhar gayi to client drop
+# /video_feed?width=&quality=&fps= : har (width, quality) tier ka frame ek hi baar
+# encode hota hai aur us tier ke saare viewers wahi bytes lete hain
+STREAM_CONFIG = {
+    'min_width': 160,
+    'width_step': 32,           # width is multiple par round, taaki tiers ginti ke hon
+    'quality_range': (20, 95),  # JPEG quality clamp
+    'quality_step': 5,
+    'max_fps': 30,
+    'tier_idle_timeout': 30.0,  # seconds; bina viewer ka tier hata diya jaata hai
+}
+
+SSE_CONFIG = {
+    'max_queue': 256,          # events per subscriber
+    'keepalive': 15.0,         # seconds; idle connection par comment bhejna
+    'stats_interval': 1.0,     # recognition/camera stats kitni der me push karne hain
+}
+
+# Kitne stopped sessions registry me rakhne hain (unki attendance API se abhi bhi milti hai)
+MAX_STOPPED_SESSIONS = 20
+
 # Lecture slots
 LECTURE_SLOTS = [
     {"id": "09:00-09:45", "start": dtime(9, 0),  "end": dtime(9, 45)},
@@ -59,41 +218,54 @@ def get_slot_by_id(slot_id: str):
             return s
     return None
 
+def resolve_slot(slot_id: str | None = None):
+    """Requested slot, else the one running right now (None outside lecture hours)."""
+    slot = get_slot_by_id(slot_id) if slot_id else None
+    return slot or find_current_slot()
+
 # Database functions
 def init_db():
-    conn = sqlite3.connect('attendance.db')
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT UNIQUE NOT NULL,
-                  email TEXT UNIQUE NOT NULL,
-                  password_hash TEXT NOT NULL,
-                  role TEXT DEFAULT 'faculty',
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  is_active BOOLEAN DEFAULT 1)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS password_reset_tokens
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  token TEXT UNIQUE NOT NULL,
-                  expires_at TIMESTAMP NOT NULL,
-                  used BOOLEAN DEFAULT 0,
-                  FOREIGN KEY (user_id) REFERENCES users (id))''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS sessions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  faculty_name TEXT,
-                  subject TEXT,
-                  slot_id TEXT,
-                  csv_filename TEXT,
-                  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  ended_at TIMESTAMP,
-                  FOREIGN KEY (user_id) REFERENCES users (id))''')
-    
-    conn.commit()
-    conn.close()
+    # Schema db.MIGRATIONS me hai; yahan sirf pending migrations chalti hain
+    db.migrate()
+
+ATTENDANCE_CSV_HEADER = ["Faculty", "Subject", "Student Name", "Timestamp", "LateMinutes", "Slot"]
+
+def session_csv_filename(subject, faculty, slot_id, day):
+    # Session key bhi yahi hai (attendance table ka session_key)
+    safe_subject = "".join(c for c in subject if c.isalnum())
+    safe_faculty = "".join(c for c in faculty if c.isalnum())
+    safe_slot = "".join(c for c in slot_id if c.isalnum() or c in ("-", "_"))
+    return f"attendance_{safe_subject}_{safe_faculty}_{safe_slot}_{day.isoformat()}.csv"
+
+def load_attendance(session_key):
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute('''SELECT faculty, subject, student_name, marked_time, late_minutes, slot_id
+                     FROM attendance WHERE session_key = ? ORDER BY id''', (session_key,))
+        return c.fetchall()
+
+def import_attendance_csv(csv_path, session_key, att_date):
+    """Purani (DB se pehle ki) session CSV ki rows attendance table me daalna."""
+    rows = []
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get("Student Name"):
+                rows.append((session_key, row.get("Faculty"), row.get("Subject"), row["Student Name"], att_date,
+                             row.get("Timestamp"), int(row.get("LateMinutes") or 0), row.get("Slot")))
+    with db.transaction() as conn:
+        conn.executemany(SqliteAttendanceSink.INSERT_SQL, rows)
+    return len(rows)
+
+def export_attendance_csv(session_key, csv_path):
+    """Session ki attendance DB se CSV (purana format) me likhna, atomically."""
+    rows = load_attendance(session_key)
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(ATTENDANCE_CSV_HEADER)
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+    return len(rows)
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -120,24 +292,93 @@ def send_email(to_email, subject, body):
         print(f"Email error: {e}")
         return False
 
+def normalize_capture_settings(raw: dict | None) -> dict:
+    """CAPTURE_CONFIG + request overrides, validated. Raises ValueError on bad values."""
+    settings = dict(CAPTURE_CONFIG)
+    for key, value in (raw or {}).items():
+        if key not in settings:
+            raise ValueError(f"Unknown capture setting: {key}")
+        if value in (None, ""):
+            continue
+        if key in ("width", "height"):
+            value = int(value)
+            if not 16 <= value <= 7680:
+                raise ValueError(f"{key} must be between 16 and 7680")
+        elif key == "fps":
+            value = float(value)
+            if not 1 <= value <= 240:
+                raise ValueError("fps must be between 1 and 240")
+        elif key == "fourcc":
+            value = str(value).upper()
+            if len(value) != 4:
+                raise ValueError("fourcc must be a 4 character code like MJPG")
+        elif key == "buffer_size":
+            value = int(value)
+            if not 1 <= value <= 64:
+                raise ValueError("buffer_size must be between 1 and 64")
+        elif key == "mjpeg_passthrough":
+            value = bool(value)
+        elif key == "mode":
+            value = str(value).lower()
+            if value not in ("auto", "device", "network"):
+                raise ValueError("mode must be one of auto, device, network")
+        settings[key] = value
+    return settings
+
 # Video Stream Widget
 class VideoStreamWidget:
-    def __init__(self, src=0):
+    """
+    Capture thread that decodes straight into a small ring of preallocated
+    frame buffers. Consumers wait on a condition variable for a frame newer
+    than the one they have, and borrow it as a read-only view (no copy):
+
+        with widget.latest_frame(last_seq) as (seq, frame):
+            ...
+
+    A borrowed slot is pinned, and the writer never overwrites a pinned slot
+    or the latest frame. A frame that is overwritten before anyone borrowed
+    it counts as dropped.
+    """
+
+    def __init__(self, src=0, on_status=None, status_interval: float = 1.0, ring_size: int = 4,
+                 capture_settings: dict | None = None):
         print(f"Initializing camera at source: {src}...")
+        # on_status(dict): capture thread se har status_interval par camera health
+        self.on_status = on_status
+        self.status_interval = status_interval
+        self.fps = 0.0
+        self.failed_reads = 0
+        self.last_frame_time = 0.0
+        self.ring_size = max(2, ring_size)
+        self._ring: list[np.ndarray | None] = [None] * self.ring_size
+        self._pins = [0] * self.ring_size
+        self._consumed = [True] * self.ring_size
+        self._jpeg: list[bytes | None] = [None] * self.ring_size # Camera ke native MJPEG frames (passthrough)
+        self._latest = -1
+        self.negotiated: dict = {}
+        self.passthrough = False
+        self._cond = Condition()
+        self.seq = 0 # Har naye captured frame par badhta hai
+        self.dropped = 0 # Frames jo kisi consumer ke lene se pehle overwrite ho gaye
+        self.stalls = 0 # Saare slots pinned the, frame grab karke chhodna pada
+        self.status = False
+        self.stopped = False
+        self.src = src
         try:
-            if isinstance(src, int):
-                self.capture = cv2.VideoCapture(src)
-            else:
-                self.capture = cv2.VideoCapture(src)
+            self.capture = self._open_capture(src)
+            self.capture_settings = capture_settings or {}
 
-            if not self.capture.isOpened():
+            if self.capture.isOpened():
+                self._apply_capture_settings(self.capture_settings, local_device=isinstance(src, int))
+            elif not self._retry_unopened():
                 print(f"!!! Error: Could not open camera at source: {src}")
                 self.thread = None
                 return
-
-            self.status = False
-            self.frame = None
-            self.stopped = False
+            # Live camera read() khud frame aane tak block karta hai; video file ko uske FPS par chalana
+            self.min_interval = 0.0
+            if isinstance(src, str) and os.path.isfile(src):
+                file_fps = self.capture.get(cv2.CAP_PROP_FPS) or 0
+                self.min_interval = 1.0 / file_fps if 0 < file_fps <= 240 else 0.01
             self.thread = Thread(target=self.update, args=())
             self.thread.daemon = True
             self.thread.start()
@@ -146,20 +387,171 @@ class VideoStreamWidget:
             print(f"VideoStreamWidget init error: {e}")
             self.thread = None
 
+    @property
+    def frame_id(self) -> int:
+        return self.seq
+
+    def _open_capture(self, src):
+        return cv2.VideoCapture(src)
+
+    def _retry_unopened(self) -> bool:
+        """Called when the first open fails; True starts the capture thread anyway (it retries)."""
+        return False
+
+    def _apply_capture_settings(self, settings: dict, local_device: bool = True) -> None:
+        # FOURCC pehle: kai drivers resolution/FPS ki list format ke hisaab se dete hain
+        if settings.get("fourcc"):
+            self.capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings["fourcc"]))
+        if settings.get("width"):
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, settings["width"])
+        if settings.get("height"):
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, settings["height"])
+        if settings.get("fps"):
+            self.capture.set(cv2.CAP_PROP_FPS, settings["fps"])
+        if settings.get("buffer_size"):
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, settings["buffer_size"])
+        # Driver ne asal me kya diya (request sirf hint hai)
+        self.negotiated = {
+            "width": int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": round(self.capture.get(cv2.CAP_PROP_FPS), 2),
+            "fourcc": fourcc_to_str(self.capture.get(cv2.CAP_PROP_FOURCC)),
+        }
+        if settings.get("mjpeg_passthrough") and local_device and self.negotiated["fourcc"] == "MJPG":
+            # Raw JPEG bytes maangna (sirf USB/local device; file/network backends raw YUV dete hain)
+            self.passthrough = bool(self.capture.set(cv2.CAP_PROP_CONVERT_RGB, 0))
+        print(f"Camera negotiated {self.negotiated}{' with MJPEG passthrough' if self.passthrough else ''}.")
+
+    def _decode_native(self, raw: np.ndarray):
+        """Passthrough mode: (decoded BGR frame, JPEG bytes); non-JPEG frames pass unchanged."""
+        if raw.ndim == 3:
+            self.passthrough = False # Backend ne CONVERT_RGB=0 ignore kiya
+            return raw, None
+        frame = cv2.imdecode(raw.reshape(-1), cv2.IMREAD_COLOR)
+        if frame is None:
+            # JPEG nahi mila: passthrough band karke normal decoded frames par wapas
+            print("Camera did not return JPEG data; disabling MJPEG passthrough.")
+            self.passthrough = False
+            self.capture.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+            return None, None
+        return frame, raw.tobytes()
+
+    def _free_slot(self) -> int | None:
+        for offset in range(1, self.ring_size + 1):
+            idx = (self._latest + offset) % self.ring_size
+            if idx != self._latest and self._pins[idx] == 0:
+                return idx
+        return None
+
+    def _capture_once(self) -> bool:
+        """Reads one frame into a free ring slot; True if a new frame was published."""
+        with self._cond:
+            idx = self._free_slot()
+        if idx is None:
+            self.capture.grab() # Camera ka buffer aage badhate raho, frame phenk do
+            self.stalls += 1
+            self.status = False
+            return False
+        # Pehle frame ke baad OpenCV isi buffer me decode karta hai (no allocation)
+        buf = None if self.passthrough else self._ring[idx]
+        ok, frame = self.capture.read(buf) if buf is not None else self.capture.read()
+        jpeg = None
+        if ok and frame is not None and self.passthrough:
+            frame, jpeg = self._decode_native(frame)
+        self.status = bool(ok) and frame is not None
+        if not self.status:
+            self.failed_reads += 1
+            time.sleep(0.01) # Band/khatam source par busy loop nahi
+            return False
+        with self._cond:
+            if not self._consumed[idx]:
+                self.dropped += 1
+            self._ring[idx] = frame
+            self._jpeg[idx] = jpeg
+            self._consumed[idx] = False
+            self._latest = idx
+            self.seq += 1
+            self.last_frame_time = time.monotonic()
+            self._cond.notify_all()
+        return True
+
     def update(self):
+        window_start, window_frames = time.monotonic(), 0
         while not self.stopped:
             try:
-                if self.capture.isOpened():
-                    (self.status, self.frame) = self.capture.read()
-                time.sleep(.01)
+                started = time.monotonic()
+                if self._capture_once():
+                    window_frames += 1
+
+                now = time.monotonic()
+                if now - window_start >= self.status_interval:
+                    self.fps = window_frames / (now - window_start)
+                    window_start, window_frames = now, 0
+                    if self.on_status:
+                        self.on_status(self.health())
+                if self.min_interval:
+                    remaining = self.min_interval - (time.monotonic() - started)
+                    if remaining > 0:
+                        time.sleep(remaining)
             except Exception as e:
                 print(f"Camera update error: {e}")
                 break
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_for_frame(self, last_seq: int, timeout: float = 1.0) -> int:
+        """Blocks until a frame newer than last_seq exists; returns the current seq."""
+        last_seq = max(last_seq, 0)
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > last_seq or self.stopped, timeout=timeout)
+            return self.seq
+
+    @contextmanager
+    def latest_frame(self, last_seq: int = -1, timeout: float = 1.0):
+        """
+        Waits for a frame newer than last_seq and yields (seq, read-only view,
+        native JPEG bytes or None), or (last_seq, None, None) on timeout. The
+        slot stays pinned inside the block.
+        """
+        last_seq = max(last_seq, 0) # seq 0 = abhi tak koi frame nahi
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > last_seq or self.stopped, timeout=timeout)
+            if self.seq <= last_seq:
+                idx = None
+            else:
+                idx, seq = self._latest, self.seq
+                self._pins[idx] += 1
+                self._consumed[idx] = True
+        if idx is None:
+            yield last_seq, None, None
+            return
+        try:
+            view = self._ring[idx].view()
+            view.flags.writeable = False
+            yield seq, view, self._jpeg[idx]
+        finally:
+            with self._cond:
+                self._pins[idx] -= 1
+
+    def health(self) -> dict:
+        age = time.monotonic() - self.last_frame_time if self.last_frame_time else None
+        return {
+            "ok": bool(self.status) and age is not None and age < 2.0,
+            "fps": round(self.fps, 1),
+            "failed_reads": self.failed_reads,
+            "frame_age_ms": round(age * 1000) if age is not None else None,
+            "frames": self.seq,
+            "dropped": self.dropped,
+            "stalls": self.stalls,
+            "passthrough": self.passthrough,
+        }
 
     def read(self):
+        # Purana API: latest frame ki apni copy
         try:
-            if hasattr(self, 'frame') and self.frame is not None:
-                return self.status, self.frame.copy()
+            with self.latest_frame(timeout=0) as (_, frame, _jpeg):
+                if frame is not None:
+                    return True, frame.copy()
         except Exception as e:
             print(f"Camera read error: {e}")
         return False, None
@@ -175,59 +567,577 @@ class VideoStreamWidget:
         except Exception as e:
             print(f"Camera release error: {e}")
 
-# Enhanced Face Attendance System
-class FaceAttendanceSystem:
-    def __init__(self, encodings_path: str = "encodings.pickle") -> None:
-        self.encodings_path = encodings_path
-        self.known_face_encodings: list[np.ndarray] = []
-        self.known_face_names: list[str] = []
-        self._load_known_faces_from_pickle()
+def is_network_source(src) -> bool:
+    return isinstance(src, str) and src.lower().startswith(NETWORK_SCHEMES)
+
+# OPENCV_FFMPEG_CAPTURE_OPTIONS process-wide env hai, open ke waqt hi padha jaata hai
+_ffmpeg_options_lock = Lock()
+
+class NetworkStreamWidget(VideoStreamWidget):
+    """
+    VideoStreamWidget for RTSP/HTTP cameras. The stream is opened through
+    FFmpeg with buffering disabled and bounded open/read timeouts, and the
+    capture thread reads continuously so the decoder never builds a backlog:
+    consumers only ever see the newest frame in the ring.
+
+    Instead of dying on a read error, the widget drops the connection after
+    `max_failed_reads` failures in a row (or `stall_timeout` seconds without
+    a frame) and reopens it, waiting `backoff_initial` seconds and doubling
+    up to `backoff_max` (with jitter) while the camera stays unreachable.
+    A camera that is unreachable when the session starts takes the same path.
+    """
+
+    def __init__(self, src, network_config: dict | None = None, **kwargs):
+        self.net = {**NETWORK_CAPTURE_CONFIG, **(network_config or {})}
+        # Thread super().__init__ me hi start hota hai, isliye connected pehle set
+        self.connected = True
+        self.connected_since = time.monotonic()
+        self.reconnects = 0 # Safal reconnects
+        self.reconnect_attempts = 0
+        self.consecutive_failures = 0
+        self.backoff = self.net['backoff_initial']
+        self._next_attempt = 0.0
+        self.last_error: str | None = None
+        super().__init__(src, **kwargs)
+        if self.thread is None:
+            self.connected = False
+
+    def _open_capture(self, src):
+        options = f"rtsp_transport;{self.net['rtsp_transport']}|fflags;nobuffer|flags;low_delay"
+        params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(self.net['open_timeout_ms']),
+                  cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(self.net['read_timeout_ms'])]
+        with _ffmpeg_options_lock:
+            previous = os.environ.get("OPENCV_FFMPEG_CAPTURE_OPTIONS")
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = options
+            try:
+                capture = cv2.VideoCapture(src, cv2.CAP_FFMPEG, params)
+            finally:
+                if previous is None:
+                    os.environ.pop("OPENCV_FFMPEG_CAPTURE_OPTIONS", None)
+                else:
+                    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = previous
+        if capture.isOpened():
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, self.net['buffer_size'])
+        return capture
+
+    def _retry_unopened(self) -> bool:
+        # Camera abhi reachable nahi: session fail karne ki jagah wahi backoff/reconnect path
+        print(f"Network camera {self.src} unreachable; retrying in {self.backoff:.1f}s.")
+        self.connected = False
+        self.last_error = "could not open stream"
+        self._next_attempt = time.monotonic() + self.backoff
+        return True
+
+    def _disconnect(self, reason: str) -> None:
+        print(f"Network camera {self.src} lost ({reason}); reconnecting in {self.backoff:.1f}s.")
+        self.connected = False
+        self.status = False
+        self.last_error = reason
+        self._next_attempt = time.monotonic() + self.backoff
+        try:
+            self.capture.release()
+        except Exception as e:
+            print(f"Camera release error: {e}")
+
+    def _reconnect(self) -> bool:
+        self.reconnect_attempts += 1
+        try:
+            capture = self._open_capture(self.src)
+        except Exception as e:
+            capture, self.last_error = None, f"open error: {e}"
+        if capture is None or not capture.isOpened():
+            if capture is not None:
+                self.last_error = "could not open stream"
+            # Exponential backoff + jitter, taaki kai cameras ek saath retry na karein
+            self.backoff = min(self.net['backoff_max'], self.backoff * 2)
+            self._next_attempt = time.monotonic() + self.backoff * random.uniform(0.8, 1.2)
+            return False
+        self.capture = capture
+        self._apply_capture_settings(self.capture_settings, local_device=False)
+        self.connected = True
+        self.connected_since = time.monotonic()
+        self.consecutive_failures = 0
+        self.reconnects += 1
+        self.backoff = self.net['backoff_initial']
+        print(f"Network camera {self.src} reconnected (attempt {self.reconnect_attempts}).")
+        return True
+
+    def _capture_once(self) -> bool:
+        if not self.connected:
+            # Status loop chalta rahe (health events), isliye yahan lamba sleep nahi
+            if time.monotonic() < self._next_attempt or not self._reconnect():
+                time.sleep(0.1)
+            return False
+        failed_reads = self.failed_reads
+        try:
+            ok = super()._capture_once()
+        except cv2.error as e:
+            ok, self.last_error = False, f"read error: {e}"
+            self.failed_reads += 1
+        if ok:
+            self.consecutive_failures = 0
+            return True
+        if self.failed_reads > failed_reads: # Pinned-slot stall stream failure nahi hai
+            self.consecutive_failures += 1
+        since = max(self.last_frame_time, self.connected_since)
+        if self.consecutive_failures >= self.net['max_failed_reads']:
+            self._disconnect(f"{self.consecutive_failures} failed reads")
+        elif time.monotonic() - since > self.net['stall_timeout']:
+            self._disconnect(f"no frame for {self.net['stall_timeout']:.0f}s")
+        return False
+
+    def health(self) -> dict:
+        health = super().health()
+        health.update({
+            "mode": "network",
+            "state": "connected" if self.connected else "reconnecting",
+            "connected": self.connected,
+            "uptime_s": round(time.monotonic() - self.connected_since, 1) if self.connected else 0,
+            "reconnects": self.reconnects,
+            "reconnect_attempts": self.reconnect_attempts,
+            "backoff_s": round(self.backoff, 1),
+            "last_error": self.last_error,
+        })
+        return health
+
+def create_capture_widget(src, capture_settings: dict | None = None, **kwargs) -> VideoStreamWidget:
+    """Network cameras (or mode='network') get NetworkStreamWidget, everything else VideoStreamWidget."""
+    settings = capture_settings or CAPTURE_CONFIG
+    mode = settings.get("mode") or "auto"
+    if mode == "network" or (mode == "auto" and is_network_source(src)):
+        return NetworkStreamWidget(src, capture_settings=settings, **kwargs)
+    return VideoStreamWidget(src, capture_settings=settings, **kwargs)
+
+def encode_jpeg(frame, quality: int | None = None) -> bytes | None:
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if quality else []
+    ret, buffer = cv2.imencode('.jpg', frame, params)
+    return buffer.tobytes() if ret else None
+
+def blank_frame_jpeg(message: str = "Camera Off - Start a Session", width: int | None = None,
+                     quality: int | None = None) -> bytes | None:
+    blank_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(blank_frame, message, (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    return StreamTier(width, quality).frame_for(1, blank_frame)
+
+def annotate_frame(frame, locations, names, marked_attendance, scale: float = 2.0):
+    # Draw bounding boxes and names on the frame
+    for (top, right, bottom, left), name in zip(locations, names):
+        top, right, bottom, left = (int(v * scale) for v in (top, right, bottom, left)) # Scale back up locations
+
+        if name in marked_attendance:
+            color, status = (0, 255, 0), "PRESENT" # Green for marked attendance
+        else:
+            color, status = (255, 0, 0), "UNKNOWN" # Red for unknown or not yet marked
+
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 3)
+        cv2.rectangle(frame, (left, bottom - 60), (right, bottom), color, cv2.FILLED)
+        cv2.putText(frame, name, (left + 6, bottom - 35), cv2.FONT_HERSHEY_DUPLEX, 0.7, (255, 255, 255), 2)
+        cv2.putText(frame, status, (left + 6, bottom - 10), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 2)
+    return frame
+
+# Ek session ke stream ka ek (width, quality) encoding, us tier ke saare viewers me shared
+class StreamTier:
+    def __init__(self, width: int | None, quality: int | None, fps: float | None = None) -> None:
+        self.width = width
+        self.quality = quality
+        self.fps = fps
+        self.interval = 1.0 / fps if fps else 0.0
+        self.next_due = 0.0 # Is waqt se pehle tier ko naya frame nahi chahiye
+        self._lock = Lock()
+        self.seq = 0
+        self.jpeg: bytes | None = None
+        self.encodes = 0
+        self.viewers = 0
+        self.last_used = time.monotonic()
+
+    def frame_for(self, seq: int, frame) -> bytes | None:
+        # Pehla viewer encode karta hai, baaki isi lock par ruk kar wahi bytes lete hain
+        with self._lock:
+            self.last_used = time.monotonic()
+            if self.seq != seq:
+                if self.width and self.width < frame.shape[1]:
+                    height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+                    frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+                self.jpeg = encode_jpeg(frame, self.quality)
+                self.seq = seq
+                self.encodes += 1
+                self.next_due = time.monotonic() + self.interval
+            return self.jpeg
+
+    def due(self, now: float) -> bool:
+        return self.viewers > 0 and now >= self.next_due
+
+    def stats(self) -> dict:
+        return {"width": self.width, "quality": self.quality, "fps": self.fps, "viewers": self.viewers,
+                "encodes": self.encodes}
+
+# Latest annotated frame ko saare /video_feed viewers ke saath share karna.
+# Full-resolution JPEG worker banata hai (sirf jab koi full-res viewer ho);
+# tiers ke liye raw frame ki copy sirf tab publish hoti hai jab kisi tier ka agla
+# frame uske fps cap ke hisaab se due ho. Encoding viewers karte hain, jo tier koi
+# dekh hi nahi raha uska koi kaam nahi hota.
+class FrameBroadcaster:
+    def __init__(self) -> None:
+        self._cond = Condition()
+        self._seq = 0
+        self._frame_bytes: bytes | None = None
+        self._frame = None
+        self._frame_seq = 0 # Aakhri published raw frame ka seq
+        self.closed = False
+        self.full_viewers = 0
+        self.tier_viewers = 0
+        self.tier_frames = 0 # Tiers ke liye copy kiye gaye frames
+        self._tiers: dict[tuple, StreamTier] = {}
+
+    def publish(self, frame_bytes: bytes | None, frame=None) -> None:
+        """`frame` (owned, never modified later) is only passed when tier_frame_due()."""
+        with self._cond:
+            self._seq += 1
+            self._frame_bytes = frame_bytes
+            if frame is not None:
+                self._frame, self._frame_seq = frame, self._seq
+                self.tier_frames += 1
+            self._cond.notify_all()
+
+    def tier_frame_due(self) -> bool:
+        """True if some watched tier wants a new frame now (its fps cap allows one)."""
+        if not self.tier_viewers:
+            return False
+        now = time.monotonic()
+        return any(tier.due(now) for tier in list(self._tiers.values()))
+
+    def subscribe(self, width: int | None = None, quality: int | None = None,
+                  fps: float | None = None) -> StreamTier | None:
+        """Registers a viewer; returns its tier, or None for the full-resolution stream."""
+        with self._cond:
+            if width is None and quality is None:
+                self.full_viewers += 1
+                return None
+            now = time.monotonic()
+            for key, idle in list(self._tiers.items()):
+                if idle.viewers == 0 and now - idle.last_used > STREAM_CONFIG['tier_idle_timeout']:
+                    del self._tiers[key]
+            tier = self._tiers.get((width, quality, fps))
+            if tier is None:
+                tier = self._tiers[(width, quality, fps)] = StreamTier(width, quality, fps)
+            tier.viewers += 1
+            self.tier_viewers += 1
+            return tier
+
+    def unsubscribe(self, tier: StreamTier | None) -> None:
+        with self._cond:
+            if tier is None:
+                self.full_viewers -= 1
+            else:
+                tier.viewers -= 1
+                self.tier_viewers -= 1
+                tier.last_used = time.monotonic()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def wait_for_frame(self, last_seq: int, timeout: float = 1.0) -> tuple[int, bytes | None]:
+        """Blocks until a frame newer than last_seq is published (or timeout/close)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or self.closed, timeout=timeout)
+            if self._seq > last_seq:
+                return self._seq, self._frame_bytes
+            return last_seq, None
+
+    def wait_for_tier_frame(self, tier: StreamTier, last_seq: int, timeout: float = 1.0) -> tuple[int, bytes | None]:
+        """Like wait_for_frame, but returns the newest raw frame encoded for `tier` (once per tier)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame_seq > last_seq or self.closed, timeout=timeout)
+            if self._frame_seq <= last_seq:
+                return last_seq, None
+            seq, frame = self._frame_seq, self._frame
+        return seq, tier.frame_for(seq, frame) # Encoding Condition ke bahar: publisher block nahi hota
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"full_viewers": self.full_viewers, "tier_frames": self.tier_frames,
+                    "tiers": [tier.stats() for tier in self._tiers.values()]}
+
+# Session ke live events (marks, start/stop, stats, camera health) SSE subscribers tak.
+# Publisher kabhi block nahi hota: jis subscriber ki queue bhari hai use hata diya jaata hai.
+class EventHub:
+    def __init__(self, max_queue: int = 256) -> None:
+        self.max_queue = max_queue
+        self._lock = Lock()
+        self._subscribers: list[queue.Queue] = []
+        self._seq = 0
+        self.published = 0
+        self.dropped_clients = 0
+        self.closed = False
+
+    def subscribe(self) -> queue.Queue:
+        q: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self.closed:
+                self._end(q, "session_closed")
+            else:
+                self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, event: str, data: dict) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self._seq += 1
+            self.published += 1
+            message = (self._seq, event, data)
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    # Slow client: queue saaf karke band karne ka signal, memory bounded rehti hai
+                    self._subscribers.remove(q)
+                    self.dropped_clients += 1
+                    self._end(q, "slow_client")
+
+    @staticmethod
+    def _end(q: queue.Queue, reason: str, drain: bool = True) -> None:
+        # Slow client ki pending queue phenk dena; normal close par pehle ke events deliver hone dena
+        while drain or q.full():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        q.put_nowait((0, "end", {"reason": reason}))
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            for q in self._subscribers:
+                self._end(q, "session_closed", drain=False)
+            self._subscribers.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "published": self.published,
+                    "dropped_clients": self.dropped_clients}
+
+# Har active session ke liye ek background recognition thread.
+# Detection, matching, attendance marking aur JPEG encoding yahin ek baar hota hai,
+# viewers kitne bhi hon.
+class RecognitionWorker:
+    def __init__(self, attendance_session: "AttendanceSession", camera_widget: VideoStreamWidget,
+                 broadcaster: FrameBroadcaster) -> None:
+        self.attendance_session = attendance_session
+        self.camera_widget = camera_widget
+        self.broadcaster = broadcaster
+        self.scheduler = AdaptiveScheduler(**SCHEDULER_CONFIG)
+        self.gate = MotionGate(**MOTION_GATE_CONFIG)
+        self.tracker = FaceTracker(**TRACKER_CONFIG)
+        self.last_known_locations: list = [] # Full-frame pixel coords
+        self.last_known_names: list[str] = []
+        self.frame_counter = 0
+        self._pending: dict[int, tuple] = {} # seq -> (submit time, scale, roi)
+        self.recognitions = 0 # Backend se aaye results (recognition FPS ke liye)
+        self._annotated = None # Annotation ke liye reusable frame buffer
+        self.passthrough_frames = 0 # Bina re-encode stream hue native MJPEG frames
+        self._stop_event = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        print("Recognition worker started.")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=5)
+        self.attendance_session.system.get_recognition_backend().release(self.attendance_session.session_id)
+        self.broadcaster.close()
+        print("Recognition worker stopped.")
+
+    def recognize(self, frame, roi=None) -> None:
+        x0, y0 = 0, 0
+        if roi is not None:
+            x0, y0, w, h = roi
+            frame = frame[y0:y0 + h, x0:x0 + w]
+        scale = self.scheduler.scale_for(frame.shape[1])
+        small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale) if scale < 1.0 else frame
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+        # Jin tracks ki identity abhi fresh hai unke boxes: backend unhe encode nahi karega
+        skip_boxes = [(int((t - y0) * scale), int((r - x0) * scale), int((b - y0) * scale), int((l - x0) * scale))
+                      for t, r, b, l in self.tracker.skip_boxes()]
+
+        # Face detection + encoding backend par (local thread ya process pool)
+        backend = self.attendance_session.system.get_recognition_backend()
+        self._pending[self.frame_counter] = (time.monotonic(), scale, roi)
+        if not backend.submit(self.attendance_session.session_id, self.frame_counter, rgb_small_frame, skip_boxes):
+            self._pending.pop(self.frame_counter, None)
+
+    def apply_results(self) -> None:
+        backend = self.attendance_session.system.get_recognition_backend()
+        for seq, locations, encodings in backend.poll(self.attendance_session.session_id):
+            self.recognitions += 1
+            submitted_at, scale, roi = self._pending.pop(seq, (time.monotonic(), 1.0, None))
+            x0, y0 = (roi[0], roi[1]) if roi else (0, 0)
+            # Scale back up locations aur ROI offset jodna
+            locations = [(int(t / scale) + y0, int(r / scale) + x0, int(b / scale) + y0, int(l / scale) + x0)
+                         for t, r, b, l in locations]
+
+            region = (roi[1], roi[0] + roi[2], roi[1] + roi[3], roi[0]) if roi else None
+            previous_tracks = len(self.tracker.tracks)
+            tracks = self.tracker.update(locations, region)
+            new_faces = int(len(self.tracker.tracks) != previous_tracks) # Koi aaya/gaya: scheduler ko active rakhna
+
+            # Sirf naye/Unknown/re-verify wale faces ek batched distance computation me match (closest wins)
+            todo = [i for i, encoding in enumerate(encodings) if encoding is not None]
+            now = time.monotonic()
+            for i, (name, distance) in zip(todo, self.attendance_session.matcher.match([encodings[i] for i in todo])):
+                self.tracker.record_encoding(tracks[i], name, distance, now)
+            self.tracker.reused += len(encodings) - len(todo)
+
+            for track in tracks:
+                if track.identified and track.name not in self.attendance_session.marked_attendance:
+                    new_faces += 1
+                    self.attendance_session._mark_attendance(track.name) # Mark attendance
+
+            # ROI ke bahar wale tracks bhi (wahan kuch nahi badla) draw hote rehte hain
+            self.last_known_locations = [track.box for track in self.tracker.tracks]
+            self.last_known_names = [track.name for track in self.tracker.tracks]
+            self.scheduler.record(time.monotonic() - submitted_at, len(tracks), new_faces)
+        # Drop hue/expire hue frames ka bookkeeping saaf rakhna
+        if len(self._pending) > 64:
+            for seq in sorted(self._pending)[:-16]:
+                del self._pending[seq]
+
+    def process_frame(self, frame, native_jpeg: bytes | None = None) -> None:
+        # `frame` camera ring ka read-only view hai: gate/recognize sirf padhte hain
+        self.frame_counter += 1
+        motion = self.gate.update(frame)
+        if self.scheduler.should_process(motion):
+            decision, roi = self.gate.plan(frame.shape)
+            if decision != MotionGate.SKIP:
+                self.recognize(frame, roi)
+        self.apply_results()
+
+        if self.last_known_locations:
+            # Boxes draw karne ke liye ek reusable buffer me copy (ring buffer read-only hai)
+            if self._annotated is None or self._annotated.shape != frame.shape:
+                self._annotated = np.empty_like(frame)
+            np.copyto(self._annotated, frame)
+            frame = annotate_frame(self._annotated, self.last_known_locations, self.last_known_names,
+                                   self.attendance_session.marked_attendance, scale=1.0)
+        # Tier ke liye apni copy (ring slot / annotation buffer reuse hote hain), sirf jab kisi tier ka frame due ho
+        tier_frame = frame.copy() if self.broadcaster.tier_frame_due() else None
+        if not self.last_known_locations and native_jpeg is not None:
+            # Draw karne ko kuch nahi: camera ka apna JPEG hi stream karna (re-encode nahi)
+            self.passthrough_frames += 1
+            self.broadcaster.publish(native_jpeg, tier_frame)
+            return
+        frame_bytes = None
+        if self.broadcaster.full_viewers:
+            # Full-res JPEG sirf tab jab koi use dekh raha ho
+            frame_bytes = encode_jpeg(frame)
+            if frame_bytes is None:
+                print("Failed to encode frame to JPG.")
+        self.broadcaster.publish(frame_bytes, tier_frame)
+
+    def publish_stats(self, elapsed: float, frames: int, recognitions: int) -> None:
+        self.attendance_session.events.publish("stats", {
+            "stream_fps": round(frames / elapsed, 1),
+            "recognition_fps": round(recognitions / elapsed, 1),
+            "scheduler": self.scheduler.stats(),
+            "motion_gate": self.gate.stats(),
+            "tracker": self.tracker.stats(),
+            "passthrough_frames": self.passthrough_frames,
+            "stream": self.broadcaster.stats(),
+            "marked": len(self.attendance_session.marked_attendance),
+        })
+
+    def _run(self) -> None:
+        last_frame_id = -1
+        stats_start, stats_frames, stats_recognitions = time.monotonic(), 0, 0
+        while not self._stop_event.is_set():
+            try:
+                now = time.monotonic()
+                if now - stats_start >= SSE_CONFIG['stats_interval']:
+                    self.publish_stats(now - stats_start, self.frame_counter - stats_frames, self.recognitions - stats_recognitions)
+                    stats_start, stats_frames, stats_recognitions = now, self.frame_counter, self.recognitions
+                with self.camera_widget.latest_frame(last_frame_id, timeout=0.5) as (last_frame_id, frame, native_jpeg):
+                    if frame is None:
+                        continue
+                    self.process_frame(frame, native_jpeg)
+            except Exception as e:
+                print(f"Recognition worker error: {e}")
+                time.sleep(0.1) # Prevent busy-waiting on errors
+
+# Ek classroom session: apna camera, recognition worker aur attendance CSV.
+# Gallery (matcher) FaceAttendanceSystem ke saath shared rehti hai.
+class AttendanceSession:
+    def __init__(self, system: "FaceAttendanceSystem", session_id: str, faculty: str, subject: str) -> None:
+        self.system = system
+        self.session_id = session_id
         self.session_active = False
         self.expected_start_dt: datetime | None = None
         self.current_slot_id: str = ""
-        self.current_faculty = ""
-        self.current_subject = ""
+        self.current_faculty = faculty
+        self.current_subject = subject
+        self.camera_source = None
         self.csv_filename = ""
+        self.attendance_sink: SqliteAttendanceSink | None = None
         self.marked_attendance: set[str] = set()
+        # Append-only journal of this session's marks; seq = position + 1 (feed cursor)
+        self.attendance_records: list[dict] = []
+        self._mark_lock = Lock() # Recognition worker aur QR requests dono mark karte hain
         self.camera_widget = None
+        self.broadcaster = FrameBroadcaster()
+        self.events = EventHub(SSE_CONFIG['max_queue'])
+        self.recognition_worker = None
+
+    @property
+    def matcher(self) -> FaceMatcher:
+        return self.system.matcher
+
+    def info(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "faculty": self.current_faculty,
+            "subject": self.current_subject,
+            "slot_id": self.current_slot_id,
+            "expected_start": self.expected_start_dt.strftime("%H:%M") if self.expected_start_dt else None,
+            "csv": self.csv_filename,
+            "camera_source": str(self.camera_source),
+            "active": self.session_active,
+            "marked": len(self.marked_attendance),
+            "scheduler": self.recognition_worker.scheduler.stats() if self.recognition_worker else None,
+            "motion_gate": self.recognition_worker.gate.stats() if self.recognition_worker else None,
+            "attendance_sink": self.attendance_sink.stats() if self.attendance_sink else None,
+            "camera": self.camera_widget.health() if self.camera_widget and self.camera_widget.thread else None,
+            "capture": self.camera_widget.negotiated if self.camera_widget and self.camera_widget.thread else None,
+            "events": self.events.stats(),
+            "tracker": self.recognition_worker.tracker.stats() if self.recognition_worker else None,
+        }
 
-    def _load_known_faces_from_pickle(self):
-        print("Loading known faces from pickle file...")
-        try:
-            if not os.path.exists(self.encodings_path):
-                print(f"WARNING: Encodings file '{self.encodings_path}' not found. Face recognition will not work.")
-                self.known_face_encodings = []
-                self.known_face_names = []
-                return
-
-            with open(self.encodings_path, "rb") as f:
-                data = pickle.load(f)
-            self.known_face_encodings = data["encodings"]
-            self.known_face_names = data["names"]
-            print(f"Total faces loaded: {len(self.known_face_names)}")
-        except Exception as e:
-            print(f"ERROR: Failed to load encodings from '{self.encodings_path}': {e}")
-            self.known_face_encodings = []
-            self.known_face_names = []
-
-    def start_new_session(self, faculty: str, subject: str, camera_source, slot_id: str | None = None, manual_start_time: str | None = None) -> bool:
+    def start(self, camera_source, slot: dict | None = None, manual_start_time: str | None = None,
+              capture_settings: dict | None = None) -> bool:
+        faculty, subject = self.current_faculty, self.current_subject
         try:
             try:
                 capture_source = int(camera_source)
             except (ValueError, TypeError):
                 capture_source = camera_source
+            self.camera_source = capture_source
 
-            self.camera_widget = VideoStreamWidget(src=capture_source)
+            self.camera_widget = create_capture_widget(capture_source, capture_settings,
+                                                       on_status=lambda health: self.events.publish("camera", health),
+                                                       status_interval=SSE_CONFIG['stats_interval'])
             if self.camera_widget.thread is None: # Check if camera initialization failed
                 print(f"Failed to initialize camera widget for source: {capture_source}")
                 return False
 
-            slot = None
-            if slot_id:
-                slot = get_slot_by_id(slot_id)
-            if not slot:
-                slot = find_current_slot()
-
             if manual_start_time:
                 try:
                     h, m = map(int, manual_start_time.split(":"))
@@ -242,45 +1152,45 @@ class FaceAttendanceSystem:
 
             self.current_slot_id = slot["id"] if slot else "NA"
             self.session_active = True
-            self.current_faculty, self.current_subject = faculty, subject
             self.marked_attendance.clear()
-
-            today_str = date.today().isoformat()
-            safe_subject = "".join(c for c in subject if c.isalnum())
-            safe_faculty = "".join(c for c in faculty if c.isalnum())
-            safe_slot = "".join(c for c in self.current_slot_id if c.isalnum() or c in ("-", "_"))
-
-            self.csv_filename = f"attendance_{safe_subject}_{safe_faculty}_{safe_slot}_{today_str}.csv"
-
-            if os.path.exists(self.csv_filename):
-                print(f"Restoring existing session from: {self.csv_filename}")
-                with open(self.csv_filename, 'r', newline='', encoding='utf-8') as f:
-                    csv_reader = csv.reader(f)
-                    header = next(csv_reader, None)
-                    name_idx = 2
-                    if header:
-                        try:
-                            name_idx = header.index("Student Name")
-                        except ValueError:
-                            name_idx = 2
-                    for row in csv_reader:
-                        if row and len(row) > name_idx:
-                            self.marked_attendance.add(row[name_idx])
+            self.attendance_records = []
+
+            self.csv_filename = session_csv_filename(subject, faculty, self.current_slot_id, date.today())
+
+            # Attendance DB me hai; CSV naam session key hai aur export on demand banta hai
+            existing = load_attendance(self.csv_filename)
+            if not existing and os.path.exists(self.csv_filename):
+                print(f"Importing pre-database attendance from: {self.csv_filename}")
+                import_attendance_csv(self.csv_filename, self.csv_filename, date.today().isoformat())
+                existing = load_attendance(self.csv_filename)
+            if existing:
+                print(f"Restoring existing session: {self.csv_filename}")
+                for faculty_, subject_, name, marked_time, late, slot_ in existing:
+                    self.marked_attendance.add(name)
+                    self._append_record(faculty_, subject_, name, marked_time, late, slot_)
                 print(f"Restored {len(self.marked_attendance)} attendees.")
             else:
-                with open(self.csv_filename, "w", newline="", encoding="utf-8") as f:
-                    csv.writer(f).writerow(["Faculty", "Subject", "Student Name", "Timestamp", "LateMinutes", "Slot"])
-                print(f"New session started. Attendance will be saved to: {self.csv_filename}")
+                print(f"New session started. Attendance will be exported as: {self.csv_filename}")
+            self.attendance_sink = SqliteAttendanceSink(db.DATABASE_PATH, **ATTENDANCE_SINK_CONFIG)
 
+            self.broadcaster = FrameBroadcaster()
+            self.recognition_worker = RecognitionWorker(self, self.camera_widget, self.broadcaster)
+            self.recognition_worker.start()
+            self.events.publish("session", {"state": "started", **self.info()})
             return True
         except Exception as e:
             print(f"Session start error: {e}")
+            self.session_active = False
+            if self.recognition_worker:
+                self.recognition_worker.stop()
+                self.recognition_worker = None
             if self.camera_widget: # Ensure camera is released if an error occurs during setup
                 self.camera_widget.release()
                 self.camera_widget = None
+            self.flush_attendance(close=True)
             return False
 
-    def stop_current_session(self) -> tuple[list, str]:
+    def stop(self) -> tuple[list, str]:
         final_attendees = []
         filename = ""
         try:
@@ -289,36 +1199,392 @@ class FaceAttendanceSystem:
                 filename = self.csv_filename
 
             self.session_active = False
+            if self.recognition_worker:
+                self.recognition_worker.stop()
+                self.recognition_worker = None
             if self.camera_widget:
                 self.camera_widget.release()
                 self.camera_widget = None
-            print("Session stopped successfully.")
+            # Queue me bachi rows likh kar fsync; iske baad DB me session complete hai
+            self.flush_attendance(close=True)
+            self.events.publish("session", {"state": "stopped", **self.info()})
+            self.events.close()
+            print(f"Session {self.session_id} stopped successfully.")
         except Exception as e:
             print(f"Session stop error: {e}")
         return final_attendees, filename
 
+    def flush_attendance(self, close: bool = False) -> None:
+        if self.attendance_sink is None:
+            return
+        try:
+            if close:
+                self.attendance_sink.close()
+            else:
+                self.attendance_sink.flush()
+        except AttendanceSinkError as e:
+            names = ", ".join(str(row[3]) for row in e.rows)
+            print(f"!!! ATTENDANCE NOT SAVED ({self.csv_filename}): {len(e.rows)} rows are still unwritten: {names}. "
+                  f"The next export retries them. ({e})")
+        except Exception as e:
+            print(f"Attendance flush error ({self.csv_filename}): {e}")
+
+    def _append_record(self, faculty, subject, name, marked_time, late, slot) -> None:
+        self.attendance_records.append({"seq": len(self.attendance_records) + 1, "faculty": faculty, "subject": subject,
+                                        "name": name, "time": marked_time, "late": late or 0, "slot": slot})
+
+    def attendance_since(self, seq: int) -> tuple[list[dict], int]:
+        """Records added after `seq` and the new cursor (journal sirf append hota hai)."""
+        records = self.attendance_records
+        cursor = len(records)
+        return records[max(0, seq):cursor], cursor
+
+    def attendance_etag(self) -> str:
+        # Session key + count: journal append-only hai, to count badle bina content nahi badalta
+        return f"{hashlib.sha1(self.csv_filename.encode()).hexdigest()[:16]}-{len(self.attendance_records)}"
+
     def _mark_attendance(self, name: str):
         try:
             if not self.session_active or name == "Unknown":
                 return
-            if name in self.marked_attendance:
-                return
+            with self._mark_lock:
+                if name in self.marked_attendance:
+                    return
+
+                now = datetime.now()
+                timestamp = now.strftime("%H:%M:%S")
+                late_min = 0
+                if self.expected_start_dt:
+                    delta_min = int((now - self.expected_start_dt).total_seconds() // 60)
+                    late_min = max(0, delta_min)
+
+                # Sirf queue; DB insert sink ka background thread batch me karega. Pehle write:
+                # stop() ke saath race me sink band ho to set/journal me bhi kuch nahi badalta
+                self.attendance_sink.write((self.csv_filename, self.current_faculty, self.current_subject, name,
+                                            now.date().isoformat(), timestamp, late_min, self.current_slot_id))
+                self.marked_attendance.add(name)
+                self._append_record(self.current_faculty, self.current_subject, name, timestamp, late_min, self.current_slot_id)
+                self.events.publish("mark", self.attendance_records[-1])
 
-            self.marked_attendance.add(name)
+            print(f"✅ ATTENDANCE MARKED: {name} for {self.current_subject} (late {late_min} min, slot {self.current_slot_id})")
+        except Exception as e:
+            print(f"Mark attendance error: {e}")
 
-            now = datetime.now()
-            timestamp = now.strftime("%H:%M:%S")
-            late_min = 0
-            if self.expected_start_dt:
-                delta_min = int((now - self.expected_start_dt).total_seconds() // 60)
-                late_min = max(0, delta_min)
+# Enhanced Face Attendance System
+# Shared face gallery + session registry (session_id -> AttendanceSession),
+# taaki ek server process kai classroom cameras ek saath chala sake.
+class FaceAttendanceSystem:
+    def __init__(self, encodings_path: str = DEFAULT_STORE_PATH, legacy_pickle_path: str = "encodings.pickle",
+                 templates_path: str | None = TEMPLATES_STORE_PATH) -> None:
+        self.encodings_path = encodings_path
+        self.legacy_pickle_path = legacy_pickle_path
+        self.templates_path = templates_path
+        self.gallery = GallerySnapshot.empty()
+        self._gallery_lock = Lock() # Ek waqt me ek hi reload
+        self._gallery_watcher: GalleryWatcher | None = None
+        self.gallery_reloads = 0
+        self.gallery_reload_errors = 0
+        self.gallery_last_error: str | None = None
+        self._enrollment_encoder: EnrollmentEncoder | None = None
+        self.enrollments = 0
+        self.compactions = 0
+        self._load_known_faces()
+        self.sessions: dict[str, AttendanceSession] = {}
+        self._sessions_lock = Lock()
+        self._starting: set[str] = set()  # start() chal raha hai, camera/CSV claimed
+        self._last_session_id: str | None = None
+        self._recognition_backend = None
+        self._camera_inventory: CameraInventory | None = None
+        self._backend_lock = Lock()
+        # Process exit par buffered attendance rows na khoyein
+        atexit.register(self.flush_all_attendance)
+
+    def get_camera_inventory(self) -> CameraInventory:
+        # Lazy, backend ki tarah: spawn workers app import karte hain, unme thread nahi chahiye
+        with self._backend_lock:
+            if self._camera_inventory is None:
+                self._camera_inventory = CameraInventory(
+                    in_use=self.camera_sources_in_use,
+                    refresh_interval=CAMERA_INVENTORY_CONFIG['refresh_interval'],
+                    fallback_indices=CAMERA_INVENTORY_CONFIG['fallback_indices'])
+            return self._camera_inventory
+
+    def get_enrollment_encoder(self) -> EnrollmentEncoder:
+        with self._backend_lock:
+            if self._enrollment_encoder is None:
+                self._enrollment_encoder = EnrollmentEncoder(ENROLLMENT_CONFIG['workers'], ENROLLMENT_CONFIG['model'])
+                atexit.register(self._enrollment_encoder.shutdown)
+            return self._enrollment_encoder
+
+    def camera_sources_in_use(self) -> set:
+        with self._sessions_lock:
+            return {s.camera_source for s in self.sessions.values() if s.session_active}
+
+    def get_recognition_backend(self):
+        # Lazy: process pool pehle session par hi banta hai, import time par nahi
+        # (spawn workers app module dobara import karte hain)
+        with self._backend_lock:
+            if self._recognition_backend is None:
+                self._recognition_backend = create_backend(RECOGNITION_CONFIG)
+                atexit.register(self._recognition_backend.shutdown)
+            return self._recognition_backend
+
+    # Purane callers ke liye current snapshot ke fields. Jise ek operation me kai
+    # fields chahiye woh pehle `gallery = self.gallery` le aur usi se padhe.
+    @property
+    def matcher(self) -> FaceMatcher:
+        return self.gallery.matcher
+
+    @property
+    def roster(self) -> Roster:
+        return self.gallery.roster
+
+    @property
+    def known_face_names(self):
+        return self.gallery.names
+
+    @property
+    def known_face_encodings(self):
+        return self.gallery.encodings
+
+    @property
+    def encoding_store(self):
+        return self.gallery.store
+
+    def _select_gallery_source(self, quiet: bool = False):
+        return select_source(self.encodings_path, self.templates_path, self.legacy_pickle_path, quiet=quiet)
+
+    def _load_known_faces(self):
+        # Binary store (memory-mapped) preferred; purana pickle sirf fallback
+        path, kind = self._select_gallery_source()
+        if path is None:
+            print(f"WARNING: Encodings file '{self.legacy_pickle_path}' not found. Face recognition will not work.")
+            return
+        print(f"Loading known faces from {'store' if kind == 'store' else 'pickle file'} '{path}'...")
+        try:
+            self.gallery = load_snapshot(path, kind, MATCHER_CONFIG, version=1, enrollment_store=self.encodings_path)
+        except Exception as e:
+            print(f"ERROR: Failed to load encodings from '{path}': {e}")
+            if kind != "store" or not os.path.exists(self.legacy_pickle_path):
+                return
+            try:
+                self.gallery = load_snapshot(self.legacy_pickle_path, "pickle", MATCHER_CONFIG, version=1)
+            except Exception as e:
+                print(f"ERROR: Failed to load encodings from '{self.legacy_pickle_path}': {e}")
+                return
+        print(f"Total faces loaded: {len(self.gallery)} (matcher: {self.matcher.stats()})")
+        print(f"Roster: {self.roster.stats()}")
+        if self.gallery.store is None:
+            print(f"TIP: Run 'python encodings_store.py {self.legacy_pickle_path} {self.encodings_path}' for faster, shared startup.")
 
-            with open(self.csv_filename, "a", newline="", encoding="utf-8") as f:
-                csv.writer(f).writerow([self.current_faculty, self.current_subject, name, timestamp, late_min, self.current_slot_id])
+    def reload_gallery(self) -> dict:
+        """
+        Loads the current gallery file into a new snapshot (matcher index and
+        roster included) and swaps it in. Recognition keeps running on the old
+        snapshot meanwhile, and holders of the old one keep it until they finish.
+        """
+        with self._gallery_lock:
+            path, kind = self._select_gallery_source()
+            if path is None:
+                raise FileNotFoundError("No gallery file found to reload.")
+            old = self.gallery
+            started = time.monotonic()
+            try:
+                snapshot = load_snapshot(path, kind, MATCHER_CONFIG, version=old.version + 1,
+                                         enrollment_store=self.encodings_path)
+            except Exception as e:
+                self.gallery_reload_errors += 1
+                self.gallery_last_error = f"{path}: {e}"
+                raise
+            self.gallery = snapshot # Atomic swap; naye frames/requests naya snapshot dekhenge
+            self.gallery_reloads += 1
+            self.gallery_last_error = None
+            print(f"Gallery reloaded from '{path}': v{old.version} ({len(old)} faces) -> "
+                  f"v{snapshot.version} ({len(snapshot)} faces) in {(time.monotonic() - started) * 1000:.0f} ms.")
+            return snapshot.stats()
+
+    def _reload_gallery_quietly(self) -> None:
+        try:
+            self.reload_gallery()
+        except Exception as e:
+            print(f"Gallery reload failed, keeping v{self.gallery.version}: {e}")
+
+    def reload_gallery_async(self) -> None:
+        Thread(target=self._reload_gallery_quietly, daemon=True).start()
+
+    def start_gallery_watcher(self) -> None:
+        # Sirf server process me (spawn workers app import karte hain)
+        if self._gallery_watcher is None and GALLERY_CONFIG['watch']:
+            def probe():
+                path, _ = self._select_gallery_source(quiet=True)
+                return path, file_signature(path)
+            self._gallery_watcher = GalleryWatcher(probe, lambda: (self.gallery.source, self.gallery.signature),
+                                                   self._reload_gallery_quietly, GALLERY_CONFIG['poll_interval'])
+
+    def _ensure_store_gallery(self) -> None:
+        # Enrollment log sirf binary store ke upar chalta hai: pickle/khali gallery
+        # ko pehle ek baar store me likhna (caller _gallery_lock pakde hue hai)
+        gallery = self.gallery
+        if gallery.log is not None:
+            return
+        if os.path.exists(self.encodings_path):
+            raise RuntimeError(f"'{self.encodings_path}' exists but is not loaded ({self.gallery_last_error or 'load failed'}); "
+                               f"fix or remove it before enrolling.")
+        write_store(self.encodings_path, np.asarray(gallery.matcher.encodings), list(gallery.names))
+        self.gallery = load_snapshot(self.encodings_path, "store", MATCHER_CONFIG, version=gallery.version + 1)
+        print(f"Gallery moved to store '{self.encodings_path}' for enrollment ({len(self.gallery)} faces).")
+
+    def enroll_student(self, name: str, image_paths) -> dict:
+        """
+        Encodes the images in the enrollment worker pool and appends the faces
+        to the gallery: first durably to the store's enrollment log, then to a
+        new snapshot whose matcher/roster extend the current ones (no rebuild).
+        """
+        encodings, rejected = self.get_enrollment_encoder().encode(image_paths)
+        if not encodings:
+            raise ValueError("No face found in the enrollment images.")
+        names = [name] * len(encodings)
+        with self._gallery_lock:
+            self._ensure_store_gallery()
+            gallery = self.gallery
+            new_student = gallery.roster.student_id(name) is None
+            gallery.log.append(encodings, names) # fsync ke baad hi success
+            self.gallery = gallery.extended(encodings, names, gallery.version + 1)
+            self.enrollments += 1
+            compact = gallery.log.rows >= ENROLLMENT_CONFIG['compact_after']
+        print(f"Enrolled {name}: {len(encodings)} faces ({len(rejected)} images rejected), gallery v{self.gallery.version}.")
+        if compact:
+            Thread(target=self._compact_gallery_quietly, daemon=True).start()
+        return {
+            "name": name,
+            "new_student": new_student,
+            "faces": len(encodings),
+            "rejected": [{"image": os.path.basename(path), "reason": reason} for path, reason in rejected],
+        }
 
-            print(f"✅ ATTENDANCE MARKED: {name} for {self.current_subject} (late {late_min} min, slot {self.current_slot_id})")
+    def compact_gallery(self) -> dict:
+        """
+        Folds the enrollment log into the full store (see
+        gallery.compact_snapshot), re-derives the consolidated templates from
+        it when they are in use, and loads the gallery with a freshly built
+        index. A crash in between is safe: the old log no longer matches the
+        new store and is discarded on the next load, and templates older than
+        the full store are not loaded.
+        """
+        with self._gallery_lock:
+            gallery = self.gallery
+            if gallery.log is None or gallery.log.rows == 0:
+                return gallery.stats()
+            started = time.monotonic()
+            path = compact_snapshot(gallery, ENROLLMENT_CONFIG['manifest'])
+            if self.templates_path and os.path.exists(self.templates_path):
+                # Templates full store se dobara, taaki enrolled students unme bhi hon
+                encodings, names = read_gallery(path)
+                write_templates(encodings, names, self.templates_path, ENROLLMENT_CONFIG['manifest'],
+                                **ENROLLMENT_CONFIG['consolidate'])
+            source, kind = self._select_gallery_source()
+            self.gallery = load_snapshot(source, kind, MATCHER_CONFIG, version=gallery.version + 1,
+                                         enrollment_store=self.encodings_path)
+            self.compactions += 1
+            print(f"Gallery compacted into '{path}': {len(self.gallery)} faces from '{source}' "
+                  f"in {(time.monotonic() - started) * 1000:.0f} ms.")
+            return self.gallery.stats()
+
+    def _compact_gallery_quietly(self) -> None:
+        try:
+            self.compact_gallery()
         except Exception as e:
-            print(f"Mark attendance error: {e}")
+            print(f"Gallery compaction failed, keeping the enrollment log: {e}")
+
+    def gallery_stats(self) -> dict:
+        return {
+            **self.gallery.stats(),
+            "reloads": self.gallery_reloads,
+            "reload_errors": self.gallery_reload_errors,
+            "last_error": self.gallery_last_error,
+            "watching": self._gallery_watcher is not None,
+            "enrollments": self.enrollments,
+            "compactions": self.compactions,
+            "encoder": self._enrollment_encoder.stats() if self._enrollment_encoder else None,
+        }
+
+    def start_new_session(self, faculty: str, subject: str, camera_source, slot_id: str | None = None, manual_start_time: str | None = None,
+                          capture_settings: dict | None = None) -> AttendanceSession | None:
+        slot = resolve_slot(slot_id)
+        # CSV naam sirf faculty/subject/slot/date par depend karta hai: camera kholne se pehle hi clash check
+        csv_filename = session_csv_filename(subject, faculty, slot["id"] if slot else "NA", date.today())
+        with self._sessions_lock:
+            # Start ho rahe sessions bhi apna camera aur CSV claim karte hain
+            for other in self.sessions.values():
+                if not (other.session_active or other.session_id in self._starting):
+                    continue
+                if str(other.camera_source) == str(camera_source):
+                    print(f"Camera source {camera_source} is already used by session {other.session_id}.")
+                    return None
+                if other.csv_filename == csv_filename:
+                    print(f"Session for '{csv_filename}' is already running.")
+                    return None
+            session_id = secrets.token_urlsafe(6)
+            attendance_session = AttendanceSession(self, session_id, faculty, subject)
+            attendance_session.camera_source = camera_source
+            attendance_session.csv_filename = csv_filename
+            self.sessions[session_id] = attendance_session
+            self._starting.add(session_id)
+
+        started = False
+        try:
+            started = attendance_session.start(camera_source, slot, manual_start_time, capture_settings)
+        finally:
+            with self._sessions_lock:
+                self._starting.discard(session_id)
+                if started:
+                    self._last_session_id = session_id
+                else:
+                    self.sessions.pop(session_id, None)
+        if not started:
+            return None
+        print(f"Session {session_id} started ({len(self.list_sessions(active_only=True))} active).")
+        return attendance_session
+
+    def get_session(self, session_id: str | None = None) -> AttendanceSession | None:
+        """Session by id; without an id, the most recently started active session (single-camera clients)."""
+        with self._sessions_lock:
+            if session_id:
+                return self.sessions.get(session_id)
+            if self._last_session_id in self.sessions:
+                return self.sessions[self._last_session_id]
+            return next(reversed(self.sessions.values()), None)
+
+    def find_session_by_csv(self, csv_filename: str) -> AttendanceSession | None:
+        with self._sessions_lock:
+            for attendance_session in self.sessions.values():
+                if attendance_session.session_active and attendance_session.csv_filename == csv_filename:
+                    return attendance_session
+        return None
+
+    def list_sessions(self, active_only: bool = False) -> list[AttendanceSession]:
+        with self._sessions_lock:
+            return [o for o in self.sessions.values() if o.session_active or not active_only]
+
+    def stop_current_session(self, session_id: str | None = None) -> tuple[list, str]:
+        attendance_session = self.get_session(session_id)
+        if attendance_session is None:
+            return [], ""
+        result = attendance_session.stop()
+        # Stopped sessions kuch der registry me rehte hain taaki unki attendance/CSV abhi bhi mil sake
+        with self._sessions_lock:
+            stopped = [sid for sid, o in self.sessions.items() if not o.session_active]
+            for sid in stopped[:max(0, len(stopped) - MAX_STOPPED_SESSIONS)]:
+                del self.sessions[sid]
+        return result
+
+    def stop_all_sessions(self) -> None:
+        for attendance_session in self.list_sessions(active_only=True):
+            self.stop_current_session(attendance_session.session_id)
+
+    def flush_all_attendance(self) -> None:
+        for attendance_session in self.list_sessions():
+            attendance_session.flush_attendance(close=True)
 
 # Flask app
 app = Flask(__name__)
@@ -329,29 +1595,31 @@ ts = URLSafeTimedSerializer(app.secret_key)
 # More specific CORS setup to avoid browser policy issues
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-# Initialize everything
-init_db()
-
 def get_name_from_roll_number(roll_number):
     """
     Finds a student's full name from their roll number.
     ASSUMPTION: Your face encoding names are in 'Name_RollNumber' format.
     Example: If a face is named 'Vijay_101', this function will return 'Vijay_101'
              if the input roll_number is '101'.
+    Raises AmbiguousRollNumber if several students share the roll number (see Roster).
     """
     try:
-        for name in face_attendance.known_face_names:
-            # Check if the name ends with _RollNumber or is exactly RollNumber
-            # This makes it more flexible if names are just roll numbers
-            if name.endswith(f"_{roll_number}") or name == roll_number:
-                return name
-        print(f"No known face name found for roll number: {roll_number}")
-        return None
+        name = face_attendance.roster.lookup(roll_number)
+        if name is None:
+            print(f"No known face name found for roll number: {roll_number}")
+        return name
+    except AmbiguousRollNumber:
+        raise
     except Exception as e:
         print(f"Error finding name for roll number {roll_number}: {e}")
         return None
 
-face_attendance = FaceAttendanceSystem()
+# Initialize everything -- sirf app process me. Spawned workers (recognition pool,
+# enrollment encoder) `python app.py` wali script ko "__mp_main__" naam se dobara
+# import karte hain; unhe migrations, gallery load ya enrollment log replay nahi chahiye.
+if __name__ != "__mp_main__":
+    init_db()
+    face_attendance = FaceAttendanceSystem()
 
 def login_required(f):
     def decorated_function(*args, **kwargs):
@@ -361,6 +1629,19 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def admin_required(f):
+    # Role DB se har baar: role badalne par purana login admin nahi rehta
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'status': 'error', 'message': 'Login required'}), 401
+        with db.connection() as conn:
+            row = conn.execute('SELECT role FROM users WHERE id = ? AND is_active = 1', (session['user_id'],)).fetchone()
+        if not row or row[0] != 'admin':
+            return jsonify({'status': 'error', 'message': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
 # Routes with embedded HTML (avoiding template issues)
 @app.route('/')
 def home():
@@ -1078,6 +2359,18 @@ def attendance():
             <input type="text" id="camera_url" placeholder="rtsp://user:pass@ip:554/stream" />
             <div class="hint">If filled, this overrides the dropdown.</div>
           </div>
+          <div class="row">
+            <label>Capture (optional)</label>
+            <select id="capture_res">
+              <option value="">Camera default</option>
+              <option value="640x480">640 × 480</option>
+              <option value="1280x720">1280 × 720</option>
+              <option value="1920x1080">1920 × 1080</option>
+            </select>
+            <input type="number" id="capture_fps" min="1" max="60" placeholder="FPS (e.g. 15)" style="margin-top:6px;" />
+            <label style="display:flex; align-items:center; gap:6px; margin-top:6px;"><input type="checkbox" id="capture_mjpg" checked style="width:auto;" /> Prefer MJPEG (USB cameras)</label>
+            <div class="hint">Camera jo support kare wahi milta hai; actual values status me dikhte hain.</div>
+          </div>
           <div class="row">
             <label>Lecture Slot</label>
             <select id="slot"></select>
@@ -1110,6 +2403,8 @@ def attendance():
           <div class="pill">Current CSV: <span id="csvName" style="margin-left:6px; color:#fff;"></span></div>
           <div class="pill">Slot: <span id="slotName" style="margin-left:6px; color:#fff;"></span></div>
           <div class="pill">Expected Start: <span id="expStart" style="margin-left:6px; color:#fff;"></span></div>
+          <div class="pill">Recognition: <span id="recStats" style="margin-left:6px; color:#fff;">—</span></div>
+          <div class="pill">Camera: <span id="camStats" style="margin-left:6px; color:#fff;">—</span></div>
           <div id="downloadArea" style="margin-top:6px;"></div>
           <div class="table" id="tableWrap" style="display:none;">
             <table id="attTable">
@@ -1144,7 +2439,9 @@ def attendance():
     const btnStart = $('#btnStart'); const btnStop = $('#btnStop'); const btnRefresh = $('#btnRefresh');
     const csvName = $('#csvName'); const slotName = $('#slotName'); const expStart = $('#expStart');
     const downloadArea = $('#downloadArea'); const tableWrap = $('#tableWrap'); const attBody = $('#attBody');
-    let sessionActive = false; let currentCSV = ''; let currentSlot = ''; let expectedStart = '';
+    let sessionActive = false; let currentCSV = ''; let currentSlot = ''; let expectedStart = ''; let currentSessionId = '';
+    let attendanceCursor = 0; let attendanceEtag = ''; let attendanceSessionId = '';
+    let eventSource = null; let eventsLive = false; // SSE chal raha ho to polling band
 
     function setStatus(msg, detail = '') {
       statusBox.querySelector('div').innerHTML = `<strong>Status:</strong> ${msg}`;
@@ -1172,9 +2469,11 @@ def attendance():
         const res = await fetch('/api/cameras');
         const data = await res.json();
         cameraSel.innerHTML = '';
-        (data.cameras || [0]).forEach((idx) => {
+        const devices = (data.devices || []).length ? data.devices : (data.cameras || [0]).map((index) => ({ index, available: true }));
+        devices.forEach((d) => {
           const opt = document.createElement('option');
-          opt.value = idx; opt.textContent = `Camera ${idx}`;
+          opt.value = d.index; opt.textContent = `Camera ${d.index}${d.name ? ` • ${d.name}` : ''}${d.in_use ? ' (in use)' : ''}`;
+          opt.disabled = !d.available;
           cameraSel.appendChild(opt);
         });
       } catch { cameraSel.innerHTML = '<option value="0">Camera 0</option>'; }
@@ -1196,7 +2495,7 @@ def attendance():
       } catch { slotSel.innerHTML = '<option value="">No slots</option>'; }
     }
 
-    function startStream() { streamImg.src = `/video_feed?ts=${Date.now()}`; }
+    function startStream() { streamImg.src = `/video_feed?session_id=${encodeURIComponent(currentSessionId)}&ts=${Date.now()}`; }
     function stopStream() { streamImg.src = ''; }
 
     async function startSession() {
@@ -1204,19 +2503,23 @@ def attendance():
       const url = $('#camera_url').value.trim();
       const camera_source = url !== '' ? url : (cameraSel.value !== '' ? cameraSel.value : 0);
       const slot_id = slotSel.value || null; const manual_time = $('#manual_time').value || null;
+      const [capW, capH] = ($('#capture_res').value || 'x').split('x');
+      const capture = { width: capW || null, height: capH || null, fps: $('#capture_fps').value || null,
+                        fourcc: $('#capture_mjpg').checked ? 'MJPG' : null, buffer_size: url !== '' ? null : 1 };
       if (!faculty || !subject) { setStatus('Error', 'Faculty and Subject are required.'); return; }
       setStatus('Starting…', 'Initializing camera and session'); btnStart.disabled = true;
       try {
         const res = await fetch('/api/start_session', {
           method: 'POST', headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ faculty, subject, camera_source, slot_id, manual_start_time: manual_time })
+          body: JSON.stringify({ faculty, subject, camera_source, slot_id, manual_start_time: manual_time, capture })
         });
         const data = await res.json();
         if (data.status === 'success') {
-          sessionActive = true; currentCSV = data.csv || ''; currentSlot = data.slot_id || ''; expectedStart = data.expected_start || '';
+          sessionActive = true; currentSessionId = data.session_id || ''; currentCSV = data.csv || ''; currentSlot = data.slot_id || ''; expectedStart = data.expected_start || '';
           csvName.textContent = currentCSV || '—'; slotName.textContent = currentSlot || '—'; expStart.textContent = expectedStart || '—';
-          setStatus('Running', 'Session active. Face detection is active.');
-          btnStop.disabled = false; startStream(); await loadAttendanceDetailed(); updateDownloadLink();
+          const cap = data.capture || {};
+          setStatus('Running', `Session active. Face detection is active.${cap.width ? ` Camera: ${cap.width}×${cap.height} @ ${cap.fps || '?'} fps${cap.fourcc ? ' ' + cap.fourcc : ''}.` : ''}`);
+          btnStop.disabled = false; startStream(); await loadAttendanceDetailed(); updateDownloadLink(); connectEvents();
         } else { setStatus('Error', data.message || 'Failed to start session'); btnStart.disabled = false; }
       } catch (error) {
         console.error('Start session error:', error); setStatus('Error', 'Network or server issue starting session'); btnStart.disabled = false;
@@ -1226,9 +2529,9 @@ def attendance():
     async function stopSession() {
       if (!sessionActive) return; setStatus('Stopping…', 'Releasing camera and finalizing CSV'); btnStop.disabled = true;
       try {
-        const res = await fetch('/api/stop_session', { method: 'POST' }); const data = await res.json();
+        const res = await fetch('/api/stop_session', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ session_id: currentSessionId }) }); const data = await res.json();
         if (data.status === 'success') {
-          sessionActive = false; setStatus('Stopped', 'Session closed. You can download the CSV.'); stopStream();
+          sessionActive = false; disconnectEvents(); setStatus('Stopped', 'Session closed. You can download the CSV.'); stopStream();
           if (data.filename) { currentCSV = data.filename; csvName.textContent = currentCSV; updateDownloadLink(); }
           await loadAttendanceDetailed();
         } else { setStatus('Error', data.message || 'Failed to stop session'); btnStop.disabled = false; }
@@ -1247,21 +2550,96 @@ def attendance():
       }
     }
 
+    function appendAttendanceRow(row) {
+      const tr = document.createElement('tr');
+      const tdName = document.createElement('td'); tdName.textContent = row.name || '';
+      const tdTime = document.createElement('td'); tdTime.textContent = row.time || '';
+      const tdLate = document.createElement('td'); tdLate.className = 'right ' + ((+row.late > 0) ? 'late' : 'ontime'); tdLate.textContent = (row.late ?? 0);
+      tr.appendChild(tdName); tr.appendChild(tdTime); tr.appendChild(tdLate); attBody.appendChild(tr);
+      tableWrap.style.display = '';
+    }
+
     async function loadAttendanceDetailed() {
       try {
-        const res = await fetch('/api/attendance_detailed'); if (!res.ok) throw new Error(); const items = await res.json();
+        // Same session ho to ETag bhejna: list nahi badli to server 304 deta hai
+        const headers = (attendanceEtag && attendanceSessionId === currentSessionId) ? { 'If-None-Match': attendanceEtag } : {};
+        const res = await fetch(`/api/attendance_detailed?session_id=${encodeURIComponent(currentSessionId)}`, { headers, cache: 'no-store' });
+        if (res.status === 304) return; if (!res.ok) throw new Error(); const items = await res.json();
+        attendanceEtag = res.headers.get('ETag') || ''; attendanceSessionId = currentSessionId;
+        attendanceCursor = parseInt(res.headers.get('X-Attendance-Seq') || items.length, 10);
         attBody.innerHTML = ''; if (items.length === 0) { tableWrap.style.display = 'none'; return; }
-        tableWrap.style.display = '';
-        for (const row of items) {
-          const tr = document.createElement('tr');
-          const tdName = document.createElement('td'); tdName.textContent = row.name || '';
-          const tdTime = document.createElement('td'); tdTime.textContent = row.time || '';
-          const tdLate = document.createElement('td'); tdLate.className = 'right ' + ((+row.late > 0) ? 'late' : 'ontime'); tdLate.textContent = (row.late ?? 0);
-          tr.appendChild(tdName); tr.appendChild(tdTime); tr.appendChild(tdLate); attBody.appendChild(tr);
-        }
+        for (const row of items) { appendAttendanceRow(row); }
       } catch (error) { console.error('Load attendance error:', error); }
     }
 
+    async function pollAttendanceFeed() {
+      if (!sessionActive || !currentSessionId || eventsLive) return;
+      if (attendanceSessionId !== currentSessionId) { await loadAttendanceDetailed(); return; }
+      try {
+        const res = await fetch(`/api/attendance_feed?session_id=${encodeURIComponent(currentSessionId)}&since=${attendanceCursor}`, { cache: 'no-store' });
+        if (!res.ok) return; const data = await res.json();
+        if (data.reset) { attendanceEtag = ''; await loadAttendanceDetailed(); return; }
+        for (const row of data.items || []) { appendAttendanceRow(row); }
+        attendanceCursor = data.cursor;
+      } catch (error) { console.error('Attendance feed error:', error); }
+    }
+
+    function renderRecStats(sch, gate, trk, recFps) {
+      $('#recStats').textContent = sch ? `${recFps ?? sch.recognition_rate}/s • ${sch.ema_latency_ms ?? '—'} ms • ${sch.target_width}px • CPU ${Math.round(sch.cpu_load * 100)}%` : '—';
+      if (gate) { $('#recStats').textContent += ` • gated ${gate.skipped}/${gate.frames} (ROI ${gate.roi})`; }
+      if (trk) { $('#recStats').textContent += ` • ${trk.tracks} tracked, ${trk.encode_saving_pct}% encodes saved`; }
+    }
+
+    function renderCamStats(cam) {
+      if (cam && cam.connected === false) {
+        $('#camStats').textContent = `Reconnecting (retry in ${cam.backoff_s}s) • ${cam.last_error || ''}`; return;
+      }
+      $('#camStats').textContent = cam ? `${cam.ok ? 'OK' : cam.state === 'reconnecting' ? 'Reconnecting' : 'No signal'} • ${cam.fps} fps • ${cam.frame_age_ms ?? '—'} ms old${cam.reconnects ? ` • ${cam.reconnects} reconnects` : ''}` : '—';
+    }
+
+    async function loadSessionStatus() {
+      if (!sessionActive || eventsLive) return;
+      try {
+        const res = await fetch(`/api/session_status?session_id=${encodeURIComponent(currentSessionId)}`); if (!res.ok) return;
+        const data = await res.json(); const s = data.session || {};
+        renderRecStats(s.scheduler, s.motion_gate, s.tracker); renderCamStats(s.camera);
+      } catch (error) { console.error('Load session status error:', error); }
+    }
+
+    function addMarks(items) {
+      for (const row of items || []) {
+        if (row.seq <= attendanceCursor) continue; // Snapshot aur live event dono me aa sakta hai
+        appendAttendanceRow(row); attendanceCursor = row.seq;
+      }
+    }
+
+    function disconnectEvents() {
+      if (eventSource) { eventSource.close(); eventSource = null; } eventsLive = false;
+    }
+
+    function connectEvents() {
+      disconnectEvents(); if (!currentSessionId) return;
+      const es = new EventSource(`/api/session_events?session_id=${encodeURIComponent(currentSessionId)}&since=${attendanceCursor}`);
+      eventSource = es;
+      const on = (name, fn) => es.addEventListener(name, (e) => { if (eventSource === es) fn(JSON.parse(e.data)); });
+      on('snapshot', (d) => { eventsLive = true; addMarks(d.items); const s = d.session || {}; renderRecStats(s.scheduler, s.motion_gate, s.tracker); renderCamStats(s.camera); });
+      on('mark', (row) => addMarks([row]));
+      on('stats', (d) => renderRecStats(d.scheduler, d.motion_gate, d.tracker, d.recognition_fps));
+      on('camera', renderCamStats);
+      on('session', (d) => {
+        if (d.state === 'stopped' && sessionActive) {
+          sessionActive = false; btnStop.disabled = true; btnStart.disabled = false; stopStream();
+          setStatus('Stopped', 'Session was stopped. You can download the CSV.');
+        }
+      });
+      on('end', (d) => {
+        disconnectEvents();
+        // Slow client drop hua: cursor se dobara judna (chhoote marks snapshot me aa jayenge)
+        if (d.reason === 'slow_client' && sessionActive) { setTimeout(connectEvents, 1000); }
+      });
+      es.onerror = () => { if (eventSource === es) eventsLive = false; }; // Browser khud reconnect karega; tab tak polling
+    }
+
     btnStart.addEventListener('click', startSession);
     btnStop.addEventListener('click', stopSession);
     btnRefresh.addEventListener('click', loadAttendanceDetailed);
@@ -1274,7 +2652,9 @@ def attendance():
     (async function init() {
       setStatus('Idle', 'Fill details, select camera and slot, then Start.');
       await Promise.all([loadCameras(), loadSlots()]);
-      setInterval(loadAttendanceDetailed, 10000); // Auto-refresh attendance list every 10 seconds
+      // Live updates SSE (/api/session_events) se; ye polling sirf tab jab event stream connected na ho
+      setInterval(pollAttendanceFeed, 1000); // Har second sirf naye marks (cursor ke baad wale)
+      setInterval(loadSessionStatus, 3000); // Recognition scheduler ke current decisions
     })();
   </script>
   <div id="qrModal" class="logout-modal" style="display:none; align-items:center; justify-content:center;">
@@ -1298,11 +2678,10 @@ def api_login():
         username = data.get('username')
         password = data.get('password')
         
-        conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        c.execute('SELECT id, username, email, password_hash FROM users WHERE username = ? AND is_active = 1', (username,))
-        user = c.fetchone()
-        conn.close()
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, username, email, password_hash FROM users WHERE username = ? AND is_active = 1', (username,))
+            user = c.fetchone()
         
         if user and verify_password(password, user[3]):
             session['user_id'] = user[0]
@@ -1330,12 +2709,9 @@ def api_register():
         
         password_hash = hash_password(password)
         
-        conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
-                 (username, email, password_hash))
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            conn.execute('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                         (username, email, password_hash))
         print(f"User {username} registered successfully.")
         return jsonify({'status': 'success', 'message': 'Registration successful'})
     except sqlite3.IntegrityError:
@@ -1351,19 +2727,19 @@ def api_forgot_password():
         data = request.get_json()
         email = data.get('email')
         
-        conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        c.execute('SELECT id FROM users WHERE email = ?', (email,))
-        user = c.fetchone()
-        
-        if user:
-            token = secrets.token_urlsafe(32)
-            expires_at = datetime.now() + timedelta(hours=1)
-            
-            c.execute('INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (?, ?, ?)',
-                     (user[0], token, expires_at))
-            conn.commit()
-            
+        token = None
+        with db.transaction() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id FROM users WHERE email = ?', (email,))
+            user = c.fetchone()
+            if user:
+                token = secrets.token_urlsafe(32)
+                expires_at = datetime.now() + timedelta(hours=1)
+                c.execute('INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (?, ?, ?)',
+                         (user[0], token, expires_at))
+
+        # Email DB connection chhodne ke baad (SMTP slow ho sakta hai)
+        if token:
             reset_link = f"{request.url_root}reset-password/{token}"
             email_body = f"""
             <h2>Password Reset Request</h2>
@@ -1377,7 +2753,6 @@ def api_forgot_password():
         else:
             print(f"Forgot password request for non-existent email: {email}")
         
-        conn.close()
         # Always return a generic success message to prevent email enumeration
         return jsonify({'status': 'success', 'message': 'If email exists, reset link has been sent'})
     except Exception as e:
@@ -1391,25 +2766,23 @@ def api_reset_password():
         token = data.get('token')
         password = data.get('password')
         
-        conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        c.execute('SELECT user_id, expires_at FROM password_reset_tokens WHERE token = ? AND used = 0', (token,))
-        token_data = c.fetchone()
-        
-        if not token_data:
-            print(f"Reset password failed: Invalid or used token '{token}'")
-            return jsonify({'status': 'error', 'message': 'Invalid or expired token'}), 400
-        
-        expires_at = datetime.fromisoformat(token_data[1])
-        if datetime.now() > expires_at:
-            print(f"Reset password failed: Token '{token}' has expired.")
-            return jsonify({'status': 'error', 'message': 'Token has expired'}), 400
-        
-        password_hash = hash_password(password)
-        c.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, token_data[0]))
-        c.execute('UPDATE password_reset_tokens SET used = 1 WHERE token = ?', (token,))
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            c = conn.cursor()
+            c.execute('SELECT user_id, expires_at FROM password_reset_tokens WHERE token = ? AND used = 0', (token,))
+            token_data = c.fetchone()
+            
+            if not token_data:
+                print(f"Reset password failed: Invalid or used token '{token}'")
+                return jsonify({'status': 'error', 'message': 'Invalid or expired token'}), 400
+            
+            expires_at = datetime.fromisoformat(token_data[1])
+            if datetime.now() > expires_at:
+                print(f"Reset password failed: Token '{token}' has expired.")
+                return jsonify({'status': 'error', 'message': 'Token has expired'}), 400
+            
+            password_hash = hash_password(password)
+            c.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, token_data[0]))
+            c.execute('UPDATE password_reset_tokens SET used = 1 WHERE token = ?', (token,))
         
         print(f"Password reset successful for user ID: {token_data[0]}")
         return jsonify({'status': 'success', 'message': 'Password reset successful'})
@@ -1431,25 +2804,94 @@ def api_logout():
     print("User logged out.")
     return jsonify({'status': 'success', 'message': 'Logged out successfully'})
 
+@app.route('/api/admin/gallery')
+@admin_required
+def gallery_status():
+    return jsonify({'status': 'success', 'gallery': face_attendance.gallery_stats()})
+
+@app.route('/api/admin/reload_gallery', methods=['POST'])
+@admin_required
+def reload_gallery():
+    # Default background me; {"wait": true} par naya snapshot swap hone tak ruko
+    data = request.get_json(silent=True) or {}
+    if not data.get('wait'):
+        face_attendance.reload_gallery_async()
+        return jsonify({'status': 'accepted', 'gallery': face_attendance.gallery_stats()}), 202
+    try:
+        face_attendance.reload_gallery()
+        return jsonify({'status': 'success', 'gallery': face_attendance.gallery_stats()})
+    except Exception as e:
+        print(f"Gallery reload error: {e}")
+        return jsonify({'status': 'error', 'message': f'Gallery reload failed: {e}',
+                        'gallery': face_attendance.gallery_stats()}), 500
+
+@app.route('/api/enroll', methods=['POST'])
+@admin_required
+def enroll_student():
+    # multipart: name + images; ya JSON {name, session_id, frames}: active session ke camera se capture
+    try:
+        data = request.get_json(silent=True) if request.is_json else request.form
+        try:
+            name = safe_student_name((data or {}).get('name'))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        if request.files:
+            uploads = [(f.filename, f.read()) for f in request.files.getlist('images')]
+        else:
+            attendance_session = face_attendance.get_session((data or {}).get('session_id'))
+            widget = attendance_session.camera_widget if attendance_session and attendance_session.session_active else None
+            if widget is None:
+                return jsonify({'status': 'error', 'message': 'Upload images or start a session to capture from its camera.'}), 400
+            try:
+                count = max(1, min(int(data.get('frames', ENROLLMENT_CONFIG['capture_frames'])), ENROLLMENT_CONFIG['max_images']))
+            except (TypeError, ValueError):
+                return jsonify({'status': 'error', 'message': 'frames must be a number.'}), 400
+            uploads, last_seq = [], -1
+            for _ in range(count):
+                # Har baar naya frame (copy), ring slot pin nahi rehta
+                with widget.latest_frame(last_seq, timeout=2.0) as (last_seq, frame, _jpeg):
+                    if frame is not None:
+                        uploads.append(frame.copy())
+                time.sleep(ENROLLMENT_CONFIG['capture_interval'])
+        if not uploads:
+            return jsonify({'status': 'error', 'message': 'No images received.'}), 400
+        if len(uploads) > ENROLLMENT_CONFIG['max_images']:
+            return jsonify({'status': 'error', 'message': f"At most {ENROLLMENT_CONFIG['max_images']} images per enrollment."}), 400
+        paths = save_images(ENROLLMENT_CONFIG['dataset_dir'], name, uploads)
+        if not paths:
+            return jsonify({'status': 'error', 'message': 'None of the uploads are readable images.'}), 400
+        try:
+            result = face_attendance.enroll_student(name, paths)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 422
+        return jsonify({'status': 'success', **result, 'gallery': face_attendance.gallery_stats()})
+    except Exception as e:
+        print(f"Enrollment error: {e}")
+        return jsonify({'status': 'error', 'message': f'Enrollment failed: {e}'}), 500
+
+@app.route('/api/admin/compact_gallery', methods=['POST'])
+@admin_required
+def compact_gallery():
+    try:
+        face_attendance.compact_gallery()
+        return jsonify({'status': 'success', 'gallery': face_attendance.gallery_stats()})
+    except Exception as e:
+        print(f"Gallery compaction error: {e}")
+        return jsonify({'status': 'error', 'message': f'Gallery compaction failed: {e}'}), 500
+
 @app.route('/api/cameras')
 @login_required
 def list_cameras():
+    # Hardware ko nahi chhoota: cached inventory + live in-use flags
     try:
-        cameras = []
-        # Check first 5 cameras, assuming 0 is usually the default webcam
-        for index in range(5):  
-            cap = cv2.VideoCapture(index)
-            if cap.isOpened():
-                cameras.append(index)
-                cap.release()
-            else:
-                cap.release() # Release even if not opened to prevent resource leaks
-                # If a camera index fails, subsequent ones might also fail, so we can break
-                # However, some systems might have non-contiguous indices, so keeping it to 5 is a balance.
-                # For robustness, you might want to check more or handle specific errors.
-                # break 
-        print(f"Detected cameras: {cameras}")
-        return jsonify({"cameras": cameras if cameras else [0]}) # Default to [0] if no cameras found
+        inventory = face_attendance.get_camera_inventory()
+        if request.args.get('refresh') in ('1', 'true'):
+            inventory.request_refresh()
+        inventory.wait_ready(CAMERA_INVENTORY_CONFIG['first_wait'])
+        devices = inventory.devices()
+        cameras = [d["index"] for d in devices if d["available"]]
+        return jsonify({"cameras": cameras if cameras else [0], # Default to [0] if no cameras found
+                        "devices": devices, "inventory": inventory.stats()})
     except Exception as e:
         print(f"Camera list error: {e}")
         return jsonify({"cameras":[0], "message": "Error detecting cameras, defaulting to Camera 0." })
@@ -1478,78 +2920,121 @@ def list_slots():
         print(f"Slots error: {e}")
         return jsonify({"slots": [], "autoSelected": None, "serverNow": datetime.now().strftime("%H:%M"), "message": "Error loading lecture slots."})
 
+def stream_tier_params(args) -> tuple[int | None, int | None, float | None]:
+    """(width, quality, fps) from /video_feed query args, snapped to a few tiers; raises ValueError."""
+    width = args.get('width', type=int)
+    quality = args.get('quality', type=int)
+    fps = args.get('fps', type=float)
+    if any(args.get(k) and v is None for k, v in (('width', width), ('quality', quality), ('fps', fps))):
+        raise ValueError("width, quality and fps must be numbers")
+    if width is not None:
+        step = STREAM_CONFIG['width_step']
+        width = max(STREAM_CONFIG['min_width'], width // step * step)
+    if quality is not None:
+        low, high = STREAM_CONFIG['quality_range']
+        step = STREAM_CONFIG['quality_step']
+        quality = min(high, max(low, round(quality / step) * step))
+    if fps is not None:
+        if fps <= 0:
+            raise ValueError("fps must be positive")
+        fps = min(fps, STREAM_CONFIG['max_fps'])
+    return width, quality, fps
+
 @app.route('/video_feed')
 @login_required
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
-
-def generate_frames():
-    last_known_locations, last_known_names, frame_counter = [], [], 0
-    while True:
-        try:
-            if not face_attendance.session_active or face_attendance.camera_widget is None or not face_attendance.camera_widget.capture.isOpened():
-                blank_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                cv2.putText(blank_frame, "Camera Off - Start a Session", (50, 240),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                ret, buffer = cv2.imencode('.jpg', blank_frame)
-                if not ret:
+    session_id = request.args.get('session_id')
+    try:
+        width, quality, fps = stream_tier_params(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid stream parameters: {e}"}), 400
+    return Response(generate_frames(session_id, width, quality, fps), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def generate_frames(session_id: str | None = None, width: int | None = None, quality: int | None = None,
+                    fps: float | None = None):
+    # Viewer sirf latest published frame leta hai; recognition RecognitionWorker me hoti hai.
+    # fps tier ka hissa hai (worker utne hi frames tier ke liye copy karta hai); pacing yahan bhi.
+    # Slow client ke beech ke frames queue nahi hote, seedhe skip: agla yield hamesha latest frame.
+    blank_bytes = blank_frame_jpeg(width=width, quality=quality)
+    interval = 1.0 / fps if fps else 0.0
+    last_seq, next_due = 0, 0.0
+    broadcaster, tier = None, None
+    try:
+        while True:
+            try:
+                attendance_session = face_attendance.get_session(session_id)
+                if attendance_session is None or not attendance_session.session_active or attendance_session.recognition_worker is None:
+                    if broadcaster is not None:
+                        broadcaster.unsubscribe(tier)
+                        broadcaster, tier, last_seq = None, None, 0
+                    if blank_bytes:
+                        yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + blank_bytes + b'\r\n')
                     time.sleep(0.1)
                     continue
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                time.sleep(0.1)
-                continue
 
-            success, frame = face_attendance.camera_widget.read()
-            if not success or frame is None:
-                print("Failed to read frame from camera.")
-                time.sleep(0.05)
-                continue
-
-            frame_counter += 1
-            if frame_counter % 5 == 0: # Process every 5th frame for performance
-                last_known_locations, last_known_names = [], []
-                small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                
-                # Face detection
-                locations = face_recognition.face_locations(rgb_small_frame, model="hog")
-                encodings = face_recognition.face_encodings(rgb_small_frame, locations)
-
-                for enc, location in zip(encodings, locations):
-                    matches = face_recognition.compare_faces(face_attendance.known_face_encodings, enc, tolerance=0.5)
-                    name = "Unknown"
-                    if True in matches:
-                        first_match_index = matches.index(True)
-                        name = face_attendance.known_face_names[first_match_index]
-                        face_attendance._mark_attendance(name) # Mark attendance
-
-                    last_known_locations.append(location)
-                    last_known_names.append(name)
-
-            # Draw bounding boxes and names on the frame
-            for (top, right, bottom, left), name in zip(last_known_locations, last_known_names):
-                top *= 2; right *= 2; bottom *= 2; left *= 2 # Scale back up locations
-                
-                if name in face_attendance.marked_attendance:
-                    color, status = (0, 255, 0), "PRESENT" # Green for marked attendance
+                if broadcaster is not attendance_session.broadcaster: # Naya session shuru hua
+                    if broadcaster is not None:
+                        broadcaster.unsubscribe(tier)
+                    broadcaster, last_seq = attendance_session.broadcaster, 0
+                    tier = broadcaster.subscribe(width, quality, fps)
+
+                if interval:
+                    # fps cap: itni der ruk kar jo latest hai wahi bhejna
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                if tier is None:
+                    last_seq, frame_bytes = broadcaster.wait_for_frame(last_seq, timeout=1.0)
                 else:
-                    color, status = (255, 0, 0), "UNKNOWN" # Red for unknown or not yet marked
-                
-                cv2.rectangle(frame, (left, top), (right, bottom), color, 3)
-                cv2.rectangle(frame, (left, bottom - 60), (right, bottom), color, cv2.FILLED)
-                cv2.putText(frame, name, (left + 6, bottom - 35), cv2.FONT_HERSHEY_DUPLEX, 0.7, (255, 255, 255), 2)
-                cv2.putText(frame, status, (left + 6, bottom - 10), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 2)
-
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                print("Failed to encode frame to JPG.")
+                    last_seq, frame_bytes = broadcaster.wait_for_tier_frame(tier, last_seq, timeout=1.0)
+                if frame_bytes is None:
+                    continue
+                next_due = time.monotonic() + interval
+                yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            except Exception as e:
+                print(f"Frame generation error: {e}")
+                time.sleep(0.1) # Prevent busy-waiting on errors
+    finally:
+        # Client chala gaya (generator close): worker us tier ke liye kaam band kare
+        if broadcaster is not None:
+            broadcaster.unsubscribe(tier)
+
+def sse_message(event: str, data: dict, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def generate_session_events(attendance_session, since: int):
+    # Pehle subscribe, phir snapshot: beech me aaya mark dono me ho sakta hai, client seq se dedupe karta hai
+    events = attendance_session.events
+    q = events.subscribe()
+    try:
+        missed, cursor = attendance_session.attendance_since(since)
+        yield sse_message("snapshot", {"session": attendance_session.info(), "items": missed, "cursor": cursor})
+        while True:
+            try:
+                event_id, event, data = q.get(timeout=SSE_CONFIG['keepalive'])
+            except queue.Empty:
+                yield ": keepalive\n\n" # Band connection yahin pakda jaata hai
                 continue
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except Exception as e:
-            print(f"Frame generation error: {e}")
-            time.sleep(0.1) # Prevent busy-waiting on errors
+            yield sse_message(event, data, event_id)
+            if event == "end":
+                break
+    finally:
+        events.unsubscribe(q)
+
+@app.route('/api/session_events')
+@login_required
+def api_session_events():
+    # SSE: mark, session (started/stopped), stats (recognition FPS), camera (health), end
+    attendance_session = face_attendance.get_session(request.args.get('session_id'))
+    if attendance_session is None:
+        return jsonify({"status": "error", "message": "Session not found."}), 404
+    try:
+        since = max(0, int(request.args.get('since', 0)))
+    except ValueError:
+        since = 0
+    return Response(generate_session_events(attendance_session, since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/start_session', methods=['POST'])
 @login_required
@@ -1561,18 +3046,25 @@ def start_session():
         camera_source = data.get('camera_source', 0)
         slot_id = data.get('slot_id')
         manual_start_time = data.get('manual_start_time')
+        try:
+            capture_settings = normalize_capture_settings(data.get('capture'))
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({"status": "error", "message": f"Invalid capture settings: {e}"}), 400
 
         if faculty and subject:
             print(f"Attempting to start session for Faculty: {faculty}, Subject: {subject}, Camera: {camera_source}, Slot: {slot_id}, Manual Time: {manual_start_time}")
-            success = face_attendance.start_new_session(faculty, subject, camera_source, slot_id, manual_start_time)
-            if success:
+            attendance_session = face_attendance.start_new_session(faculty, subject, camera_source, slot_id, manual_start_time, capture_settings)
+            if attendance_session:
                 print("Session started successfully.")
                 return jsonify({
                     "status": "success",
                     "message": "Session started successfully.",
-                    "slot_id": face_attendance.current_slot_id,
-                    "expected_start": face_attendance.expected_start_dt.strftime("%H:%M") if face_attendance.expected_start_dt else None,
-                    "csv": face_attendance.csv_filename
+                    "session_id": attendance_session.session_id,
+                    "slot_id": attendance_session.current_slot_id,
+                    "expected_start": attendance_session.expected_start_dt.strftime("%H:%M") if attendance_session.expected_start_dt else None,
+                    "csv": attendance_session.csv_filename,
+                    "capture": attendance_session.camera_widget.negotiated if attendance_session.camera_widget else None,
+                    "camera": attendance_session.camera_widget.health() if attendance_session.camera_widget else None,
                 })
             else:
                 print(f"Failed to start session: Camera initialization failed for source {camera_source}.")
@@ -1587,11 +3079,14 @@ def start_session():
 @login_required
 def stop_session():
     try:
-        final_list, filename = face_attendance.stop_current_session()
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id') or request.args.get('session_id')
+        final_list, filename = face_attendance.stop_current_session(session_id)
         print(f"Session stopped. Final attendees: {len(final_list)}, CSV: {filename}")
         return jsonify({
             "status": "success",
             "message": "Session stopped.",
+            "session_id": session_id,
             "final_attendance": final_list,
             "filename": filename
         })
@@ -1599,46 +3094,138 @@ def stop_session():
         print(f"Stop session API error: {e}")
         return jsonify({"status": "error", "message": f"Session stop failed due to an internal error: {str(e)}"}), 500
 
+@app.route('/api/sessions')
+@login_required
+def api_sessions():
+    try:
+        return jsonify({
+            "sessions": [o.info() for o in face_attendance.list_sessions()],
+            "recognition_backend": face_attendance.get_recognition_backend().stats(),
+            "database": db.pool.stats(),
+        })
+    except Exception as e:
+        print(f"Sessions API error: {e}")
+        return jsonify({"sessions": [], "message": f"Error listing sessions: {str(e)}"})
+
+@app.route('/api/session_status')
+@login_required
+def api_session_status():
+    try:
+        attendance_session = face_attendance.get_session(request.args.get('session_id'))
+        if attendance_session is None:
+            return jsonify({"status": "error", "message": "Session not found."}), 404
+        return jsonify({
+            "status": "success",
+            "session": attendance_session.info(),
+            "recognition_backend": face_attendance.get_recognition_backend().stats(),
+        })
+    except Exception as e:
+        print(f"Session status API error: {e}")
+        return jsonify({"status": "error", "message": f"Error fetching session status: {str(e)}"}), 500
+
 @app.route('/api/attendance_detailed')
 @login_required
 def api_attendance_detailed():
     try:
-        items = []
-        if face_attendance.csv_filename and os.path.exists(face_attendance.csv_filename):
-            with open(face_attendance.csv_filename, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    items.append({
-                        "faculty": row.get("Faculty"),
-                        "subject": row.get("Subject"),
-                        "name": row.get("Student Name"),
-                        "time": row.get("Timestamp"),
-                        "late": int(row.get("LateMinutes") or 0),
-                        "slot": row.get("Slot"),
-                    })
-        # print(f"Returning {len(items)} detailed attendance records.") # Uncomment for verbose logging
-        return jsonify(items)
+        attendance_session = face_attendance.get_session(request.args.get('session_id'))
+        if attendance_session is None:
+            return jsonify([])
+        # Poori list session ke in-memory journal se; ETag match ho to body bhejna hi nahi
+        etag = attendance_session.attendance_etag()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            items, _ = attendance_session.attendance_since(0)
+            response = jsonify(items)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Attendance-Seq'] = str(len(attendance_session.attendance_records))
+        # print(f"Returning detailed attendance records.") # Uncomment for verbose logging
+        return response
     except Exception as e:
         print(f"Attendance detailed API error: {e}")
         return jsonify([], {"message": f"Error fetching detailed attendance: {str(e)}"})
 
+@app.route('/api/attendance_feed')
+@login_required
+def api_attendance_feed():
+    # Incremental feed: sirf `since` ke baad wale records; client `cursor` agli baar bhejta hai
+    try:
+        attendance_session = face_attendance.get_session(request.args.get('session_id'))
+        if attendance_session is None:
+            return jsonify({"status": "error", "message": "Session not found."}), 404
+        try:
+            since = max(0, int(request.args.get('since', 0)))
+        except ValueError:
+            return jsonify({"status": "error", "message": "since must be an integer."}), 400
+        items, cursor = attendance_session.attendance_since(since)
+        return jsonify({
+            "status": "success",
+            "session_id": attendance_session.session_id,
+            "active": attendance_session.session_active,
+            "items": items,
+            "cursor": cursor,
+            # Client ka cursor journal se aage hai (naya session / restart): poori list dobara lo
+            "reset": since > cursor,
+        })
+    except Exception as e:
+        print(f"Attendance feed API error: {e}")
+        return jsonify({"status": "error", "message": f"Error fetching attendance feed: {str(e)}"}), 500
+
 @app.route('/api/attendance')
 @login_required
 def api_attendance():
     try:
-        # This route is used by the frontend to get the list of marked attendees for the current session.
-        # It's not reading from CSV directly, but from the in-memory set.
+        # Current session ke marked students ke naam (session ke attendance journal se)
         # The detailed attendance is handled by api_attendance_detailed.
-        return jsonify(list(face_attendance.marked_attendance))
+        attendance_session = face_attendance.get_session(request.args.get('session_id'))
+        if attendance_session is None:
+            return jsonify([])
+        items, _ = attendance_session.attendance_since(0)
+        return jsonify([item["name"] for item in items])
     except Exception as e:
         print(f"Attendance API error: {e}")
         return jsonify([], {"message": f"Error fetching attendance list: {str(e)}"})
 
+@app.route('/api/attendance_report')
+@login_required
+def api_attendance_report():
+    # Cross-session report: ek din (aur optional slot) ke saare sessions, (att_date, slot_id) index se
+    try:
+        att_date = request.args.get('date') or date.today().isoformat()
+        slot_id = request.args.get('slot_id')
+        for attendance_session in face_attendance.list_sessions(active_only=True):
+            attendance_session.flush_attendance()
+        query = '''SELECT session_key, faculty, subject, student_name, marked_time, late_minutes, slot_id
+                   FROM attendance WHERE att_date = ?'''
+        params = [att_date]
+        if slot_id:
+            query += ' AND slot_id = ?'
+            params.append(slot_id)
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute(query + ' ORDER BY slot_id, session_key, id', params)
+            rows = c.fetchall()
+        items = [{"session": key, "faculty": faculty, "subject": subject, "name": name, "time": marked_time,
+                  "late": late or 0, "slot": slot}
+                 for key, faculty, subject, name, marked_time, late, slot in rows]
+        return jsonify({"status": "success", "date": att_date, "slot_id": slot_id, "count": len(items), "items": items})
+    except Exception as e:
+        print(f"Attendance report API error: {e}")
+        return jsonify({"status": "error", "message": f"Error building attendance report: {str(e)}"}), 500
+
 @app.route('/api/download/<path:filename>')
 @login_required
 def download_file(filename):
     try:
         directory = os.getcwd()
+        # Attendance CSV DB se usi waqt banti hai (sirf session key jaise plain file names)
+        if os.path.basename(filename) == filename and filename.startswith("attendance_") and filename.endswith(".csv"):
+            attendance_session = face_attendance.find_session_by_csv(filename)
+            if attendance_session:
+                attendance_session.flush_attendance()
+            if load_attendance(filename) or attendance_session:
+                export_attendance_csv(filename, os.path.join(directory, filename))
         print(f"Attempting to download file: {filename} from {directory}")
         return send_from_directory(directory, filename, as_attachment=True)
     except FileNotFoundError:
@@ -1801,25 +3388,30 @@ def submit_qr_attendance():
         return render_template_string("<h1>❌ Submission failed. The QR code has expired or is invalid.</h1><p>Please ask your faculty for a new one.</p>"), 400
 
     # Critical check: Ensure the session associated with the QR code is still active
-    # and matches the currently running session in the FaceAttendanceSystem instance.
-    if not face_attendance.session_active or face_attendance.csv_filename != session_csv_filename_from_token:
-        print(f"QR submission failed: Session '{session_csv_filename_from_token}' is no longer active or does not match current session '{face_attendance.csv_filename}'.")
+    # in the FaceAttendanceSystem session registry.
+    attendance_session = face_attendance.find_session_by_csv(session_csv_filename_from_token)
+    if attendance_session is None:
+        print(f"QR submission failed: Session '{session_csv_filename_from_token}' is no longer active.")
         return render_template_string("<h1>❌ Submission failed. The attendance session is no longer active.</h1><p>Please ask your faculty to start a new session.</p>"), 400
 
-    # Roll number se student ka poora naam nikalein
-    student_name = get_name_from_roll_number(roll_number)
+    # Roll number se student ka poora naam nikalein (roster index, O(1))
+    try:
+        student_name = get_name_from_roll_number(roll_number)
+    except AmbiguousRollNumber as e:
+        print(f"QR submission failed: {e}")
+        return render_template_string("<h1>❌ Error</h1><p>This roll number matches more than one student. Please contact your faculty.</p>"), 400
 
     if not student_name:
         print(f"QR submission failed: Roll number '{roll_number}' not found in known faces.")
         return render_template_string(f"<h1>❌ Error</h1><p>Roll number '{roll_number}' not found in the system. Please check your ID.</p>"), 400
 
     # Check karein ki attendance pehle se marked to nahi
-    if student_name in face_attendance.marked_attendance:
+    if student_name in attendance_session.marked_attendance:
         print(f"QR submission: Attendance already marked for {student_name}.")
         return render_template_string(f"<h1>✅ Already Marked</h1><p>Hi {student_name}, your attendance is already marked for this session.</p>")
 
     # Existing function ka use karke attendance mark karein
-    face_attendance._mark_attendance(student_name)
+    attendance_session._mark_attendance(student_name)
     print(f"QR submission: Attendance marked successfully for {student_name}.")
     
     return render_template_string(f"<h1>✅ Success!</h1><p>Hi {student_name}, your attendance has been marked successfully.</p>")
@@ -1830,27 +3422,27 @@ if __name__ == '__main__':
     print(" Visit: http://localhost:5000")
     
     # Create test user (idempotent)
-    conn = None
     try:
-        conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        # Check if admin user already exists
-        c.execute('SELECT id FROM users WHERE username = ?', ('admin',))
-        if c.fetchone() is None:
-            c.execute('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
-                     ('admin', 'admin@test.com', hash_password('admin123')))
-            conn.commit()
-            print(" Test user created: username=admin, password=admin123")
-        else:
-            print(" Test user 'admin' already exists.")
+        with db.transaction() as conn:
+            c = conn.cursor()
+            # Check if admin user already exists
+            c.execute('SELECT id FROM users WHERE username = ?', ('admin',))
+            if c.fetchone() is None:
+                c.execute('INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)',
+                         ('admin', 'admin@test.com', hash_password('admin123'), 'admin'))
+                print(" Test user created: username=admin, password=admin123")
+            else:
+                print(" Test user 'admin' already exists.")
     except sqlite3.Error as e:
         print(f"Database error during test user creation: {e}")
     except Exception as e:
         print(f"Unexpected error during test user creation: {e}")
-    finally:
-        if conn:
-            conn.close()
     
+    # Camera inventory pehli /api/cameras request se pehle hi ban jaye
+    face_attendance.get_camera_inventory()
+    # Encodings file badalte hi gallery reload (server restart ke bina)
+    face_attendance.start_gallery_watcher()
+
     # Run the Flask app
     # use_reloader=False is important when using cv2.VideoCapture in a separate thread
     # as reloader would try to re-import and re-initialize camera, leading to errors.
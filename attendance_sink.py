@@ -0,0 +1,191 @@
+# attendance_sink.py
+# Attendance rows ka buffered writer. Recognition worker sirf queue me row
+# daalta hai; file/DB I/O ek background thread batches me karta hai.
+import os
+import time
+import queue
+import sqlite3
+import threading
+
+import db
+
+FSYNC_MODES = ("never", "batch", "close")
+
+
+class AttendanceSinkError(RuntimeError):
+    """Raised with the rows a sink could not (or will no longer) write."""
+
+    def __init__(self, message: str, rows: list) -> None:
+        super().__init__(message)
+        self.rows = rows
+
+
+class SqliteAttendanceSink:
+    """
+    Writes attendance rows into the `attendance` table from a background
+    flusher thread.
+
+    write() only enqueues, so a burst of marks never blocks the video
+    pipeline on I/O. Rows are inserted in batches, one transaction per batch,
+    every `flush_interval` seconds (or as soon as `max_batch` rows are
+    waiting). Duplicate (session_key, student_name) rows are ignored by the
+    unique index.
+
+    A batch that fails to insert (lock timeout, disk full) is kept and
+    retried ahead of newer rows, backing off up to `max_backoff` seconds.
+    close() retries it `close_retries` more times and then raises
+    AttendanceSinkError with the unwritten rows; a later flush() still
+    retries them.
+
+    fsync is only issued at the chosen durability points:
+      "never" - leave it to the OS,
+      "batch" - every commit is synchronous,
+      "close" - commits skip the fsync; the database file is synced once,
+                when the session stops (default).
+    """
+
+    INSERT_SQL = ("INSERT OR IGNORE INTO attendance (session_key, faculty, subject, student_name, "
+                  "att_date, marked_time, late_minutes, slot_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, db_path: str, flush_interval: float = 1.0, max_batch: int = 256, fsync: str = "close",
+                 max_backoff: float = 30.0, close_retries: int = 3) -> None:
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {FSYNC_MODES}, got {fsync!r}")
+        self.path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.max_backoff = max_backoff
+        self.close_retries = close_retries
+        self._conn = None
+        self._queue: queue.Queue[list] = queue.Queue()
+        self._failed: list = []  # insert fail hua batch; agle drain me sabse pehle
+        self._write_lock = threading.Lock()
+        self._state_lock = threading.Lock()  # write() ka closed check + put atomic
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._backoff = 0.0
+        self.written = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.errors = 0
+        self.last_error: str | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def write(self, row: list) -> None:
+        with self._state_lock:
+            # close() ke drain ke baad queue me aayi row kabhi likhi nahi jaati
+            if self._closed:
+                raise AttendanceSinkError(f"Attendance sink for {self.path} is closed.", [row])
+            self._queue.put(row)
+        if self._queue.qsize() >= self.max_batch:
+            self._wakeup.set()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # flush() request threads se bhi aata hai, hamesha _write_lock ke andar
+            self._conn = db.connect(self.path, pragmas={"synchronous": "FULL" if self.fsync == "batch" else "OFF"})
+        return self._conn
+
+    def _sync(self) -> bool:
+        """Makes committed rows durable; returns False if nothing was open."""
+        if self._conn is None or self.fsync == "batch":
+            return self._conn is not None # FULL mode me commit hi fsync karta hai
+        for path in (self.path, self.path + "-wal"):
+            if os.path.exists(path):
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        return True
+
+    def _drain(self, sync: bool = False) -> int:
+        with self._write_lock:
+            rows, self._failed = self._failed, []
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if rows:
+                try:
+                    conn = self._connection()
+                    with conn:
+                        conn.executemany(self.INSERT_SQL, rows)
+                except Exception:
+                    # Batch wapas rakhna: queue se nikal chuki rows khoni nahi chahiye
+                    self._failed = rows
+                    self._close_connection()
+                    raise
+                self.written += len(rows)
+                self.batches += 1
+            if (sync or (rows and self.fsync == "batch")) and self._sync():
+                self.fsyncs += 1
+            return len(rows)
+
+    def _close_connection(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            finally:
+                self._conn = None
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self._backoff or self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._drain()
+                self._backoff = 0.0
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                self._backoff = min(self.max_backoff, max(self.flush_interval, self._backoff * 2))
+                print(f"Attendance sink write error ({self.path}), {len(self._failed)} rows kept, "
+                      f"retrying in {self._backoff:.1f}s: {e}")
+
+    def flush(self, sync: bool = False) -> int:
+        """Writes everything queued so far before returning (readers call this before querying)."""
+        return self._drain(sync=sync)
+
+    def close(self) -> None:
+        """Flushes and syncs everything; raises AttendanceSinkError if rows are still unwritten."""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        try:
+            for attempt in range(self.close_retries + 1):
+                try:
+                    self._drain(sync=self.fsync != "never")
+                    break
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    if attempt == self.close_retries:
+                        raise AttendanceSinkError(f"{len(self._failed)} attendance rows could not be written to "
+                                                  f"{self.path}: {e}", list(self._failed)) from e
+                    time.sleep(min(self.max_backoff, 0.5 * 2 ** attempt))
+        finally:
+            with self._write_lock:
+                self._close_connection()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "unwritten": len(self._failed),
+            "written": self.written,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "fsync": self.fsync,
+        }
@@ -0,0 +1,212 @@
+# batch_attendance.py
+# Recorded lecture videos se attendance (jin rooms me live stream nahi hai).
+# Video ko segments me baantkar har CPU core par sampled frames detect/encode
+# hote hain; matching app ki gallery se hoti hai aur CSV live session wale
+# format me likhi jaati hai.
+#
+#   python batch_attendance.py recordings/ --faculty Sharma --subject DBMS --slot 09:00-09:45
+import os
+import csv
+import time
+import argparse
+from datetime import datetime, date, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.webm', '.m4v')
+# Itne ya zyada frames ka stride ho to grab() se aage badhne ki jagah seek karna sasta hai
+SEEK_MIN_FRAMES = 48
+
+
+def scan_segment(video_path, start_frame, end_frame, stride, target_width=640, model="hog"):
+    """
+    Worker process me chalta hai: frames [start_frame, end_frame) me se har
+    `stride`-th frame decode karke detect + encode.
+    Returns [(frame_index, [encoding, ...]), ...] for frames with faces.
+    """
+    from recognition_pool import detect_and_encode
+    cv2.setNumThreads(1) # Har core par ek worker already hai
+    cap = cv2.VideoCapture(video_path)
+    results = []
+    try:
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        seek = stride >= SEEK_MIN_FRAMES
+        index = start_frame
+        while index < end_frame:
+            if seek and index != start_frame:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = cap.read()
+            if not ok:
+                break
+            scale = min(1.0, target_width / frame.shape[1])
+            if scale < 1.0:
+                frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            _, encodings = detect_and_encode(rgb, model)
+            if encodings:
+                results.append((index, encodings))
+            if not seek:
+                # Beech ke frames sirf demux/decode, color convert + copy nahi
+                for _ in range(stride - 1):
+                    if not cap.grab():
+                        return results
+            index += stride
+    finally:
+        cap.release()
+    return results
+
+
+def video_info(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        return (fps if 0 < fps <= 240 else 25.0), frames
+    finally:
+        cap.release()
+
+
+def plan_segments(total_frames, stride, workers):
+    """Splits the sampled frame indices into up to `workers` contiguous stride-aligned segments."""
+    samples = (total_frames + stride - 1) // stride
+    per_segment = max(1, -(-samples // max(1, workers)))
+    return [(s * stride, min(total_frames, (s + per_segment) * stride)) for s in range(0, samples, per_segment)]
+
+
+def process_video(video_path, faculty, subject, slot_id=None, start_time=None, recording_start=None,
+                  day=None, stride_seconds=1.0, workers=None, target_width=640, model="hog",
+                  min_hits=1, output_dir=".", output_name=None, save_db=False):
+    """
+    Computes attendance for one recording and writes it as a session CSV.
+
+    Mark times are recording_start + video position of a student's first
+    sighting; recording_start defaults to the lecture start (start_time,
+    else the slot start). Returns (csv_path, rows).
+    """
+    import app # Gallery, slots aur CSV format live app wale hi (workers isse import nahi karte)
+
+    slot = app.get_slot_by_id(slot_id) if slot_id else None
+    if slot_id and not slot:
+        raise ValueError(f"Unknown slot: {slot_id}")
+    if day is None:
+        # Recording ki date: file ka modification din
+        day = date.fromtimestamp(os.path.getmtime(video_path))
+    expected_start = None
+    if start_time:
+        expected_start = datetime.combine(day, start_time)
+    elif slot:
+        expected_start = datetime.combine(day, slot["start"])
+    video_start = datetime.combine(day, recording_start) if recording_start else expected_start
+    if video_start is None:
+        raise ValueError("Need --slot, --start or --recording-start to timestamp marks.")
+
+    fps, total_frames = video_info(video_path)
+    stride = max(1, round(stride_seconds * fps))
+    workers = workers or os.cpu_count() or 1
+    started = time.time()
+
+    sightings = []
+    if total_frames > 0 and workers > 1:
+        segments = plan_segments(total_frames, stride, workers)
+        print(f"{os.path.basename(video_path)}: {total_frames} frames @ {fps:.1f} fps, every {stride} frames, "
+              f"{len(segments)} segments on {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(scan_segment, video_path, s, e, stride, target_width, model) for s, e in segments]
+            for future in as_completed(futures):
+                sightings.extend(future.result())
+    else:
+        # Frame count pata nahi (kuch containers) ya serial mode: ek hi pass end tak
+        print(f"{os.path.basename(video_path)}: scanning every {stride} frames serially...")
+        sightings = scan_segment(video_path, 0, total_frames or 1 << 62, stride, target_width, model)
+    sightings.sort(key=lambda item: item[0])
+
+    # Saare encodings ek batched matcher call me (closest wins, live session jaisa)
+    flat = [(index, encoding) for index, encodings in sightings for encoding in encodings if encoding is not None]
+    matches = app.face_attendance.matcher.match([encoding for _, encoding in flat])
+    first_seen, hits = {}, {}
+    for (index, _), (name, _) in zip(flat, matches):
+        if name == "Unknown":
+            continue
+        hits[name] = hits.get(name, 0) + 1
+        first_seen.setdefault(name, index)
+
+    slot_label = slot["id"] if slot else (slot_id or "NA")
+    rows = []
+    for name, index in sorted(first_seen.items(), key=lambda item: item[1]):
+        if hits[name] < min_hits:
+            continue
+        marked = video_start + timedelta(seconds=index / fps)
+        late_min = max(0, int((marked - expected_start).total_seconds() // 60)) if expected_start else 0
+        rows.append([faculty, subject, name, marked.strftime("%H:%M:%S"), late_min, slot_label])
+
+    csv_name = output_name or app.session_csv_filename(subject, faculty, slot_label, day)
+    csv_path = os.path.join(output_dir, csv_name)
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(app.ATTENDANCE_CSV_HEADER)
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+    if save_db:
+        app.import_attendance_csv(csv_path, csv_name, day.isoformat())
+
+    elapsed = time.time() - started
+    duration = total_frames / fps if total_frames else 0
+    speed = f", {duration / max(elapsed, 1e-6):.1f}x real time" if duration else ""
+    print(f"  {len(rows)} students marked from {len(flat)} faces in {len(sightings)} frames "
+          f"({elapsed:.1f}s{speed}) -> {csv_path}")
+    return csv_path, rows
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            videos.append(path)
+    return videos
+
+
+def parse_hhmm(value):
+    return datetime.strptime(value, "%H:%M").time()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute attendance from recorded lecture videos.")
+    parser.add_argument("videos", nargs="+", help="Video files or folders of videos")
+    parser.add_argument("--faculty", required=True)
+    parser.add_argument("--subject", required=True)
+    parser.add_argument("--slot", default=None, help="Lecture slot id, e.g. 09:00-09:45")
+    parser.add_argument("--start", type=parse_hhmm, default=None, help="Lecture start HH:MM (overrides the slot start for lateness)")
+    parser.add_argument("--recording-start", type=parse_hhmm, default=None,
+                        help="Wall-clock HH:MM of the first video frame (default: lecture start)")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="Lecture date YYYY-MM-DD (default: file date)")
+    parser.add_argument("--stride", type=float, default=1.0, help="Seconds of video between sampled frames")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores, 1 = serial)")
+    parser.add_argument("--width", type=int, default=640, help="Detection frame width in pixels")
+    parser.add_argument("--model", default="hog", choices=["hog", "cnn"], help="Face detection model")
+    parser.add_argument("--min-hits", type=int, default=1, help="Sampled frames a student must be recognized in")
+    parser.add_argument("--output-dir", default=".", help="Folder for the attendance CSVs")
+    parser.add_argument("--save-db", action="store_true", help="Also store the attendance in the app database")
+    args = parser.parse_args()
+
+    import app
+    written = set()
+    for video in find_videos(args.videos):
+        try:
+            day = args.date or date.fromtimestamp(os.path.getmtime(video))
+            name = app.session_csv_filename(args.subject, args.faculty, args.slot or "NA", day)
+            if name in written:
+                # Ek hi lecture key ki doosri recording pehli CSV overwrite na kare
+                name = name[:-len(".csv")] + f"_{os.path.splitext(os.path.basename(video))[0]}.csv"
+            written.add(name)
+            process_video(video, args.faculty, args.subject, args.slot, args.start, args.recording_start,
+                          day, args.stride, args.workers, args.width, args.model, args.min_hits,
+                          args.output_dir, name, args.save_db)
+        except Exception as e:
+            print(f"  - ERROR: Could not process {video}. Reason: {e}")
@@ -0,0 +1,173 @@
+# camera_inventory.py
+# Camera devices ki cached list. /api/cameras har request par devices probe nahi
+# karta; background thread inventory refresh karta hai aur endpoint cache se
+# turant jawab deta hai.
+import glob
+import os
+import re
+import sys
+import threading
+import time
+
+import cv2
+
+
+def fourcc_to_str(code: float) -> str | None:
+    code = int(code)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code > 0 else None
+
+
+class CameraInventory:
+    """
+    Background inventory of local capture devices.
+
+    On Linux the devices are the /dev/video* nodes: listing them and reading
+    their names from sysfs costs microseconds, so a refresh only opens a
+    device with OpenCV the first time it appears (to cache its default
+    capabilities). Metadata nodes (sysfs `index` != 0, e.g. the second node a
+    UVC webcam creates) are skipped. Elsewhere, indices 0..fallback_indices-1
+    are probed, once per refresh, from the background thread.
+
+    Devices reported by `in_use()` (sources of active sessions) are never
+    opened, so a refresh cannot steal a camera from a running session.
+    """
+
+    def __init__(self, in_use=None, refresh_interval: float = 30.0, fallback_indices: int = 5,
+                 probe: bool = True, dev_glob: str = "/dev/video*",
+                 sysfs_dir: str = "/sys/class/video4linux") -> None:
+        self.in_use = in_use or (lambda: set())
+        self.refresh_interval = refresh_interval
+        self.fallback_indices = fallback_indices
+        self.probe = probe
+        self.dev_glob = dev_glob
+        self.sysfs_dir = sysfs_dir
+        self._devices: dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._ready = threading.Event()
+        self._stopped = False
+        self.refreshing = False
+        self.refreshed_at: float | None = None
+        self.refresh_ms: float | None = None
+        self.refreshes = 0
+        self.probes = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _sysfs_read(self, node: str, name: str) -> str | None:
+        try:
+            with open(os.path.join(self.sysfs_dir, node, name), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _list_v4l2(self) -> dict[int, dict]:
+        found = {}
+        for path in glob.glob(self.dev_glob):
+            node = os.path.basename(path)
+            match = re.fullmatch(r"video(\d+)", node)
+            if not match:
+                continue
+            if (self._sysfs_read(node, "index") or "0") != "0":
+                continue # Metadata node, frames nahi deta
+            index = int(match.group(1))
+            found[index] = {"index": index, "path": path, "name": self._sysfs_read(node, "name") or node}
+        return found
+
+    def _probe(self, index: int) -> dict | None:
+        """Opens the device once; returns its default capabilities or None if it cannot capture."""
+        self.probes += 1
+        api = cv2.CAP_V4L2 if sys.platform.startswith("linux") else cv2.CAP_ANY
+        cap = cv2.VideoCapture(index, api)
+        try:
+            if not cap.isOpened():
+                return None
+            return {
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "fps": round(cap.get(cv2.CAP_PROP_FPS), 2),
+                "fourcc": fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+            }
+        finally:
+            cap.release()
+
+    def refresh(self) -> None:
+        """Rebuilds the inventory now (blocking); see request_refresh() for the async form."""
+        started = time.monotonic()
+        self.refreshing = True
+        try:
+            busy = set(self.in_use())
+            if sys.platform.startswith("linux") and os.path.isdir(os.path.dirname(self.dev_glob)):
+                found = self._list_v4l2()
+            else:
+                found = {i: {"index": i, "path": None, "name": f"Camera {i}"} for i in range(self.fallback_indices)}
+            with self._lock:
+                previous = dict(self._devices)
+            devices = {}
+            for index, device in found.items():
+                old = previous.get(index)
+                if old is not None and old.get("name") == device["name"] and old.get("probed"):
+                    # Wahi device pehle se probe ho chuka hai; dobara open nahi
+                    device.update(capabilities=old["capabilities"], probed=True, capture=old["capture"])
+                elif index in busy or not self.probe:
+                    # In-use device ko chhedna nahi; agli refresh me probe hoga
+                    device.update(capabilities=old["capabilities"] if old else None, probed=False,
+                                  capture=old["capture"] if old else True)
+                else:
+                    try:
+                        caps = self._probe(index)
+                    except Exception as e:
+                        print(f"Camera probe error ({index}): {e}")
+                        caps = None
+                    device.update(capabilities=caps, probed=True, capture=caps is not None)
+                if device["path"] is None and not device["capture"] and index not in busy:
+                    continue # Fallback index jo khula hi nahi = device hai hi nahi
+                devices[index] = device
+            with self._lock:
+                self._devices = devices
+            self.refreshes += 1
+            self.refreshed_at = time.time()
+            self.refresh_ms = round((time.monotonic() - started) * 1000, 1)
+        finally:
+            self.refreshing = False
+            self._ready.set()
+
+    def request_refresh(self) -> None:
+        """Asks the background thread to refresh soon; returns immediately."""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Camera inventory refresh error: {e}")
+                self._ready.set()
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def devices(self) -> list[dict]:
+        """Cached devices with live in-use flags; never touches the hardware."""
+        busy = set(self.in_use())
+        with self._lock:
+            devices = [dict(d) for _, d in sorted(self._devices.items())]
+        for device in devices:
+            device["in_use"] = device["index"] in busy
+            device["available"] = device["capture"] and not device["in_use"]
+        return [d for d in devices if d["capture"] or d["in_use"]]
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "refreshes": self.refreshes,
+            "probes": self.probes,
+            "refreshing": self.refreshing,
+            "refreshed_at": self.refreshed_at,
+            "refresh_ms": self.refresh_ms,
+        }
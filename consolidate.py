@@ -0,0 +1,251 @@
+# consolidate.py
+# Har student ke encodings ko kuch representative templates me badalna, taaki
+# 40 photos wala student matcher me 40 rows na le. Outliers (galat photo,
+# kisi aur ka chehra) pehle hi nikal jaate hain.
+#
+#   python consolidate.py                       # encodings.bin -> encodings.templates.bin + report
+#   python consolidate.py --max-templates 2 --holdout 0.3
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from encodings_store import open_store, write_store, EncodingLog, LOG_SUFFIX, DEFAULT_STORE_PATH
+from face_matcher import FaceMatcher, DEFAULT_TOLERANCE
+
+TEMPLATES_STORE_PATH = "encodings.templates.bin"
+METHODS = ("medoids", "kmeans")
+
+
+def pairwise_distances(x: np.ndarray) -> np.ndarray:
+    sq = np.einsum("ij,ij->i", x, x)
+    d2 = sq[:, None] + sq[None, :] - 2.0 * (x @ x.T)
+    np.maximum(d2, 0.0, out=d2)
+    return np.sqrt(d2)
+
+
+def consolidate_person(encodings, max_templates: int = 3, cover_distance: float = 0.35,
+                       outlier_distance: float = 0.6, min_images_for_outliers: int = 3,
+                       method: str = "medoids", iterations: int = 10):
+    """
+    Returns (templates, kept) for one student's encodings; `kept` is a boolean
+    mask of the inputs that were not dropped as outliers.
+
+    Outliers are encodings farther than `outlier_distance` from the student's
+    medoid (only with at least `min_images_for_outliers` images: with two
+    photos there is no majority to trust). Templates start with the medoid;
+    the farthest remaining encoding becomes another template while some
+    encoding is farther than `cover_distance` from every template, up to
+    `max_templates`. A few k-medoids (or k-means) rounds then refine them.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    x = np.asarray(encodings, dtype=np.float64).reshape(len(encodings), -1)
+    kept = np.ones(len(x), dtype=bool)
+    if len(x) <= 1:
+        return x.copy(), kept
+    d = pairwise_distances(x)
+    if len(x) >= min_images_for_outliers:
+        center = int(np.argmin(d.sum(axis=1)))
+        kept = d[center] <= outlier_distance
+    x, d = x[kept], d[np.ix_(kept, kept)]
+
+    # Farthest-point seeding: tight students ko ek hi template milta hai
+    seeds = [int(np.argmin(d.sum(axis=1)))]
+    nearest = d[seeds[0]].copy()
+    while len(seeds) < max_templates and nearest.max() > cover_distance:
+        seeds.append(int(nearest.argmax()))
+        nearest = np.minimum(nearest, d[seeds[-1]])
+
+    if method == "medoids":
+        for _ in range(iterations):
+            labels = np.argmin(d[:, seeds], axis=1)
+            new_seeds = []
+            for c in range(len(seeds)):
+                members = np.flatnonzero(labels == c)
+                if len(members) == 0:
+                    new_seeds.append(seeds[c])
+                    continue
+                new_seeds.append(int(members[np.argmin(d[np.ix_(members, members)].sum(axis=1))]))
+            if new_seeds == seeds:
+                break
+            seeds = new_seeds
+        return x[seeds].copy(), kept
+
+    centers = x[seeds].copy()
+    for _ in range(iterations):
+        dist = np.linalg.norm(x[:, None, :] - centers[None, :, :], axis=2)
+        labels = np.argmin(dist, axis=1)
+        new_centers = np.array([x[labels == c].mean(axis=0) if np.any(labels == c) else centers[c]
+                                for c in range(len(centers))])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+    return centers, kept
+
+
+def group_by_name(names) -> dict[str, list[int]]:
+    groups: dict[str, list[int]] = {}
+    for i, name in enumerate(names):
+        groups.setdefault(str(name), []).append(i)
+    return groups
+
+
+def consolidate_gallery(encodings, names, **kwargs):
+    """
+    Consolidates every student; returns (templates, template_names, dropped)
+    where `dropped` lists the input rows removed as outliers.
+    """
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(len(names), -1)
+    templates, template_names, dropped = [], [], []
+    for name, rows in group_by_name(names).items():
+        person_templates, kept = consolidate_person(encodings[rows], **kwargs)
+        templates.extend(person_templates)
+        template_names.extend([name] * len(person_templates))
+        dropped.extend(row for row, keep in zip(rows, kept) if not keep)
+    dim = encodings.shape[1] if len(encodings) else 128
+    return np.asarray(templates, dtype=np.float32).reshape(-1, dim), template_names, dropped
+
+
+def holdout_split(names, fraction: float = 0.2, seed: int = 0):
+    """
+    Per-student split of row indices into (train, test). Students with a
+    single image stay entirely in train; everyone else keeps at least one
+    training image and holds out round(fraction * n) (at least one).
+    """
+    rng = np.random.default_rng(seed)
+    train, test = [], []
+    for rows in group_by_name(names).values():
+        rows = list(rng.permutation(rows))
+        n_test = 0 if len(rows) < 2 else min(len(rows) - 1, max(1, round(fraction * len(rows))))
+        test.extend(rows[:n_test])
+        train.extend(rows[n_test:])
+    return sorted(int(i) for i in train), sorted(int(i) for i in test)
+
+
+def evaluate(gallery_encodings, gallery_names, query_encodings, query_names, tolerance: float = DEFAULT_TOLERANCE) -> dict:
+    """Top-1 identification on the queries: correct / wrong student / Unknown, plus the gallery size."""
+    matcher = FaceMatcher(gallery_encodings, list(gallery_names), tolerance=tolerance, index="exact")
+    results = matcher.match(np.asarray(query_encodings, dtype=np.float32)) if len(query_names) else []
+    correct = sum(name == truth for (name, _), truth in zip(results, query_names))
+    unknown = sum(name == "Unknown" for name, _ in results)
+    total = len(query_names)
+    return {
+        "gallery_size": len(gallery_names),
+        "queries": total,
+        "accuracy": round(correct / total, 4) if total else None,
+        "wrong": total - correct - unknown,
+        "unknown": unknown,
+    }
+
+
+def consolidation_report(encodings, names, holdout: float = 0.2, seed: int = 0,
+                         tolerance: float = DEFAULT_TOLERANCE, **kwargs) -> dict:
+    """Accuracy of the full vs consolidated gallery, both built from the same training split."""
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)
+    names = [str(n) for n in names]
+    train, test = holdout_split(names, holdout, seed)
+    train_names = [names[i] for i in train]
+    test_names = [names[i] for i in test]
+    before = evaluate(encodings[train], train_names, encodings[test], test_names, tolerance)
+    templates, template_names, dropped = consolidate_gallery(encodings[train], train_names, **kwargs)
+    after = evaluate(templates, template_names, encodings[test], test_names, tolerance)
+    return {
+        "students": len(set(names)),
+        "train_images": len(train),
+        "heldout_images": len(test),
+        "dropped_outliers": len(dropped),
+        "before": before,
+        "after": after,
+        "size_reduction_pct": round(100.0 * (1 - after["gallery_size"] / max(1, before["gallery_size"])), 1),
+    }
+
+
+def rows_to_paths(manifest_path: str) -> dict[int, str]:
+    """Store row -> dataset image (from encode_faces' manifest), for naming dropped outliers."""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("entries", {})
+        return {entry["row"]: relpath for relpath, entry in entries.items() if entry.get("row") is not None}
+    except (OSError, ValueError):
+        return {}
+
+
+def read_gallery(store_path: str = DEFAULT_STORE_PATH) -> tuple[np.ndarray, list[str]]:
+    """
+    The full gallery: the store's rows plus the students enrolled online
+    since its last compaction (its enrollment log, read without modifying it
+    -- the server may be appending to it).
+    """
+    store = open_store(store_path)
+    encodings = np.array(store.encodings)
+    names = [str(n) for n in store.names]
+    log = EncodingLog(store_path + LOG_SUFFIX, store.store_id)
+    del store  # memmap chhodna
+    logged, logged_names = log.read()
+    if logged_names:
+        print(f"Including {len(logged_names)} enrolled encodings from '{log.path}'.")
+        encodings = np.vstack([encodings, np.asarray(logged, dtype=np.float32).reshape(len(logged_names), -1)])
+        names += logged_names
+    return encodings, names
+
+
+def write_templates(encodings, names, output_path: str = TEMPLATES_STORE_PATH,
+                    manifest_path: str | None = None, **kwargs) -> dict:
+    """Consolidates the whole gallery and writes the templates store."""
+    templates, template_names, dropped = consolidate_gallery(encodings, names, **kwargs)
+    paths = rows_to_paths(manifest_path) if manifest_path else {}
+    for row in dropped:
+        print(f"  - Dropped outlier: {paths.get(row, f'row {row}')} ({names[row]})")
+    write_store(output_path, templates, template_names)
+    print(f"Wrote {len(template_names)} templates for {len(set(template_names))} students to '{output_path}' "
+          f"(from {len(names)} encodings).")
+    return {"encodings": len(names), "templates": len(template_names), "dropped": len(dropped)}
+
+
+def consolidate_store(store_path: str = DEFAULT_STORE_PATH, output_path: str = TEMPLATES_STORE_PATH,
+                      manifest_path: str | None = "encodings.manifest.json", holdout: float = 0.2,
+                      seed: int = 0, tolerance: float = DEFAULT_TOLERANCE, **kwargs) -> dict:
+    """Reports before/after accuracy on a held-out split, then writes the templates of the full gallery."""
+    encodings, names = read_gallery(store_path)
+    if not names:
+        raise ValueError(f"No encodings in {store_path}")
+
+    report = consolidation_report(encodings, names, holdout, seed, tolerance, **kwargs)
+    before, after = report["before"], report["after"]
+    print(f"Held-out evaluation ({report['heldout_images']} images of {report['students']} students, "
+          f"trained on {report['train_images']}):")
+    print(f"  before: {before['gallery_size']} encodings, accuracy {before['accuracy']} "
+          f"({before['wrong']} wrong, {before['unknown']} unknown)")
+    print(f"  after : {after['gallery_size']} templates, accuracy {after['accuracy']} "
+          f"({after['wrong']} wrong, {after['unknown']} unknown), {report['size_reduction_pct']}% smaller")
+
+    # Final gallery saare images se (held-out split sirf report ke liye tha)
+    report["gallery"] = write_templates(encodings, names, output_path, manifest_path, **kwargs)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consolidate each student's encodings into a few templates.")
+    parser.add_argument("--input", default=DEFAULT_STORE_PATH, help="Full encodings store (from encode_faces.py)")
+    parser.add_argument("--output", default=TEMPLATES_STORE_PATH, help="Templates store to write")
+    parser.add_argument("--manifest", default="encodings.manifest.json", help="encode_faces manifest (names dropped images)")
+    parser.add_argument("--method", default="medoids", choices=METHODS)
+    parser.add_argument("--max-templates", type=int, default=3, help="Templates per student")
+    parser.add_argument("--cover-distance", type=float, default=0.35, help="Add templates until every image is this close to one")
+    parser.add_argument("--outlier-distance", type=float, default=0.6, help="Drop images farther than this from the student's medoid")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of each student's images held out for the report")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Match tolerance used in the report")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    try:
+        report = consolidate_store(args.input, args.output, args.manifest, args.holdout, args.seed, args.tolerance,
+                                   max_templates=args.max_templates, cover_distance=args.cover_distance,
+                                   outlier_distance=args.outlier_distance, method=args.method)
+    except Exception as e:
+        print(f"ERROR: Consolidation failed: {e}")
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,204 @@
+# db.py
+# SQLite layer: connection pool, WAL/pragmas aur schema migrations ek jagah.
+# Routes har request par sqlite3.connect() nahi karte; pool se connection
+# udhaar lete hain aur wapas kar dete hain.
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DATABASE_PATH = 'attendance.db'
+
+# Har naye connection par lagne wale pragmas
+PRAGMAS = {
+    'synchronous': 'NORMAL',   # WAL me NORMAL safe hai: sirf checkpoint par fsync
+    'cache_size': -16000,      # negative = KiB (~16 MB page cache per connection)
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,      # ms; lock mile tak ruko, turant "database is locked" nahi
+    'foreign_keys': 'ON',
+}
+POOL_SIZE = 8
+# Har connection ke prepared statements ka LRU cache (sqlite3 SQL text se reuse karta hai)
+STATEMENT_CACHE_SIZE = 256
+
+# (version, statements). Naya schema change = list ke end me naya version;
+# PRAGMA user_version batata hai DB kahan tak migrate ho chuka hai.
+MIGRATIONS = [
+    (1, [
+        '''CREATE TABLE IF NOT EXISTS users
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'faculty',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1)''',
+        '''CREATE TABLE IF NOT EXISTS password_reset_tokens
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            token TEXT UNIQUE NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            used BOOLEAN DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id))''',
+        '''CREATE TABLE IF NOT EXISTS sessions
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            faculty_name TEXT,
+            subject TEXT,
+            slot_id TEXT,
+            csv_filename TEXT,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ended_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id))''',
+    ]),
+    (2, [
+        # session_key = session ki CSV export ka naam (attendance_{subject}_{faculty}_{slot}_{date}.csv)
+        '''CREATE TABLE IF NOT EXISTS attendance
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_key TEXT NOT NULL,
+            faculty TEXT,
+            subject TEXT,
+            student_name TEXT NOT NULL,
+            att_date TEXT NOT NULL,
+            marked_time TEXT,
+            late_minutes INTEGER DEFAULT 0,
+            slot_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_session_student ON attendance (session_key, student_name)',
+        'CREATE INDEX IF NOT EXISTS idx_attendance_date_slot ON attendance (att_date, slot_id)',
+        # Password reset token lookup aur email se forgot-password lookup
+        'CREATE INDEX IF NOT EXISTS idx_reset_tokens_token_used ON password_reset_tokens (token, used)',
+    ]),
+    (3, [
+        # Seeded test admin pehle role='faculty' ke saath banta tha; admin endpoints ke liye promote
+        "UPDATE users SET role = 'admin' WHERE username = 'admin' AND email = 'admin@test.com'",
+    ]),
+]
+
+
+def connect(path: str = DATABASE_PATH, pragmas: dict | None = None) -> sqlite3.Connection:
+    """New connection with the standard pragmas (usable from any thread, one at a time)."""
+    conn = sqlite3.connect(path, timeout=PRAGMAS['busy_timeout'] / 1000.0, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    for name, value in {**PRAGMAS, **(pragmas or {})}.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Bounded pool of pragma-tuned connections. Flask's threaded server runs
+    every request on a fresh thread, so connections are pooled rather than
+    kept per thread; each pooled connection keeps its own statement cache.
+    When all connections are busy a borrower waits up to `timeout` seconds.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH, size: int = POOL_SIZE, timeout: float = 10.0) -> None:
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.borrowed = 0
+        self.waits = 0
+        self._wal_checked = False
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                conn = connect(self.path)
+                if not self._wal_checked:
+                    # journal_mode DB file me persist hota hai; ek baar set karna kaafi hai
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    self._wal_checked = True
+                return conn
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        self.waits += 1
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection free after {self.timeout}s") from None
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback() # Aadha transaction kabhi pool me wapas nahi jaata
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit/rollback is up to the caller."""
+        conn = self._acquire()
+        self.borrowed += 1
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection inside a transaction: commit on success, rollback on error."""
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "open": self._created,
+            "idle": self._idle.qsize(),
+            "borrowed": self.borrowed,
+            "waits": self.waits,
+        }
+
+
+pool = ConnectionPool()
+
+
+def connection():
+    return pool.connection()
+
+
+def transaction():
+    return pool.transaction()
+
+
+def migrate(conn: sqlite3.Connection | None = None) -> int:
+    """Applies pending MIGRATIONS in order; returns the resulting schema version."""
+    if conn is None:
+        with pool.connection() as pooled:
+            return migrate(pooled)
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version={version}")
+        print(f"Database migrated to schema version {version}.")
+        current = version
+    return current
@@ -1,69 +1,230 @@
 # encode_faces.py
 import face_recognition
 import os
-import pickle
-
-print("Starting face encoding process...")
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from encodings_store import write_store, open_store, store_id, new_store_id, DEFAULT_STORE_PATH
+from consolidate import consolidate_store, TEMPLATES_STORE_PATH
 
 # Dataset folder ka path
 KNOWN_FACES_DIR = 'dataset'
 # Model jo use karna hai: 'hog' (CPU ke liye tez) ya 'cnn' (GPU ke liye aacha)
 MODEL = 'hog' # Keep 'hog' for CPU efficiency, change to 'cnn' if you have a strong GPU and need higher accuracy.
+ENCODINGS_FILE = DEFAULT_STORE_PATH
+# Har image ka size/mtime/hash aur store row yaad rakhne ke liye, taaki rerun sirf naye/badle images encode kare.
+# Manifest store ko uske header id se pehchanta hai (v1: store ki size/mtime se).
+MANIFEST_FILE = "encodings.manifest.json"
+MANIFEST_VERSION = 2
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 
-# Encodings aur naam store karne ke liye lists
-known_faces_encodings = []
-known_faces_names = []
-
-# Dataset folder ke har folder (har व्यक्ति) ke liye loop chalana
-for name in os.listdir(KNOWN_FACES_DIR):
-    # Us व्यक्ति ke folder ka path
-    person_dir_path = os.path.join(KNOWN_FACES_DIR, name)
-    
-    # Agar yeh ek folder hai
-    if os.path.isdir(person_dir_path):
-        print(f"Processing images for: {name}")
-        
-        # Us folder ke andar har image ke liye loop chalana
-        for filename in os.listdir(person_dir_path):
-            # Image file ka path
+def encode_image(image_path, model=MODEL):
+    """
+    Worker process me chalta hai: image decode + face detect + encode.
+    Returns (sha256, encoding or None, error message or None).
+    """
+    try:
+        sha = file_sha256(image_path)
+        image = face_recognition.load_image_file(image_path)
+        # Har image me ek hi chehra mankar chal rahe hain
+        locations = face_recognition.face_locations(image, model=model)
+        encodings = face_recognition.face_encodings(image, locations)
+        return sha, (encodings[0] if encodings else None), None
+    except Exception as e:
+        return None, None, str(e)
+
+
+def scan_dataset(dataset_dir):
+    """Returns {relative path: (person name, absolute path, size, mtime_ns)}."""
+    files = {}
+    # Dataset folder ke har folder (har व्यक्ति) ke liye loop chalana
+    for name in sorted(os.listdir(dataset_dir)):
+        person_dir_path = os.path.join(dataset_dir, name)
+        if not os.path.isdir(person_dir_path):
+            continue
+        for filename in sorted(os.listdir(person_dir_path)):
             image_path = os.path.join(person_dir_path, filename)
-            
-            # Check if the file is an image (simple check based on extension)
-            if not (filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
                 print(f"  - Skipping non-image file: {filename}")
                 continue
+            st = os.stat(image_path)
+            files[os.path.join(name, filename)] = (name, image_path, st.st_size, st.st_mtime_ns)
+    return files
+
+
+def manifest_matches_store(manifest, store_path):
+    """True if the manifest's rows describe the store file at store_path."""
+    if manifest.get("version") == 1:
+        st = os.stat(store_path)
+        return manifest.get("store_size") == st.st_size and manifest.get("store_mtime_ns") == st.st_mtime_ns
+    sid = store_id(store_path)
+    return manifest.get("version") == MANIFEST_VERSION and sid is not None and sid.hex() in manifest.get("store_ids", [])
+
+
+def retarget_manifest(manifest_path, store_path, store_ids):
+    """
+    Makes a manifest that matches the store at store_path accept `store_ids`
+    instead. Used when the app compacts enrolled faces into the store: the
+    existing rows keep their positions, so the manifest stays valid. Returns
+    False if there is no matching manifest.
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not manifest_matches_store(manifest, store_path):
+            return False
+    except (OSError, ValueError):
+        return False
+    manifest = {k: v for k, v in manifest.items() if k not in ("store_size", "store_mtime_ns")}
+    manifest.update(version=MANIFEST_VERSION, store_ids=[sid.hex() for sid in store_ids])
+    write_json_atomic(manifest_path, manifest)
+    return True
+
+
+def load_previous(manifest_path, store_path, model):
+    """Pichli run ka manifest aur store, agar dono ek doosre se match karte hain."""
+    if not (os.path.exists(manifest_path) and os.path.exists(store_path)):
+        return {}, None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("model") != model or not manifest_matches_store(manifest, store_path):
+            print("Manifest does not match the current encodings store; re-encoding everything.")
+            return {}, None
+        return manifest.get("entries", {}), open_store(store_path)
+    except Exception as e:
+        print(f"WARNING: Could not read previous manifest/store ({e}); re-encoding everything.")
+        return {}, None
+
+
+def write_json_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".manifest-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def encode_dataset(dataset_dir=KNOWN_FACES_DIR, store_path=ENCODINGS_FILE, manifest_path=MANIFEST_FILE,
+                   model=MODEL, workers=None, full=False):
+    print("Starting face encoding process...")
+    files = scan_dataset(dataset_dir)
+    old_entries, old_store = ({}, None) if full else load_previous(manifest_path, store_path, model)
+
+    entries = {}   # relpath -> manifest entry (row baad me bharenge)
+    reused = {}    # relpath -> encoding from the old store
+    pending = []   # relpaths jinhe encode karna hai
+    for relpath, (name, image_path, size, mtime_ns) in files.items():
+        old = old_entries.get(relpath)
+        if old and old.get("name") == name:
+            same_stat = old.get("size") == size and old.get("mtime_ns") == mtime_ns
+            # Size/mtime badle par content wahi ho (copy/touch) to bhi dobara encode nahi
+            if same_stat or old.get("sha256") == file_sha256(image_path):
+                entries[relpath] = {**old, "size": size, "mtime_ns": mtime_ns}
+                if old.get("row") is not None:
+                    reused[relpath] = old_store.encodings[old["row"]]
+                continue
+        pending.append(relpath)
+
+    removed = len(set(old_entries) - set(files))
+    print(f"{len(files)} images found: {len(entries)} unchanged, {len(pending)} to encode, {removed} removed.")
+
+    workers = workers or os.cpu_count() or 1
+    new_encodings = {}
+    done, failed, started = 0, 0, time.time()
+    last_report = started
+
+    def record(relpath, sha, encoding, error):
+        nonlocal done, failed, last_report
+        name, image_path, size, mtime_ns = files[relpath]
+        done += 1
+        if error is not None:
+            failed += 1
+            print(f"  - ERROR: Could not process {relpath}. Reason: {error}")
+            return
+        entries[relpath] = {"name": name, "size": size, "mtime_ns": mtime_ns, "sha256": sha, "row": None}
+        if encoding is None:
+            print(f"  - WARNING: No face found in {relpath}. Skipping.")
+        else:
+            new_encodings[relpath] = encoding
+        now = time.time()
+        if now - last_report >= 2.0 or done == len(pending):
+            rate = done / max(now - started, 1e-6)
+            print(f"  [{done}/{len(pending)}] {rate:.1f} images/s")
+            last_report = now
+
+    if pending and workers > 1:
+        print(f"Encoding {len(pending)} images with {workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(encode_image, files[p][1], model): p for p in pending}
+            for future in as_completed(futures):
+                record(futures[future], *future.result())
+    else:
+        for relpath in pending:
+            record(relpath, *encode_image(files[relpath][1], model))
+
+    elapsed = time.time() - started
+    if pending:
+        print(f"Encoded {done - failed} images in {elapsed:.1f}s ({done / max(elapsed, 1e-6):.1f} images/s, {failed} failed).")
+
+    # Unchanged + naye encodings ko merge karke store aur manifest atomically likhna
+    known_faces_encodings, known_faces_names = [], []
+    for relpath in sorted(entries):
+        encoding = reused.get(relpath)
+        if encoding is None:
+            encoding = new_encodings.get(relpath)
+        if encoding is None:
+            entries[relpath]["row"] = None
+            continue
+        entries[relpath]["row"] = len(known_faces_names)
+        known_faces_encodings.append(encoding)
+        known_faces_names.append(entries[relpath]["name"])
+
+    print(f"\nSaving encodings to '{store_path}'...")
+    new_id = new_store_id()
+    write_store(store_path, known_faces_encodings, known_faces_names, store_id=new_id)
+    old_store = None  # purana memmap chhodna
+    write_json_atomic(manifest_path, {
+        "version": MANIFEST_VERSION,
+        "model": model,
+        "store_ids": [new_id.hex()],
+        "entries": entries,
+    })
+
+    print("\nEncoding complete and data saved successfully!")
+    print(f"Total {len(known_faces_encodings)} faces encoded for {len(set(known_faces_names))} people.")
+    return len(known_faces_encodings)
+
 
-            # Image ko load karna
-            try:
-                image = face_recognition.load_image_file(image_path)
-                
-                # Image me chehre ke encodings nikalna
-                # Har image me ek hi chehra mankar chal rahe hain
-                # Use the specified MODEL (hog or cnn)
-                encodings = face_recognition.face_encodings(image, model=MODEL)
-                
-                if encodings:
-                    # Pehla encoding (chehra) lena
-                    encoding = encodings[0]
-                    
-                    # Encoding aur naam ko list me add karna
-                    known_faces_encodings.append(encoding)
-                    known_faces_names.append(name)
-                    print(f"  - Encoded {filename} for {name}")
-                else:
-                    print(f"  - WARNING: No face found in {filename}. Skipping.")
-            
-            except Exception as e:
-                print(f"  - ERROR: Could not process {filename}. Reason: {e}")
-
-# Encodings aur naamo ko ek file me save karna
-# Changed filename to encodings.pickle to match app.py
-ENCODINGS_FILE = "encodings.pickle" 
-print(f"\nSaving encodings to '{ENCODINGS_FILE}'...")
-data = {"encodings": known_faces_encodings, "names": known_faces_names}
-
-with open(ENCODINGS_FILE, "wb") as f:
-    pickle.dump(data, f)
-
-print("\nEncoding complete and data saved successfully!")
-print(f"Total {len(known_faces_encodings)} faces encoded for {len(set(known_faces_names))} people.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode faces from the dataset folder into the encodings store.")
+    parser.add_argument("--dataset", default=KNOWN_FACES_DIR, help="Dataset folder (one sub-folder per person)")
+    parser.add_argument("--output", default=ENCODINGS_FILE, help="Encodings store to write")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="Incremental manifest path")
+    parser.add_argument("--model", default=MODEL, choices=["hog", "cnn"], help="Face detection model")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores, 1 = serial)")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-encode every image")
+    parser.add_argument("--consolidate", action="store_true",
+                        help=f"Also write per-student templates to '{TEMPLATES_STORE_PATH}' (see consolidate.py)")
+    args = parser.parse_args()
+    if encode_dataset(args.dataset, args.output, args.manifest, args.model, args.workers, args.full) and args.consolidate:
+        consolidate_store(args.output, TEMPLATES_STORE_PATH, args.manifest)
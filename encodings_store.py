@@ -0,0 +1,320 @@
+# encodings_store.py
+# Versioned binary encodings store jo np.memmap se khulta hai.
+#
+# Layout (little-endian, har section 64-byte aligned):
+#   header   : magic, version, dim, count, n_names + section offsets, random store id
+#   encodings: float32 (count x dim)
+#   norms_sq : float32 (count)            -- matcher ke liye precomputed ||x||^2
+#   labels   : int32   (count)            -- row -> name id
+#   offsets  : uint64  (n_names + 1)      -- name id -> byte range in blob
+#   blob     : utf-8 names, back to back
+#
+# File read-only map hoti hai, isliye kai worker processes ek hi page-cache
+# copy share karte hain aur open karna gallery size par depend nahi karta.
+import os
+import sys
+import uuid
+import zlib
+import hashlib
+import pickle
+import struct
+import tempfile
+from collections.abc import Sequence
+
+import numpy as np
+
+MAGIC = b"FAENCSTR"
+VERSION = 1
+DEFAULT_STORE_PATH = "encodings.bin"
+
+_HEADER = struct.Struct("<8sIIQQQQQQQQ")
+_HEADER_SIZE = 128
+# Har write_store ek naya random id header ki padding me likhta hai (purane stores me zeros)
+_STORE_ID = struct.Struct("<16s")
+_STORE_ID_OFFSET = _HEADER.size
+_ALIGN = 64
+
+# Online enrollment ka append-only log (store ke saath "<store>.log")
+LOG_MAGIC = b"FAENCLOG"
+LOG_SUFFIX = ".log"
+_LOG_HEADER = struct.Struct("<8s16s")   # magic, base store id
+_LOG_RECORD = struct.Struct("<IHH")    # crc32(payload), name bytes, dim
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def new_store_id() -> bytes:
+    return uuid.uuid4().bytes
+
+
+def _identity(header: bytes, st: os.stat_result) -> bytes:
+    (raw,) = _STORE_ID.unpack_from(header, _STORE_ID_OFFSET)
+    if raw.strip(b"\0"):
+        return raw
+    # Id se pehle likha gaya store: file ki identity (inode, size, mtime) se kaam chalana
+    return hashlib.blake2b(struct.pack("<QQQ", st.st_ino, st.st_size, st.st_mtime_ns), digest_size=16).digest()
+
+
+class NameTable(Sequence):
+    """Name id -> name, decoded lazily from the memory-mapped blob."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray) -> None:
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+
+class RowNames(Sequence):
+    """Per-encoding name list (same shape as the old pickle's 'names')."""
+
+    def __init__(self, labels: np.ndarray, table: NameTable) -> None:
+        self._labels = labels
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._table[int(self._labels[i])]
+
+
+class EncodingStore:
+    """Read-only view over an encodings store file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno()) # Wahi file jo map ho rahi hai (beech me replace ho sakti hai)
+            self._buf = np.memmap(f, dtype=np.uint8, mode="r")
+        if len(self._buf) < _HEADER_SIZE:
+            raise ValueError(f"'{path}' is too small to be an encodings store")
+        header = self._buf[:_HEADER_SIZE].tobytes()
+        (magic, version, dim, count, n_names, enc_off, norms_off,
+         labels_off, offsets_off, blob_off, blob_len) = _HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not an encodings store")
+        if version != VERSION:
+            raise ValueError(f"Unsupported encodings store version {version} in '{path}' (expected {VERSION})")
+
+        self.version = version
+        self.dim = dim
+        self.store_id = _identity(header, st)
+        self.encodings = self._view(enc_off, np.float32, count * dim).reshape(count, dim)
+        self.norms_sq = self._view(norms_off, np.float32, count)
+        self.labels = self._view(labels_off, np.int32, count)
+        self.name_table = NameTable(self._view(offsets_off, np.uint64, n_names + 1), self._view(blob_off, np.uint8, blob_len))
+        self.names = RowNames(self.labels, self.name_table)
+
+    def _view(self, offset: int, dtype, count: int) -> np.ndarray:
+        nbytes = count * np.dtype(dtype).itemsize
+        if offset + nbytes > len(self._buf):
+            raise ValueError(f"Encodings store '{self.path}' is truncated")
+        return self._buf[offset:offset + nbytes].view(dtype)
+
+    def __len__(self) -> int:
+        return self.encodings.shape[0]
+
+
+def open_store(path: str = DEFAULT_STORE_PATH) -> EncodingStore:
+    return EncodingStore(path)
+
+
+def write_store(path: str, encodings, names, store_id: bytes | None = None) -> None:
+    """
+    Writes a new store atomically (temp file in the same directory + os.replace).
+    `store_id` (16 bytes) lets a caller record the new store's id elsewhere first.
+    """
+    names = [str(n) for n in names]
+    count = len(names)
+    enc = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(count, -1)) if count else np.zeros((0, 128), dtype=np.float32)
+    dim = enc.shape[1]
+    norms_sq = np.einsum("ij,ij->i", enc, enc).astype(np.float32)
+
+    # Unique names ko ek baar store karna; har row sirf id rakhti hai
+    name_ids: dict[str, int] = {}
+    labels = np.empty(count, dtype=np.int32)
+    for i, n in enumerate(names):
+        labels[i] = name_ids.setdefault(n, len(name_ids))
+    encoded_names = [n.encode("utf-8") for n in name_ids]
+    name_offsets = np.zeros(len(encoded_names) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded_names], out=name_offsets[1:])
+    blob = b"".join(encoded_names)
+
+    enc_off = _HEADER_SIZE
+    norms_off = _align(enc_off + enc.nbytes)
+    labels_off = _align(norms_off + norms_sq.nbytes)
+    offsets_off = _align(labels_off + labels.nbytes)
+    blob_off = _align(offsets_off + name_offsets.nbytes)
+
+    header = _HEADER.pack(MAGIC, VERSION, dim, count, len(encoded_names), enc_off, norms_off,
+                          labels_off, offsets_off, blob_off, len(blob)) + _STORE_ID.pack(store_id or new_store_id())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".encodings-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for offset, data in ((0, header), (enc_off, enc.tobytes()), (norms_off, norms_sq.tobytes()),
+                                 (labels_off, labels.tobytes()), (offsets_off, name_offsets.tobytes()),
+                                 (blob_off, blob)):
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_id(path: str) -> bytes | None:
+    """Id of a store file (from its header, O(1)): identifies the exact base an enrollment log applies to."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER_SIZE)
+            st = os.fstat(f.fileno())
+    except OSError:
+        return None
+    if len(header) < _HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+        return None
+    return _identity(header, st)
+
+
+class EncodingLog:
+    """
+    Append-only log of (name, encoding) rows added on top of one base store.
+
+    Every append is a single write followed by fsync, so an acknowledged
+    enrollment survives a crash; a torn record at the tail (crash mid-write)
+    fails its CRC and is truncated on the next replay. The header records the
+    base store's id: once the store is rewritten (compaction, or a fresh
+    encode_faces.py run) the old log no longer applies and is reset.
+    """
+
+    def __init__(self, path: str, base_id: bytes | None) -> None:
+        self.path = path
+        self.base_id = base_id
+        self.rows = 0
+
+    def _header(self, base_id) -> bytes:
+        return _LOG_HEADER.pack(LOG_MAGIC, base_id or b"")
+
+    def reset(self, base_id=None) -> None:
+        """Atomically replaces the log with an empty one for `base_id` (default: the current base)."""
+        if base_id is not None:
+            self.base_id = base_id
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".enclog-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._header(self.base_id))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.rows = 0
+
+    def _scan(self):
+        """(file bytes or None if missing/stale, encodings, names, end of the last complete record)."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None, [], [], 0
+        if len(data) < _LOG_HEADER.size or data[:_LOG_HEADER.size] != self._header(self.base_id):
+            return None, [], [], 0
+
+        encodings, names = [], []
+        offset = _LOG_HEADER.size
+        while offset + _LOG_RECORD.size <= len(data):
+            crc, name_len, dim = _LOG_RECORD.unpack_from(data, offset)
+            start = offset + _LOG_RECORD.size
+            end = start + name_len + dim * 4
+            if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                break
+            names.append(data[start:start + name_len].decode("utf-8"))
+            encodings.append(np.frombuffer(data[start + name_len:end], dtype=np.float32).copy())
+            offset = end
+        return data, encodings, names, offset
+
+    def read(self) -> tuple[list[np.ndarray], list[str]]:
+        """
+        The logged (encodings, names) without touching the file: a missing or
+        stale log reads as empty and a torn tail is ignored. For readers
+        outside the process that appends (e.g. consolidate.py).
+        """
+        _, encodings, names, _ = self._scan()
+        return encodings, names
+
+    def replay(self) -> tuple[list[np.ndarray], list[str]]:
+        """
+        Returns the logged (encodings, names). A missing or stale log is reset
+        and a torn tail is truncated, so the file is ready for append() after.
+        """
+        data, encodings, names, offset = self._scan()
+        if data is None:
+            if os.path.exists(self.path):
+                print(f"Enrollment log '{self.path}' belongs to an older store; starting a new log.")
+            self.reset()
+            return [], []
+        if offset != len(data):
+            # Crash ke beech likha aadha record: sirf pichle complete records rakhna
+            print(f"Enrollment log '{self.path}': dropping {len(data) - offset} bytes of incomplete record.")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+                f.flush()
+                os.fsync(f.fileno())
+        self.rows = len(names)
+        return encodings, names
+
+    def append(self, encodings, names) -> None:
+        """Durably appends rows (returns after fsync)."""
+        records = []
+        for encoding, name in zip(encodings, names):
+            name_bytes = str(name).encode("utf-8")
+            vector = np.asarray(encoding, dtype=np.float32).reshape(-1)
+            payload = name_bytes + vector.tobytes()
+            records.append(_LOG_RECORD.pack(zlib.crc32(payload), len(name_bytes), len(vector)) + payload)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            pending = memoryview(b"".join(records))
+            while pending:
+                pending = pending[os.write(fd, pending):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.rows += len(records)
+
+
+def convert_pickle(pickle_path: str = "encodings.pickle", store_path: str = DEFAULT_STORE_PATH) -> int:
+    """One-shot converter from the legacy encodings.pickle format."""
+    with open(pickle_path, "rb") as f:
+        data = pickle.load(f)
+    write_store(store_path, data["encodings"], data["names"])
+    return len(data["names"])
+
+
+if __name__ == "__main__":
+    # Usage: python encodings_store.py [encodings.pickle] [encodings.bin]
+    src = sys.argv[1] if len(sys.argv) > 1 else "encodings.pickle"
+    dst = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORE_PATH
+    total = convert_pickle(src, dst)
+    print(f"Converted {total} encodings from '{src}' to '{dst}'.")
@@ -0,0 +1,104 @@
+# enrollment.py
+# Naye student ko server restart / poora encode_faces.py chalaye bina gallery me
+# jodna. Images dataset/<name>/ me bhi save hoti hain, taaki agla full encode
+# run unhe bhi shaamil kare.
+import os
+import re
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+_NAME_RE = re.compile(r"[^\w.\- ]+")
+
+
+def safe_student_name(name) -> str:
+    """Gallery name ("Name_RollNumber") usable as a dataset folder; raises ValueError if nothing is left."""
+    cleaned = _NAME_RE.sub("", str(name or "")).strip().strip(".")
+    if not cleaned:
+        raise ValueError("A student name is required.")
+    return cleaned[:100]
+
+
+def save_images(dataset_dir: str, name: str, images) -> list[str]:
+    """
+    Writes `images` ((filename, bytes) pairs or BGR frames) to
+    dataset/<name>/enroll_<timestamp>_<i>.<ext>. Files that do not decode as
+    images are skipped. Returns the written paths.
+    """
+    person_dir = os.path.join(dataset_dir, name)
+    os.makedirs(person_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    paths = []
+    for i, image in enumerate(images):
+        if isinstance(image, np.ndarray):
+            ok, buffer = cv2.imencode(".jpg", image)
+            if not ok:
+                continue
+            data, ext = buffer.tobytes(), ".jpg"
+        else:
+            filename, data = image
+            ext = os.path.splitext(filename or "")[1].lower()
+            if ext not in IMAGE_EXTENSIONS:
+                ext = ".jpg"
+            # Upload sach me image hai ya nahi, disk par likhne se pehle check
+            if cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) is None:
+                print(f"  - Skipping upload that is not an image: {filename}")
+                continue
+        path = os.path.join(person_dir, f"enroll_{stamp}_{i}{ext}")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+class EnrollmentEncoder:
+    """
+    Small process pool that encodes enrollment images with encode_faces'
+    worker, so detection never runs on a request thread's GIL. Created on
+    the first enrollment and shut down at exit.
+    """
+
+    def __init__(self, workers: int = 2, model: str = "hog") -> None:
+        self.workers = max(1, workers)
+        self.model = model
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = Lock()
+        self.images = 0
+        self.faces = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Spawn: forked worker me server ke threads/locks nahi aane chahiye
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"))
+            return self._pool
+
+    def encode(self, paths) -> tuple[list[np.ndarray], list[tuple[str, str]]]:
+        """Returns (encodings, [(path, reason), ...] for images without a usable face)."""
+        from encode_faces import encode_image
+        futures = [(path, self._get_pool().submit(encode_image, path, self.model)) for path in paths]
+        encodings, rejected = [], []
+        for path, future in futures:
+            _, encoding, error = future.result()
+            if encoding is None:
+                rejected.append((path, error or "no face found"))
+            else:
+                encodings.append(np.asarray(encoding, dtype=np.float32))
+        self.images += len(paths)
+        self.faces += len(encodings)
+        return encodings, rejected
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "model": self.model, "started": self._pool is not None,
+                "images": self.images, "faces": self.faces}
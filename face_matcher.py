@@ -0,0 +1,337 @@
+# face_matcher.py
+# Known faces ke against batched nearest-neighbour matching.
+import copy
+from collections.abc import Sequence
+
+import numpy as np
+
+DEFAULT_TOLERANCE = 0.5
+
+
+def _squared_distances(queries: np.ndarray, q_norms_sq: np.ndarray, base: np.ndarray, base_norms_sq: np.ndarray) -> np.ndarray:
+    # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b
+    d2 = q_norms_sq[:, None] + base_norms_sq[None, :] - 2.0 * (queries @ base.T)
+    np.maximum(d2, 0.0, out=d2)  # float32 rounding se chhote negative values aa sakte hain
+    return d2
+
+
+def _top_k(d2: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Row-wise k smallest squared distances, sorted ascending."""
+    k = min(k, d2.shape[1])
+    if k < d2.shape[1]:
+        part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(d2.shape[1]), d2.shape)
+    part_d2 = np.take_along_axis(d2, part, axis=1)
+    order = np.argsort(part_d2, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_d2, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force index: one matrix product against the whole gallery."""
+
+    kind = "exact"
+
+    def __init__(self, encodings: np.ndarray, norms_sq: np.ndarray) -> None:
+        self.encodings = encodings
+        self.norms_sq = norms_sq
+
+    def search(self, queries: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (indices, distances), both of shape (M, k)."""
+        q_norms_sq = np.einsum("ij,ij->i", queries, queries)
+        d2 = _squared_distances(queries, q_norms_sq, self.encodings, self.norms_sq)
+        idx, top_d2 = _top_k(d2, k)
+        return idx, np.sqrt(top_d2)
+
+    def stats(self) -> dict:
+        return {"kind": self.kind, "size": int(self.encodings.shape[0])}
+
+
+class IVFIndex:
+    """
+    Inverted-file index: the gallery is partitioned with k-means and a query
+    only scans the `nprobe` partitions whose centroids are closest to it.
+    Per-query cost is roughly nlist + nprobe * N / nlist distances instead of N.
+    nprobe is the recall/latency knob: higher = closer to exact, but slower.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, encodings: np.ndarray, norms_sq: np.ndarray, nlist: int | None = None,
+                 nprobe: int = 8, kmeans_iters: int = 10, seed: int = 0) -> None:
+        n = encodings.shape[0]
+        self.nlist = max(1, min(n, nlist or int(round(np.sqrt(n)))))
+        self.nprobe = max(1, min(self.nlist, nprobe))
+        self.centroids = self._train_kmeans(encodings, norms_sq, kmeans_iters, seed)
+        self.centroid_norms_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+        # Har gallery row ko uske nearest centroid wali list me daalna
+        assign = self._assign(encodings, norms_sq)
+        order = np.argsort(assign, kind="stable")
+        self.sizes = np.bincount(assign, minlength=self.nlist)
+        self.offsets = np.concatenate(([0], np.cumsum(self.sizes)))
+        # Lists ko contiguous rakhna taaki probe ek slice ho, gather nahi
+        self.ids = order.astype(np.int64)
+        self.list_encodings = np.ascontiguousarray(encodings[order])
+        self.list_norms_sq = np.ascontiguousarray(norms_sq[order])
+
+    def _assign(self, encodings: np.ndarray, norms_sq: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        assign = np.empty(encodings.shape[0], dtype=np.int64)
+        for start in range(0, encodings.shape[0], chunk):
+            block = encodings[start:start + chunk]
+            d2 = _squared_distances(block, norms_sq[start:start + chunk], self.centroids, self.centroid_norms_sq)
+            assign[start:start + chunk] = np.argmin(d2, axis=1)
+        return assign
+
+    def _train_kmeans(self, encodings: np.ndarray, norms_sq: np.ndarray, iters: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        n = encodings.shape[0]
+        # Training ke liye sample kaafi hai; poori gallery par sirf final assignment
+        sample_size = min(n, 64 * self.nlist)
+        sample_idx = rng.choice(n, size=sample_size, replace=False) if sample_size < n else np.arange(n)
+        sample = np.ascontiguousarray(encodings[sample_idx])
+        sample_norms_sq = norms_sq[sample_idx]
+
+        centroids = sample[rng.choice(sample_size, size=self.nlist, replace=False)].copy()
+        for _ in range(iters):
+            c_norms_sq = np.einsum("ij,ij->i", centroids, centroids)
+            assign = np.argmin(_squared_distances(sample, sample_norms_sq, centroids, c_norms_sq), axis=1)
+            counts = np.bincount(assign, minlength=self.nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+            # Khaali cluster ko random sample point par reseed karna
+            empty = np.flatnonzero(~nonempty)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, size=len(empty), replace=False)]
+        return centroids
+
+    def search(self, queries: np.ndarray, k: int = 1, nprobe: int | None = None,
+               max_block_bytes: int = 32 << 20) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (indices, distances) of shape (M, k); missing slots are -1 / inf."""
+        nprobe = max(1, min(self.nlist, nprobe or self.nprobe))
+        out_idx = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        out_dist = np.full((queries.shape[0], k), np.inf, dtype=np.float32)
+        if queries.shape[0] == 0:
+            return out_idx, out_dist
+        q_norms_sq = np.einsum("ij,ij->i", queries, queries)
+        coarse = _squared_distances(queries, q_norms_sq, self.centroids, self.centroid_norms_sq)
+        probes, _ = _top_k(coarse, nprobe)
+
+        # Har query ke probed lists ek padded (M x width) candidate row matrix me:
+        # list (query, probe) ka segment hai, np.repeat se sab segments ek saath
+        sizes = self.sizes[probes]
+        ends = np.cumsum(sizes, axis=1)
+        widest = max(1, int(ends[:, -1].max()))
+        block = max(1, max_block_bytes // (widest * self.list_encodings.shape[1] * 4))
+        for lo in range(0, queries.shape[0], block):
+            hi = min(lo + block, queries.shape[0])
+            width = int(ends[lo:hi, -1].max())
+            if width == 0:
+                continue
+            lengths = sizes[lo:hi].ravel()
+            seg = np.repeat(np.arange(lengths.size), lengths)
+            within = np.arange(seg.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            cols = (ends[lo:hi] - sizes[lo:hi]).ravel()[seg] + within
+            rows = np.zeros((hi - lo, width), dtype=np.int64)
+            rows[seg // probes.shape[1], cols] = self.offsets[probes[lo:hi]].ravel()[seg] + within
+            valid = np.arange(width)[None, :] < ends[lo:hi, -1:]
+
+            dots = np.matmul(np.take(self.list_encodings, rows, axis=0), queries[lo:hi, :, None])[..., 0]
+            d2 = q_norms_sq[lo:hi, None] + self.list_norms_sq[rows] - 2.0 * dots
+            np.maximum(d2, 0.0, out=d2)
+            d2[~valid] = np.inf
+            local, top_d2 = _top_k(d2, k)
+            found = local.shape[1]
+            out_idx[lo:hi, :found] = np.where(np.isfinite(top_d2), self.ids[np.take_along_axis(rows, local, axis=1)], -1)
+            out_dist[lo:hi, :found] = np.sqrt(top_d2)
+        return out_idx, out_dist
+
+    def stats(self) -> dict:
+        sizes = np.diff(self.offsets)
+        return {
+            "kind": self.kind,
+            "size": int(self.offsets[-1]),
+            "nlist": int(self.nlist),
+            "nprobe": int(self.nprobe),
+            "max_list": int(sizes.max()) if len(sizes) else 0,
+        }
+
+
+class AppendedSequence(Sequence):
+    """`base` followed by `extra`, without copying `base` (e.g. a memory-mapped name list)."""
+
+    def __init__(self, base: Sequence, extra: list) -> None:
+        self.base = base
+        self.extra = extra
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.base[i] if i < len(self.base) else self.extra[i - len(self.base)]
+
+
+class FaceMatcher:
+    """
+    Holds the known gallery as one contiguous float32 (N x 128) matrix with
+    precomputed squared norms, so every face in a frame is matched with a
+    single batched search instead of one compare_faces() call per face.
+
+    index="exact" always scans everything, index="ivf" always uses the
+    k-means partitioned index, and index="auto" switches to IVF once the
+    gallery reaches `ivf_threshold` encodings.
+
+    With IVF, `exact_fallback` re-checks every face left above the tolerance
+    with a full scan; that includes every stranger, so it is off by default.
+    `recall_sample` instead compares every n-th match() call against the
+    exact search and reports the observed recall in stats().
+    """
+
+    def __init__(self, encodings, names, tolerance: float = DEFAULT_TOLERANCE, index: str = "auto",
+                 ivf_threshold: int = 10000, nlist: int | None = None, nprobe: int = 8,
+                 exact_fallback: bool = False, recall_sample: int = 0, norms_sq=None) -> None:
+        # Memory-mapped store ke lazy name sequence ko list me copy nahi karna
+        self.names = names if isinstance(names, Sequence) else list(names)
+        self.tolerance = tolerance
+        self.exact_fallback = exact_fallback
+        self.recall_sample = recall_sample
+        self._match_calls = 0
+        self._recall_checked = 0
+        self._recall_hits = 0
+        if len(self.names) == 0:
+            self.encodings = np.zeros((0, 128), dtype=np.float32)
+        else:
+            # float32 contiguous input (jaise memmap) par koi copy nahi hoti
+            self.encodings = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(len(self.names), -1))
+        if norms_sq is not None and len(norms_sq) == len(self.names):
+            self.norms_sq = np.asarray(norms_sq, dtype=np.float32)
+        else:
+            self.norms_sq = np.einsum("ij,ij->i", self.encodings, self.encodings)
+
+        self.exact_index = ExactIndex(self.encodings, self.norms_sq)
+        use_ivf = index == "ivf" or (index == "auto" and len(self.names) >= ivf_threshold)
+        if use_ivf and len(self.names) > 0:
+            self.index = IVFIndex(self.encodings, self.norms_sq, nlist=nlist, nprobe=nprobe)
+        else:
+            self.index = self.exact_index
+        # extended() ke rows: chhota exact index jo har search me base ke saath scan hota hai
+        self.base_size = len(self.names)
+        self.delta: ExactIndex | None = None
+        self._delta_names: list[str] = []
+
+    def extended(self, encodings, names) -> "FaceMatcher":
+        """
+        New matcher with extra gallery rows appended. The base matrix and its
+        index are shared, not rebuilt: appended rows go into a small exact
+        "delta" index that every search also scans, until the gallery is
+        compacted into a new store and loaded from scratch.
+        """
+        names = [str(n) for n in names]
+        add = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)
+        if self.delta is not None:
+            add = np.vstack([self.delta.encodings, add])
+        add = np.ascontiguousarray(add)
+        matcher = copy.copy(self)
+        matcher.delta = ExactIndex(add, np.einsum("ij,ij->i", add, add))
+        matcher._delta_names = self._delta_names + names
+        base_names = self.names.base if isinstance(self.names, AppendedSequence) else self.names
+        matcher.names = AppendedSequence(base_names, matcher._delta_names)
+        return matcher
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def nprobe(self) -> int | None:
+        return getattr(self.index, "nprobe", None)
+
+    @nprobe.setter
+    def nprobe(self, value: int) -> None:
+        if isinstance(self.index, IVFIndex):
+            self.index.nprobe = max(1, min(self.index.nlist, int(value)))
+
+    def _as_queries(self, face_encodings) -> np.ndarray:
+        dim = self.encodings.shape[1] if self.base_size or self.delta is None else self.delta.encodings.shape[1]
+        return np.ascontiguousarray(np.asarray(face_encodings, dtype=np.float32).reshape(-1, dim))
+
+    def distances(self, face_encodings) -> np.ndarray:
+        """Exact euclidean distances of shape (M, N) between M query faces and the gallery."""
+        queries = self._as_queries(face_encodings)
+        q_norms_sq = np.einsum("ij,ij->i", queries, queries)
+        d2 = _squared_distances(queries, q_norms_sq, self.encodings, self.norms_sq)
+        if self.delta is not None:
+            d2 = np.hstack([d2, _squared_distances(queries, q_norms_sq, self.delta.encodings, self.delta.norms_sq)])
+        return np.sqrt(d2)
+
+    def search(self, face_encodings, k: int = 1, exact: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k gallery rows and distances for every query face."""
+        queries = self._as_queries(face_encodings)
+        index = self.exact_index if exact else self.index
+        idx, dist = index.search(queries, k)
+        if self.delta is None:
+            return idx, dist
+        # Base aur delta ke top-k ko merge karna (delta rows base ke baad number hote hain)
+        d_idx, d_dist = self.delta.search(queries, k)
+        idx = np.hstack([idx, d_idx + self.base_size])
+        dist = np.hstack([dist.astype(np.float32), d_dist.astype(np.float32)])
+        order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(dist, order, axis=1)
+
+    def match(self, face_encodings, exact: bool = False) -> list[tuple[str, float]]:
+        """
+        Returns (name, distance) for every query face. The closest known face
+        wins; if it is farther than the tolerance the name is "Unknown".
+        """
+        if len(face_encodings) == 0:
+            return []
+        if len(self.names) == 0:
+            return [("Unknown", float("inf")) for _ in range(len(face_encodings))]
+
+        queries = self._as_queries(face_encodings)
+        idx, dist = self.search(queries, k=1, exact=exact)
+        best_idx, best_dist = idx[:, 0], dist[:, 0]
+
+        # Approximate index ne jo miss kiya use exact scan se dobara check karna
+        if not exact and self.exact_fallback and self.index is not self.exact_index:
+            missed = np.flatnonzero(best_dist > self.tolerance)
+            if len(missed):
+                ex_idx, ex_dist = self.search(queries[missed], k=1, exact=True)
+                best_idx[missed], best_dist[missed] = ex_idx[:, 0], ex_dist[:, 0]
+        elif not exact and self.recall_sample and self.index is not self.exact_index:
+            self._match_calls += 1
+            if self._match_calls % self.recall_sample == 0:
+                # Sampled check: sirf stats ke liye, result nahi badalta
+                ex_idx, _ = self.search(queries, k=1, exact=True)
+                self._recall_checked += len(queries)
+                self._recall_hits += int(np.count_nonzero(ex_idx[:, 0] == best_idx))
+
+        results = []
+        for i, d in zip(best_idx, best_dist):
+            name = self.names[i] if i >= 0 and d <= self.tolerance else "Unknown"
+            results.append((name, float(d)))
+        return results
+
+    def measure_recall(self, face_encodings, k: int = 1) -> float:
+        """Fraction of exact top-k neighbours (appended rows included) that the active index also returns."""
+        queries = self._as_queries(face_encodings)
+        if len(queries) == 0 or len(self.names) == 0:
+            return 1.0
+        approx, _ = self.search(queries, k)
+        exact, _ = self.search(queries, k, exact=True)
+        hits = sum(len(set(a) & set(e)) for a, e in zip(approx.tolist(), exact.tolist()))
+        return hits / exact.size
+
+    def stats(self) -> dict:
+        stats = {**self.index.stats(), "tolerance": self.tolerance,
+                 "appended": len(self._delta_names)}
+        if self._recall_checked:
+            stats["sampled_recall"] = round(self._recall_hits / self._recall_checked, 4)
+        return stats
@@ -0,0 +1,206 @@
+# gallery.py
+# Face gallery ka immutable snapshot: encodings + names + matcher + roster ek
+# saath bante hain. Reload naya snapshot background me banata hai aur ek
+# assignment me swap karta hai; jo request purana snapshot pakde hue hai woh
+# use hi use karti hai, aur aakhri reference jaate hi memory (memmap) free.
+import os
+import time
+import pickle
+import threading
+import weakref
+
+import numpy as np
+
+from encodings_store import open_store, write_store, new_store_id, store_id, EncodingLog, LOG_SUFFIX
+from face_matcher import FaceMatcher, AppendedSequence
+from roster import Roster
+
+
+def file_signature(path: str | None):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def select_source(encodings_path: str, templates_path: str | None, pickle_path: str, quiet: bool = False):
+    """
+    Which gallery file to load: (path, kind) with kind "store" or "pickle",
+    or (None, None). Consolidated templates win while they are at least as
+    new as the full store. Enrollment always goes to the full store's log,
+    so loading the templates does not hide enrolled students from it.
+    """
+    full = encodings_path if os.path.exists(encodings_path) else None
+    if templates_path and os.path.exists(templates_path):
+        if full is None or os.path.getmtime(templates_path) >= os.path.getmtime(full):
+            return templates_path, "store"
+        if not quiet:
+            print(f"WARNING: '{templates_path}' is older than '{full}'; run consolidate.py again. Using the full store.")
+    if full:
+        return full, "store"
+    if os.path.exists(pickle_path):
+        return pickle_path, "pickle"
+    return None, None
+
+
+class GallerySnapshot:
+    """
+    One loaded gallery. Never mutated after construction: a reload builds a
+    new snapshot (including the matcher's index and the roster) and swaps it.
+    """
+
+    def __init__(self, encodings, names, matcher: FaceMatcher, roster: Roster, source: str | None = None,
+                 signature=None, store=None, version: int = 0, log: EncodingLog | None = None) -> None:
+        self.encodings = encodings
+        self.names = names
+        self.matcher = matcher
+        self.roster = roster
+        self.source = source
+        self.signature = signature
+        self.store = store # Memory-mapped EncodingStore (encodings/names iske views hain)
+        self.version = version
+        self.log = log # Store ke upar online enrollments (sirf store-backed gallery)
+        self.loaded_at = time.time()
+
+    @classmethod
+    def empty(cls, version: int = 0) -> "GallerySnapshot":
+        return cls([], [], FaceMatcher([], []), Roster([]), version=version)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def extended(self, encodings, names, version: int) -> "GallerySnapshot":
+        """New snapshot with rows appended to the matcher and roster (neither is rebuilt)."""
+        names = [str(n) for n in names]
+        matcher = self.matcher.extended(encodings, names)
+        base = self.encodings.base if isinstance(self.encodings, AppendedSequence) else self.encodings
+        rows = AppendedSequence(base, (self.encodings.extra if isinstance(self.encodings, AppendedSequence) else [])
+                                + [np.asarray(e, dtype=np.float32) for e in encodings])
+        return _track(GallerySnapshot(rows, matcher.names, matcher, self.roster.extended(names), self.source,
+                                      self.signature, self.store, version, self.log))
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "faces": len(self.names),
+            "students": len(self.roster),
+            "matcher": self.matcher.stats(),
+            "roster": self.roster.stats(),
+            "logged_rows": self.log.rows if self.log else None,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _track(snapshot: GallerySnapshot) -> GallerySnapshot:
+    weakref.finalize(snapshot, print, f"Gallery snapshot v{snapshot.version} released.")
+    return snapshot
+
+
+def load_snapshot(path: str, kind: str, matcher_config: dict | None = None, version: int = 0,
+                  enrollment_store: str | None = None) -> GallerySnapshot:
+    """
+    Loads a gallery file and builds its matcher and roster; raises on a bad
+    file. The enrollment log of `enrollment_store` (default: the loaded
+    store itself) is replayed on top; the templates store passes the full
+    store here. Without that store the snapshot has no log.
+    """
+    signature = file_signature(path) # Load se pehle: beech me file badli to watcher dobara reload karega
+    if kind == "store":
+        store = open_store(path)
+        matcher = FaceMatcher(store.encodings, store.names, norms_sq=store.norms_sq, **(matcher_config or {}))
+        log_store = enrollment_store or path
+        same = os.path.abspath(log_store) == os.path.abspath(path)
+        log_id = store.store_id if same else store_id(log_store)
+        log = EncodingLog(log_store + LOG_SUFFIX, log_id) if log_id is not None else None
+        # Store me distinct names alag table me hain
+        snapshot = GallerySnapshot(store.encodings, store.names, matcher, Roster(store.name_table),
+                                   path, signature, store, version, log)
+        if log is None:
+            return _track(snapshot)
+        # Pichli compaction ke baad ke enrollments store ke upar dobara lagana
+        encodings, names = snapshot.log.replay()
+        if names:
+            print(f"Replayed {len(names)} enrolled encodings from '{snapshot.log.path}'.")
+            return snapshot.extended(encodings, names, version)
+    else:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        matcher = FaceMatcher(data["encodings"], data["names"], **(matcher_config or {}))
+        snapshot = GallerySnapshot(data["encodings"], data["names"], matcher, Roster(data["names"]),
+                                   path, signature, None, version)
+    return _track(snapshot)
+
+
+def compact_snapshot(snapshot: GallerySnapshot, manifest_path: str | None = None) -> str:
+    """
+    Folds a snapshot's enrollment log into the store the log belongs to (the
+    full store, also when the snapshot shows the templates): its rows
+    first, in the same order, then the logged rows. The store is replaced
+    atomically, the log is reset for the new store and its path returned.
+
+    If encode_faces' manifest describes this store, it is retargeted to the
+    new store id: first to accept both ids, then, after the store is
+    replaced, only the new one. A crash at any point leaves a manifest that
+    matches whichever store is on disk, so the next encode_faces.py run
+    stays incremental.
+    """
+    from encode_faces import retarget_manifest # face_recognition sirf yahan chahiye
+    log = snapshot.log
+    path = log.path[:-len(LOG_SUFFIX)]
+    base = open_store(path)
+    old_id, new_id = base.store_id, new_store_id()
+    if old_id != log.base_id:
+        raise RuntimeError(f"'{path}' changed since its enrollment log was opened; reload before compacting.")
+    encodings, names = log.read()
+    logged = np.asarray(encodings, dtype=np.float32).reshape(len(names), base.encodings.shape[1])
+    rows, all_names = np.vstack([np.asarray(base.encodings), logged]), list(base.names) + names
+    del base  # memmap chhodna, file replace hone wali hai
+    staged = bool(manifest_path) and retarget_manifest(manifest_path, path, [old_id, new_id])
+    write_store(path, rows, all_names, store_id=new_id)
+    if staged:
+        retarget_manifest(manifest_path, path, [new_id])
+    log.reset(new_id)
+    return path
+
+
+class GalleryWatcher:
+    """
+    Polls the gallery files every `poll_interval` seconds. When the file that
+    would be loaded (`probe()` -> (path, signature)) differs from the loaded
+    one (`current()`), it waits until the file has stayed unchanged for one
+    more poll, so a half-copied file is not loaded, and then calls on_change().
+    """
+
+    def __init__(self, probe, current, on_change, poll_interval: float = 2.0) -> None:
+        self.probe = probe
+        self.current = current
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self.changes = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        pending = None
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                seen = self.probe()
+                if seen[0] is None or seen == self.current():
+                    pending = None
+                elif seen == pending:
+                    pending = None
+                    self.changes += 1
+                    self.on_change()
+                else:
+                    pending = seen # Agli poll tak stable rehna chahiye
+            except Exception as e:
+                print(f"Gallery watcher error: {e}")
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -0,0 +1,325 @@
+# recognition.py
+# RecognitionWorker ke per-frame decisions: kab recognize karna hai aur kis scale par.
+import time
+
+import cv2
+import numpy as np
+
+
+class AdaptiveScheduler:
+    """
+    Decides when the next frame goes to face recognition and at what scale,
+    instead of a fixed "every 5th frame at 0.5x".
+
+    - The interval between recognitions is the larger of 1 / target_rate and
+      ema_latency / cpu_budget, so a slow PC keeps within its CPU budget and a
+      fast one recognizes up to the target rate.
+    - When recognition keeps finding nothing new, the interval backs off
+      geometrically up to max_interval; a scene change or a new/unknown face
+      snaps it back to the base interval.
+    - The downscale targets `target_width` pixels and steps down when a single
+      recognition takes longer than `max_latency`.
+    """
+
+    def __init__(self, target_rate: float = 6.0, cpu_budget: float = 0.5, max_interval: float = 2.0,
+                 backoff: float = 1.5, target_width: int = 640, min_width: int = 320,
+                 max_latency: float = 0.25, scene_change_threshold: float = 2.0, ema_alpha: float = 0.2) -> None:
+        self.target_rate = target_rate
+        self.cpu_budget = cpu_budget
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_width = target_width
+        self.target_width = target_width
+        self.min_width = min_width
+        self.max_latency = max_latency
+        self.scene_change_threshold = scene_change_threshold
+        self.ema_alpha = ema_alpha
+
+        self.ema_latency: float | None = None
+        self.interval = 1.0 / target_rate
+        self.idle_streak = 0
+        self.last_run = 0.0
+        self.last_scene_change = 0.0
+        self.processed = 0
+        self.skipped = 0
+        self._busy_time = 0.0
+        self._started = time.monotonic()
+
+    def base_interval(self) -> float:
+        interval = 1.0 / self.target_rate
+        if self.ema_latency is not None and self.cpu_budget > 0:
+            interval = max(interval, self.ema_latency / self.cpu_budget)
+        return interval
+
+    def scale_for(self, frame_width: int) -> float:
+        return min(1.0, self.target_width / max(1, frame_width))
+
+    def should_process(self, scene_change: float = 0.0, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if scene_change >= self.scene_change_threshold:
+            # Scene badla: backoff chhod kar turant base rate par
+            self.last_scene_change = scene_change
+            self.idle_streak = 0
+            self.interval = self.base_interval()
+        if now - self.last_run >= self.interval:
+            self.last_run = now
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, latency: float, faces: int, new_faces: int) -> None:
+        """Called with the outcome of one recognition pass."""
+        self.processed += 1
+        self._busy_time += latency
+        if self.ema_latency is None:
+            self.ema_latency = latency
+        else:
+            self.ema_latency += self.ema_alpha * (latency - self.ema_latency)
+
+        # Ek recognition bahut slow ho to chhote frame par detect karna
+        if self.ema_latency > self.max_latency and self.target_width > self.min_width:
+            self.target_width = max(self.min_width, int(self.target_width * 0.8))
+        elif self.ema_latency < self.max_latency / 2 and self.target_width < self.max_width:
+            self.target_width = min(self.max_width, int(self.target_width * 1.25))
+
+        if new_faces > 0:
+            self.idle_streak = 0
+        else:
+            self.idle_streak += 1
+        base = self.base_interval()
+        self.interval = min(max(base, self.max_interval), base * (self.backoff ** min(self.idle_streak, 32)))
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        return {
+            "interval_ms": round(self.interval * 1000, 1),
+            "recognition_rate": round(1.0 / self.interval, 2) if self.interval > 0 else None,
+            "ema_latency_ms": round(self.ema_latency * 1000, 1) if self.ema_latency is not None else None,
+            "target_width": self.target_width,
+            "idle_streak": self.idle_streak,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "cpu_load": round(self._busy_time / elapsed, 3),
+        }
+
+
+class MotionGate:
+    """
+    Cheap pre-stage before face detection. Each frame is compared, at a small
+    grayscale resolution, against a running-average background. Changed
+    pixels are accumulated until the next detection, which then:
+
+    - is skipped when (almost) nothing changed,
+    - runs only on the padded bounding box of the changed area when that box
+      is a small part of the frame,
+    - runs on the full frame otherwise, and at least every force_full_interval
+      seconds so a still, not-yet-recognized face is not missed forever.
+    """
+
+    SKIP, ROI, FULL = "skip", "roi", "full"
+
+    def __init__(self, width: int = 160, diff_threshold: int = 25, bg_alpha: float = 0.05,
+                 min_changed_fraction: float = 0.002, roi_max_fraction: float = 0.5,
+                 roi_padding: float = 0.5, force_full_interval: float = 10.0, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.width = width
+        self.diff_threshold = diff_threshold
+        self.bg_alpha = bg_alpha
+        self.min_changed_fraction = min_changed_fraction
+        self.roi_max_fraction = roi_max_fraction
+        self.roi_padding = roi_padding
+        self.force_full_interval = force_full_interval
+
+        self._background = None
+        self._accumulated = None
+        self._kernel = np.ones((3, 3), np.uint8)
+        self.last_full = 0.0
+        self.motion = 0.0  # latest frame ke changed pixels, percent me
+        self.frames = 0
+        self.skipped = 0
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.pixels_saved = 0
+
+    def update(self, frame) -> float:
+        """Feeds one BGR frame; returns the percentage of pixels that changed."""
+        h, w = frame.shape[:2]
+        small_h = max(1, int(h * self.width / w))
+        gray = cv2.cvtColor(cv2.resize(frame, (self.width, small_h), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            self._accumulated = np.full(gray.shape, 255, np.uint8)  # pehli baar poora frame "changed"
+            self.motion = 100.0
+            return self.motion
+
+        mask = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        _, mask = cv2.threshold(mask, self.diff_threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        cv2.bitwise_or(self._accumulated, mask, dst=self._accumulated)
+        cv2.accumulateWeighted(gray, self._background, self.bg_alpha)
+        self.motion = 100.0 * cv2.countNonZero(mask) / mask.size
+        return self.motion
+
+    def plan(self, frame_shape, now: float | None = None) -> tuple[str, tuple[int, int, int, int] | None]:
+        """
+        Decision for the frame about to be detected: (SKIP, None), (FULL, None)
+        or (ROI, (x, y, w, h)) in full-frame pixels. Resets the accumulated change.
+        """
+        now = time.monotonic() if now is None else now
+        h, w = frame_shape[:2]
+        self.frames += 1
+        accumulated = self._accumulated
+        if accumulated is None or not self.enabled:
+            return self._full(now)
+        self._accumulated = np.zeros_like(accumulated)
+
+        if now - self.last_full >= self.force_full_interval:
+            return self._full(now)
+
+        changed = cv2.countNonZero(accumulated)
+        if changed < self.min_changed_fraction * accumulated.size:
+            self.skipped += 1
+            self.pixels_saved += h * w
+            return self.SKIP, None
+
+        # Changed area ka bounding box, padding ke saath full-frame coords me
+        bx, by, bw, bh = cv2.boundingRect(cv2.findNonZero(accumulated))
+        fx, fy = w / accumulated.shape[1], h / accumulated.shape[0]
+        pad_x, pad_y = bw * self.roi_padding * fx, bh * self.roi_padding * fy
+        x0, y0 = max(0, int(bx * fx - pad_x)), max(0, int(by * fy - pad_y))
+        x1, y1 = min(w, int((bx + bw) * fx + pad_x)), min(h, int((by + bh) * fy + pad_y))
+        if (x1 - x0) * (y1 - y0) > self.roi_max_fraction * w * h:
+            return self._full(now)
+        self.roi_frames += 1
+        self.pixels_saved += h * w - (x1 - x0) * (y1 - y0)
+        return self.ROI, (x0, y0, x1 - x0, y1 - y0)
+
+    def _full(self, now: float):
+        self.last_full = now
+        self.full_frames += 1
+        return self.FULL, None
+
+    def stats(self) -> dict:
+        return {
+            "motion_pct": round(self.motion, 2),
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "roi": self.roi_frames,
+            "full": self.full_frames,
+            "pixels_saved": int(self.pixels_saved),
+        }
+
+
+def box_iou(a, b) -> float:
+    """IoU of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    def __init__(self, track_id: int, box, now: float) -> None:
+        self.track_id = track_id
+        self.box = box
+        self.name = "Unknown"
+        self.distance = float("inf")
+        self.last_seen = now
+        self.last_encoded = 0.0
+        self.misses = 0
+
+    @property
+    def identified(self) -> bool:
+        return self.name != "Unknown"
+
+
+class FaceTracker:
+    """
+    IoU tracker over detected face boxes (full-frame coords). Identities are
+    carried across detections, so a face is only re-encoded when its track
+    is new, still unknown (at most every unknown_retry seconds), or due for
+    re-verification (every reverify_interval seconds).
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, reverify_interval: float = 5.0,
+                 unknown_retry: float = 0.5, max_misses: int = 3, max_age: float = 5.0) -> None:
+        self.iou_threshold = iou_threshold
+        self.reverify_interval = reverify_interval
+        self.unknown_retry = unknown_retry
+        self.max_misses = max_misses
+        self.max_age = max_age
+        self.tracks: list[Track] = []
+        self._next_id = 1
+        self.encoded = 0
+        self.reused = 0
+
+    def skip_boxes(self, now: float | None = None) -> list:
+        """Boxes of tracks that do not need a new encoding right now."""
+        now = time.monotonic() if now is None else now
+        boxes = []
+        for track in self.tracks:
+            interval = self.reverify_interval if track.identified else self.unknown_retry
+            if track.last_encoded and now - track.last_encoded < interval:
+                boxes.append(track.box)
+        return boxes
+
+    def update(self, locations, region=None, now: float | None = None) -> list[Track]:
+        """
+        Associates detections with tracks (greedy, highest IoU first) and
+        returns the track of every detection. Tracks inside `region`
+        (top, right, bottom, left; None = whole frame) that were not detected
+        count a miss; tracks outside it were simply not looked at.
+        """
+        now = time.monotonic() if now is None else now
+        pairs = sorted(((box_iou(loc, t.box), di, ti) for di, loc in enumerate(locations)
+                        for ti, t in enumerate(self.tracks)), reverse=True)
+        det_track: dict[int, Track] = {}
+        used = set()
+        for iou, di, ti in pairs:
+            if iou < self.iou_threshold:
+                break
+            if di in det_track or ti in used:
+                continue
+            det_track[di] = self.tracks[ti]
+            used.add(ti)
+
+        result = []
+        for di, loc in enumerate(locations):
+            track = det_track.get(di)
+            if track is None:
+                track = Track(self._next_id, loc, now)
+                self._next_id += 1
+                self.tracks.append(track)
+            track.box, track.last_seen, track.misses = loc, now, 0
+            result.append(track)
+
+        alive = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used and track.last_seen != now:
+                if region is None or box_iou(track.box, region) > 0:
+                    track.misses += 1
+                if track.misses >= self.max_misses or now - track.last_seen > self.max_age:
+                    continue # Track lost
+            alive.append(track)
+        self.tracks = alive
+        return result
+
+    def record_encoding(self, track: Track, name: str, distance: float, now: float | None = None) -> None:
+        track.name, track.distance = name, distance
+        track.last_encoded = time.monotonic() if now is None else now
+        self.encoded += 1
+
+    def stats(self) -> dict:
+        total = self.encoded + self.reused
+        return {
+            "tracks": len(self.tracks),
+            "identified": sum(t.identified for t in self.tracks),
+            "encoded": self.encoded,
+            "reused": self.reused,
+            "encode_saving_pct": round(100.0 * self.reused / total, 1) if total else 0.0,
+        }
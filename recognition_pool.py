@@ -0,0 +1,405 @@
+# recognition_pool.py
+# Face detection + encoding ke backends. RecognitionWorker frames submit karta hai
+# aur poll() se results frame order me wapas leta hai.
+#
+#   LocalRecognitionBackend       : usi thread me detect/encode (purana behaviour)
+#   ProcessPoolRecognitionBackend : worker processes, frames shared memory slots se
+#                                   jaate hain (pickle nahi), GIL se bahar
+import os
+import time
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing import connection as mp_connection
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _overlaps(a, b, min_iou: float = 0.3) -> bool:
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - inter
+    return union > 0 and inter / union >= min_iou
+
+
+def detect_and_encode(rgb_frame, model: str = "hog", skip_boxes=None):
+    """
+    Detects every face but only encodes the ones not covered by `skip_boxes`
+    (already-tracked faces); their slot in the encodings list is None.
+    """
+    import face_recognition
+    locations = face_recognition.face_locations(rgb_frame, model=model)
+    skip_boxes = skip_boxes or []
+    todo = [i for i, loc in enumerate(locations) if not any(_overlaps(loc, box) for box in skip_boxes)]
+    encodings = [None] * len(locations)
+    if todo:
+        computed = face_recognition.face_encodings(rgb_frame, [locations[i] for i in todo])
+        for i, encoding in zip(todo, computed):
+            encodings[i] = encoding
+    return locations, encodings
+
+
+class LocalRecognitionBackend:
+    """Runs detection/encoding synchronously in the caller's thread."""
+
+    kind = "local"
+
+    def __init__(self, model: str = "hog") -> None:
+        self.model = model
+        self._results: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, seq: int, rgb_frame: np.ndarray, skip_boxes=None) -> bool:
+        locations, encodings = detect_and_encode(rgb_frame, self.model, skip_boxes)
+        with self._lock:
+            self._results.setdefault(key, []).append((seq, locations, encodings))
+        return True
+
+    def poll(self, key: str) -> list[tuple[int, list, list]]:
+        with self._lock:
+            return self._results.pop(key, [])
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._results.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"kind": self.kind}
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _pool_worker(slot_names: list[str], conn, model: str) -> None:
+    # Har worker process saare slots ek baar attach karta hai; task apne pipe se
+    # aata hai (shared queue nahi, taaki ek worker ke marne se baaki na atkein)
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    try:
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                break
+            if task is None:
+                break
+            ticket, slot_idx, shape, skip_boxes = task
+            try:
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot_idx].buf)
+                locations, encodings = detect_and_encode(frame, model, skip_boxes)
+                encodings = [None if e is None else np.asarray(e) for e in encodings]
+                conn.send((ticket, locations, encodings, None))
+            except Exception as e:
+                conn.send((ticket, [], [], str(e)))
+    finally:
+        for slot in slots:
+            slot.close()
+
+
+class _KeyState:
+    def __init__(self) -> None:
+        self.inflight: dict[int, tuple[float, int]] = {}  # seq -> (submit time, ticket)
+        self.done: dict[int, tuple[list, list]] = {}
+        self.submitted: list[int] = []  # submit order (= frame order)
+
+
+class _Task:
+    __slots__ = ("slot", "key", "seq", "shape", "skip_boxes", "submitted_at")
+
+    def __init__(self, slot: int, key: str, seq: int, shape, skip_boxes, submitted_at: float) -> None:
+        self.slot = slot
+        self.key = key
+        self.seq = seq
+        self.shape = shape
+        self.skip_boxes = skip_boxes
+        self.submitted_at = submitted_at
+
+
+class _Worker:
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.ticket: int | None = None  # jo task abhi chal raha hai
+        self.started = 0.0
+
+
+class ProcessPoolRecognitionBackend:
+    """
+    Dispatches frames to a pool of worker processes through preallocated
+    shared-memory slots. Each worker gets one task at a time over its own
+    pipe; frames waiting for a worker are kept one per key, and a newer frame
+    replaces the older pending one, so the pool never works through a backlog
+    of stale frames. Results are handed back per key in submit (frame) order.
+
+    Every task carries a ticket that owns its slot. A task that goes stale
+    (`stale_after`), belongs to a released key or ran on a worker that died
+    gives its slot back at once; the worker's late result, if any, no longer
+    matches a ticket and is ignored. Workers that exit or stay busy longer
+    than `hang_timeout` are terminated and respawned.
+    """
+
+    kind = "process"
+
+    def __init__(self, workers: int | None = None, model: str = "hog", max_inflight: int = 2,
+                 slot_bytes: int = 1920 * 1080 * 3, slots: int | None = None, stale_after: float = 5.0,
+                 hang_timeout: float = 30.0) -> None:
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_inflight = max_inflight
+        self.stale_after = stale_after
+        self.hang_timeout = hang_timeout
+        self.slot_bytes = slot_bytes
+        self.model = model
+        self.slot_count = slots or self.workers * 2
+        self._slots = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(self.slot_count)]
+        self._slot_names = [slot.name for slot in self._slots]
+        self._free_slots: list[int] = list(range(self.slot_count))
+
+        self._lock = threading.Lock()
+        self._keys: dict[str, _KeyState] = {}
+        self._tasks: dict[int, _Task] = {}  # ticket -> task jiske paas slot hai
+        self._pending: dict[str, int] = {}  # key -> ticket jo worker ka wait kar raha hai
+        self._tickets = itertools.count(1)
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.errors = 0
+        self.restarts = 0
+        self._closed = False
+
+        # Flask threads wale process me fork safe nahi, isliye spawn
+        self._ctx = mp.get_context("spawn")
+        self._workers = [_Worker(i) for i in range(self.workers)]
+        for worker in self._workers:
+            self._start_worker(worker)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        print(f"Recognition process pool started with {self.workers} workers and {self.slot_count} frame slots.")
+
+    def _start_worker(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_pool_worker, args=(self._slot_names, child_conn, self.model), daemon=True)
+        process.start()
+        child_conn.close()
+        with self._lock:
+            worker.process, worker.conn = process, parent_conn
+            worker.ticket = None
+
+    def _restart_worker(self, worker: _Worker, reason: str) -> None:
+        print(f"Recognition pool worker {worker.index} {reason}; restarting.")
+        with self._lock:
+            if worker.ticket is not None and self._drop_task(worker.ticket):
+                self.dropped += 1
+            worker.ticket = None
+            process, conn = worker.process, worker.conn
+            worker.conn = None
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=1)
+        conn.close()
+        if self._closed:
+            return
+        self._start_worker(worker)
+        with self._lock:
+            self.restarts += 1
+            self._dispatch()
+
+    def _drop_task(self, ticket: int) -> bool:
+        """Frees the ticket's slot and forgets its frame. Caller holds the lock."""
+        task = self._tasks.pop(ticket, None)
+        if task is None:
+            return False
+        self._free_slots.append(task.slot)
+        if self._pending.get(task.key) == ticket:
+            del self._pending[task.key]
+        state = self._keys.get(task.key)
+        if state is not None:
+            state.inflight.pop(task.seq, None)
+        return True
+
+    def _dispatch(self) -> None:
+        """Hands pending frames, oldest first, to idle workers. Caller holds the lock."""
+        idle = [w for w in self._workers if w.conn is not None and w.ticket is None]
+        now = time.monotonic()
+        while idle and self._pending:
+            key, ticket = min(self._pending.items(), key=lambda item: self._tasks[item[1]].submitted_at)
+            task = self._tasks[ticket]
+            if now - task.submitted_at > self.stale_after:
+                self._drop_task(ticket)
+                self.dropped += 1
+                continue
+            del self._pending[key]
+            worker = idle.pop()
+            worker.ticket, worker.started = ticket, now
+            try:
+                worker.conn.send((ticket, task.slot, task.shape, task.skip_boxes))
+            except (OSError, ValueError):
+                # Worker mar chuka hai; collector use restart karke task chhod dega
+                pass
+
+    def submit(self, key: str, seq: int, rgb_frame: np.ndarray, skip_boxes=None) -> bool:
+        if self._closed:
+            return False
+        frame = np.ascontiguousarray(rgb_frame, dtype=np.uint8)
+        if frame.nbytes > self.slot_bytes:
+            print(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes}-byte slot; dropping.")
+            self.dropped += 1
+            return False
+        with self._lock:
+            state = self._keys.setdefault(key, _KeyState())
+            # Naya frame purane pending frame ki jagah leta hai
+            older = self._pending.get(key)
+            if older is not None and self._drop_task(older):
+                self.dropped += 1
+            if len(state.inflight) >= self.max_inflight:
+                self.dropped += 1
+                return False
+            if not self._free_slots and self._pending:
+                oldest = min(self._pending.values(), key=lambda t: self._tasks[t].submitted_at)
+                self._drop_task(oldest)
+                self.dropped += 1
+            if not self._free_slots:
+                self.dropped += 1
+                return False
+            slot_idx = self._free_slots.pop()
+            ticket = next(self._tickets)
+            now = time.monotonic()
+            self._tasks[ticket] = _Task(slot_idx, key, seq, frame.shape, list(skip_boxes or []), now)
+            state.inflight[seq] = (now, ticket)
+            state.submitted.append(seq)
+            self.submitted += 1
+
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=self._slots[slot_idx].buf)[...] = frame
+        with self._lock:
+            if ticket in self._tasks:
+                self._pending[key] = ticket
+                self._dispatch()
+        return True
+
+    def _collect(self) -> None:
+        while not self._closed:
+            with self._lock:
+                conns = {w.conn: w for w in self._workers if w.conn is not None}
+            try:
+                ready = mp_connection.wait(list(conns), timeout=0.5)
+            except (OSError, ValueError):
+                ready = []
+            for conn in ready:
+                worker = conns[conn]
+                if worker.conn is not conn or self._closed:
+                    continue
+                try:
+                    item = conn.recv()
+                except (EOFError, OSError):
+                    self._restart_worker(worker, "exited")
+                    continue
+                self._handle_result(worker, item)
+            self._check_workers()
+
+    def _handle_result(self, worker: _Worker, item) -> None:
+        ticket, locations, encodings, error = item
+        if error:
+            print(f"Recognition pool worker error: {error}")
+        with self._lock:
+            if worker.ticket == ticket:
+                worker.ticket = None
+            self.completed += 1
+            self.errors += bool(error)
+            task = self._tasks.pop(ticket, None)
+            if task is not None:
+                self._free_slots.append(task.slot)
+                state = self._keys.get(task.key)
+                if state is not None and task.seq in state.inflight:
+                    del state.inflight[task.seq]
+                    state.done[task.seq] = (locations, encodings)
+            self._dispatch()
+
+    def _check_workers(self) -> None:
+        now = time.monotonic()
+        for worker in self._workers:
+            if self._closed or worker.conn is None:
+                continue
+            if not worker.process.is_alive():
+                self._restart_worker(worker, f"exited with code {worker.process.exitcode}")
+            elif worker.ticket is not None and now - worker.started > self.hang_timeout:
+                self._restart_worker(worker, f"busy for more than {self.hang_timeout:.0f}s")
+
+    def poll(self, key: str) -> list[tuple[int, list, list]]:
+        """Completed results for `key`, only the in-order prefix of submitted frames."""
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                return []
+            ready = []
+            now = time.monotonic()
+            while state.submitted:
+                seq = state.submitted[0]
+                if seq in state.done:
+                    ready.append((seq, *state.done.pop(seq)))
+                elif seq not in state.inflight:
+                    pass  # pehle hi chhoda ja chuka (naye frame ne hataya / worker mara)
+                elif now - state.inflight[seq][0] > self.stale_after:
+                    # Worker atak gaya: frame chhodo aur slot turant wapas lo
+                    self._drop_task(state.inflight[seq][1])
+                    self.dropped += 1
+                else:
+                    break
+                state.submitted.pop(0)
+            return ready
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            for ticket in [t for t, task in self._tasks.items() if task.key == key]:
+                self._drop_task(ticket)
+            self._keys.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            inflight = sum(len(s.inflight) for s in self._keys.values())
+            pending = len(self._pending)
+            free_slots = len(self._free_slots)
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "alive": sum(w.process is not None and w.process.is_alive() for w in self._workers),
+            "restarts": self.restarts,
+            "inflight": inflight,
+            "pending": pending,
+            "free_slots": free_slots,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+    def shutdown(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._collector.join(timeout=5)
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (AttributeError, OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            if worker.conn is not None:
+                worker.conn.close()
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        print("Recognition process pool stopped.")
+
+
+def create_backend(config: dict):
+    if config.get("backend") == "process":
+        return ProcessPoolRecognitionBackend(workers=config.get("workers"), model=config.get("model", "hog"),
+                                             max_inflight=config.get("max_inflight", 2),
+                                             slot_bytes=config.get("slot_bytes", 1920 * 1080 * 3),
+                                             stale_after=config.get("stale_after", 5.0),
+                                             hang_timeout=config.get("hang_timeout", 30.0))
+    return LocalRecognitionBackend(model=config.get("model", "hog"))
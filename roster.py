@@ -0,0 +1,80 @@
+# roster.py
+# Gallery ke names ("Name_RollNumber") se student roster: roll number -> student
+# aur student -> roll number, dono O(1). Gallery me har image ki ek entry hai,
+# roster me har student ek baar.
+from collections.abc import Iterable
+
+
+class AmbiguousRollNumber(LookupError):
+    """A roll number is the suffix of more than one student's name."""
+
+    def __init__(self, roll_number: str, candidates: list[str]) -> None:
+        super().__init__(f"Roll number {roll_number!r} matches {len(candidates)} students: {', '.join(candidates)}")
+        self.roll_number = roll_number
+        self.candidates = candidates
+
+
+def roll_key(roll_number) -> str:
+    # QR form se aaya input: spaces/case ka farq nahi
+    return str(roll_number).strip().casefold()
+
+
+def split_name(name: str) -> str:
+    """Roll number of a gallery name: the part after the last '_', or the whole name."""
+    return name.rsplit("_", 1)[-1] if "_" in name else name
+
+
+class Roster:
+    """
+    Immutable roll-number index over the gallery's distinct student names.
+
+    Built once per gallery load; a reload builds a new Roster and swaps the
+    reference, so readers never see a half-built index. A roll number shared
+    by several students is kept out of the index and reported as ambiguous
+    instead of resolving to whichever name happened to come first.
+    """
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.students: dict[str, str] = {} # canonical name -> roll number (student ID)
+        self._candidates: dict[str, list[str]] = {}
+        self._index(names)
+
+    def _index(self, names: Iterable[str]) -> None:
+        added = set()
+        for name in names:
+            name = str(name)
+            if name in self.students:
+                continue
+            roll = split_name(name)
+            self.students[name] = roll
+            self._candidates.setdefault(roll_key(roll), []).append(name)
+            added.add(roll_key(roll))
+        self.by_roll = {roll: names[0] for roll, names in self._candidates.items() if len(names) == 1}
+        self.ambiguous = {roll: sorted(names) for roll, names in self._candidates.items() if len(names) > 1}
+        for roll in added & self.ambiguous.keys():
+            print(f"WARNING: Roll number '{roll}' is shared by {self.ambiguous[roll]}; QR lookups for it are rejected.")
+
+    def extended(self, names: Iterable[str]) -> "Roster":
+        """New roster with extra names (enrollment); this one is left untouched."""
+        roster = Roster([])
+        roster.students = dict(self.students)
+        roster._candidates = {roll: list(candidates) for roll, candidates in self._candidates.items()}
+        roster._index(names)
+        return roster
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def lookup(self, roll_number) -> str | None:
+        """Canonical student name for a roll number, None if unknown; raises AmbiguousRollNumber."""
+        key = roll_key(roll_number)
+        name = self.by_roll.get(key)
+        if name is None and key in self.ambiguous:
+            raise AmbiguousRollNumber(str(roll_number).strip(), self.ambiguous[key])
+        return name
+
+    def student_id(self, name: str) -> str | None:
+        return self.students.get(name)
+
+    def stats(self) -> dict:
+        return {"students": len(self.students), "roll_numbers": len(self.by_roll), "ambiguous": len(self.ambiguous)}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests repo root ke modules seedhe import karte hain (app jaisa, bina packaging ke)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+import pytest
+
+import db
+from attendance_sink import AttendanceSinkError, SqliteAttendanceSink
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # Lock par 5s tak na ruko, test jaldi fail/retry kare
+    monkeypatch.setitem(db.PRAGMAS, "busy_timeout", 50)
+    path = str(tmp_path / "attendance.db")
+    conn = db.connect(path)
+    db.migrate(conn)
+    conn.close()
+    return path
+
+
+def row(name, session="attendance_S_F_NA_2026-10-17.csv"):
+    return (session, "F", "S", name, "2026-10-17", "09:05:00", 5, "NA")
+
+
+def count(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+
+
+def test_rows_are_batched_and_duplicates_ignored(db_path):
+    sink = SqliteAttendanceSink(db_path, flush_interval=60)
+    for name in ("Asha_101", "Vijay_102", "Asha_101"):
+        sink.write(row(name))
+    assert sink.flush() == 3
+    sink.close()
+    assert count(db_path) == 2
+    assert sink.stats()["batches"] == 1 and sink.stats()["written"] == 3
+
+
+def test_failed_batch_is_kept_and_retried(db_path):
+    sink = SqliteAttendanceSink(db_path, flush_interval=0.05, max_backoff=0.1)
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    sink.write(row("Asha_101"))
+    sink.write(row("Vijay_102"))
+    deadline = time.monotonic() + 5
+    while sink.stats()["errors"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sink.stats()["errors"] >= 2 and sink.stats()["unwritten"] == 2
+
+    blocker.execute("ROLLBACK")
+    blocker.close()
+    sink.close()
+    assert count(db_path) == 2
+    assert sink.stats()["unwritten"] == 0
+
+
+def test_close_reports_unwritten_rows_and_flush_retries_them(db_path):
+    sink = SqliteAttendanceSink(db_path, flush_interval=60, close_retries=1, max_backoff=0.05)
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    sink.write(row("Asha_101"))
+    with pytest.raises(AttendanceSinkError) as failure:
+        sink.close()
+    assert [r[3] for r in failure.value.rows] == ["Asha_101"]
+
+    blocker.execute("ROLLBACK")
+    blocker.close()
+    assert sink.flush() == 1
+    assert count(db_path) == 1
+
+
+def test_write_after_close_is_rejected(db_path):
+    sink = SqliteAttendanceSink(db_path)
+    sink.close()
+    assert sink.closed
+    with pytest.raises(AttendanceSinkError):
+        sink.write(row("Asha_101"))
@@ -0,0 +1,87 @@
+import os
+import sys
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+from encodings_store import open_store, write_store, new_store_id
+from gallery import load_snapshot, compact_snapshot
+
+
+@pytest.fixture
+def encode_faces(monkeypatch):
+    # Asli face detection nahi chahiye: encode_image ko counting fake se badalna
+    monkeypatch.setitem(sys.modules, "face_recognition", types.ModuleType("face_recognition"))
+    monkeypatch.delitem(sys.modules, "encode_faces", raising=False)
+    import encode_faces
+    calls = []
+
+    def fake_encode_image(image_path, model="hog"):
+        calls.append(os.path.relpath(image_path, os.path.dirname(os.path.dirname(image_path))))
+        with open(image_path, "rb") as f:
+            seed = zlib.crc32(f.read())
+        return encode_faces.file_sha256(image_path), np.random.default_rng(seed).normal(0, 0.1, 128), None
+
+    monkeypatch.setattr(encode_faces, "encode_image", fake_encode_image)
+    encode_faces.calls = calls
+    return encode_faces
+
+
+def add_image(dataset, name, filename):
+    person = dataset / name
+    person.mkdir(parents=True, exist_ok=True)
+    (person / filename).write_bytes(f"{name}/{filename}".encode())
+    return os.path.join(name, filename)
+
+
+def encode(encode_faces, dataset, store, manifest):
+    encode_faces.calls.clear()
+    encode_faces.encode_dataset(str(dataset), str(store), str(manifest), workers=1)
+    return sorted(encode_faces.calls)
+
+
+def test_compaction_keeps_next_encode_incremental(tmp_path, encode_faces):
+    dataset, store, manifest = tmp_path / "dataset", tmp_path / "encodings.bin", tmp_path / "manifest.json"
+    for name in ("Asha_101", "Vijay_102"):
+        for i in range(2):
+            add_image(dataset, name, f"{i}.jpg")
+    assert len(encode(encode_faces, dataset, store, manifest)) == 4
+
+    # App jaisa: enrollment log me append, phir compaction
+    snapshot = load_snapshot(str(store), "store")
+    enrolled = np.full((1, 128), 0.2, dtype=np.float32)
+    snapshot.log.append(enrolled, ["Ravi_103"])
+    snapshot = snapshot.extended(enrolled, ["Ravi_103"], version=1)
+    compact_snapshot(snapshot, str(manifest))
+
+    compacted = load_snapshot(str(store), "store")
+    assert len(compacted) == 5 and compacted.log.rows == 0
+    assert compacted.names[4] == "Ravi_103"
+    del snapshot, compacted
+
+    # /api/enroll image dataset me bhi save karta hai: agla run sirf wahi encode kare
+    new_image = add_image(dataset, "Ravi_103", "enroll_0.jpg")
+    assert encode(encode_faces, dataset, store, manifest) == [new_image]
+    store_view = open_store(str(store))
+    assert len(store_view) == 5 and sorted(set(store_view.names)) == ["Asha_101", "Ravi_103", "Vijay_102"]
+
+
+@pytest.mark.parametrize("crash_after", ["manifest_staged", "store_written"])
+def test_compaction_crash_keeps_manifest_valid(tmp_path, encode_faces, crash_after):
+    dataset, store, manifest = tmp_path / "dataset", tmp_path / "encodings.bin", tmp_path / "manifest.json"
+    for i in range(3):
+        add_image(dataset, "Asha_101", f"{i}.jpg")
+    encode(encode_faces, dataset, store, manifest)
+
+    # compact_snapshot ke beech ke steps, jaise crash wahin ho gaya
+    base = open_store(str(store))
+    rows, names, old_id = np.array(base.encodings), list(base.names), base.store_id
+    del base
+    new_id = new_store_id()
+    assert encode_faces.retarget_manifest(str(manifest), str(store), [old_id, new_id])
+    if crash_after == "store_written":
+        write_store(str(store), np.vstack([rows, np.full((1, 128), 0.2)]), names + ["Ravi_103"], store_id=new_id)
+
+    assert encode(encode_faces, dataset, store, manifest) == []
@@ -0,0 +1,72 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from consolidate import consolidate_gallery, consolidate_store
+from encodings_store import open_store, write_store, EncodingLog, LOG_SUFFIX
+from gallery import load_snapshot, compact_snapshot, select_source
+
+
+def students(rng, names, per_student=4):
+    rows, labels = [], []
+    for name in names:
+        center = rng.normal(0, 0.35, 128)
+        rows.extend(center + rng.normal(0, 0.02, (per_student, 128)))
+        labels.extend([name] * per_student)
+    return np.asarray(rows, dtype=np.float32), labels
+
+
+@pytest.fixture
+def stores(tmp_path):
+    rng = np.random.default_rng(5)
+    full, templates = str(tmp_path / "encodings.bin"), str(tmp_path / "encodings.templates.bin")
+    encodings, names = students(rng, ["Asha_101", "Vijay_102", "Meena_103"])
+    write_store(full, encodings, names)
+    consolidate_store(full, templates, manifest_path=None)
+    return rng, full, templates
+
+
+def test_outliers_are_dropped_and_tight_students_get_one_template():
+    rng = np.random.default_rng(1)
+    encodings, names = students(rng, ["Asha_101"], per_student=5)
+    encodings = np.vstack([encodings, rng.normal(0, 0.35, (1, 128)).astype(np.float32)])
+    templates, template_names, dropped = consolidate_gallery(encodings, names + ["Asha_101"])
+    assert template_names == ["Asha_101"] and dropped == [5]
+
+
+def test_consolidation_reads_the_enrollment_log_without_touching_it(stores):
+    rng, full, templates = stores
+    log = EncodingLog(full + LOG_SUFFIX, open_store(full).store_id)
+    log.reset()
+    enrolled, enrolled_names = students(rng, ["Ravi_104"], per_student=2)
+    log.append(enrolled, enrolled_names)
+    before = open(log.path, "rb").read()
+
+    consolidate_store(full, templates, manifest_path=None)
+    assert "Ravi_104" in set(open_store(templates).names)
+    assert open(log.path, "rb").read() == before
+
+
+def test_enrollment_over_templates_survives_compaction_and_reconsolidation(stores, monkeypatch):
+    monkeypatch.setitem(sys.modules, "face_recognition", types.ModuleType("face_recognition"))
+    rng, full, templates = stores
+    assert select_source(full, templates, "missing.pickle") == (templates, "store")
+
+    # App jaisa: templates load, enrollment full store ke log me
+    snapshot = load_snapshot(templates, "store", enrollment_store=full)
+    assert snapshot.log.path == full + LOG_SUFFIX
+    enrolled, enrolled_names = students(rng, ["Ravi_104"], per_student=2)
+    snapshot.log.append(enrolled, enrolled_names)
+    snapshot = snapshot.extended(enrolled, enrolled_names, version=1)
+
+    assert compact_snapshot(snapshot, None) == full
+    del snapshot
+    assert list(open_store(full).names).count("Ravi_104") == 2
+
+    # consolidate.py dobara chalana kisi enrolled student ko nahi hatata
+    consolidate_store(full, templates, manifest_path=None)
+    reloaded = load_snapshot(templates, "store", enrollment_store=full)
+    assert set(reloaded.names) == {"Asha_101", "Vijay_102", "Meena_103", "Ravi_104"}
+    assert reloaded.log.rows == 0
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+from encodings_store import _STORE_ID_OFFSET, open_store, write_store, store_id, new_store_id, EncodingLog, LOG_SUFFIX
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "encodings.bin")
+    rng = np.random.default_rng(3)
+    encodings = rng.normal(0, 0.35, (5, 128)).astype(np.float32)
+    names = ["Asha_101", "Asha_101", "Vijay_102", "Meena_103", "Vijay_102"]
+    write_store(path, encodings, names)
+    return path, encodings, names
+
+
+def enrolled(n, seed=9):
+    return np.random.default_rng(seed).normal(0, 0.35, (n, 128)).astype(np.float32)
+
+
+def test_store_roundtrip_and_id(store):
+    path, encodings, names = store
+    view = open_store(path)
+    assert len(view) == 5 and list(view.names) == names
+    assert np.array_equal(view.encodings, encodings)
+    assert np.allclose(view.norms_sq, (encodings ** 2).sum(axis=1), rtol=1e-5)
+    assert store_id(path) == view.store_id
+
+    # Rewrite = naya id, purane log ke liye base badal gaya
+    write_store(path, encodings, names)
+    assert store_id(path) != view.store_id
+    chosen = new_store_id()
+    write_store(path, encodings, names, store_id=chosen)
+    assert store_id(path) == chosen
+    assert store_id(path + ".missing") is None
+
+
+def test_store_without_id_falls_back_to_file_identity(store):
+    path, _, _ = store
+    with open(path, "r+b") as f:
+        f.seek(_STORE_ID_OFFSET)  # Pehle ke stores me yahan zeros the
+        f.write(b"\0" * 16)
+    legacy = store_id(path)
+    assert legacy and legacy == open_store(path).store_id and legacy == store_id(path)
+
+
+def test_log_appends_and_replays(store):
+    path, _, _ = store
+    log = EncodingLog(path + LOG_SUFFIX, store_id(path))
+    assert log.replay() == ([], [])  # Missing log: khali bana diya
+    rows = enrolled(3)
+    log.append(rows[:2], ["Ravi_104", "Ravi_104"])
+    log.append(rows[2:], ["Sita_105"])
+
+    replayed = EncodingLog(log.path, store_id(path))
+    encodings, names = replayed.replay()
+    assert names == ["Ravi_104", "Ravi_104", "Sita_105"] and replayed.rows == 3
+    assert np.array_equal(np.vstack(encodings), rows)
+
+
+def test_torn_tail_is_ignored_by_read_and_truncated_by_replay(store):
+    path, _, _ = store
+    log = EncodingLog(path + LOG_SUFFIX, store_id(path))
+    log.reset()
+    log.append(enrolled(1), ["Ravi_104"])
+    complete = os.path.getsize(log.path)
+    log.append(enrolled(1, seed=10), ["Sita_105"])
+    with open(log.path, "r+b") as f:
+        f.truncate(complete + 20)  # Crash: doosra record aadha likha
+
+    assert log.read()[1] == ["Ravi_104"]
+    assert os.path.getsize(log.path) == complete + 20
+    assert log.replay()[1] == ["Ravi_104"]
+    assert os.path.getsize(log.path) == complete
+
+    # Truncate ke baad append phir se valid record banata hai
+    log.append(enrolled(1, seed=11), ["Sita_105"])
+    assert EncodingLog(log.path, store_id(path)).read()[1] == ["Ravi_104", "Sita_105"]
+
+
+def test_corrupt_record_stops_the_replay(store):
+    path, _, _ = store
+    log = EncodingLog(path + LOG_SUFFIX, store_id(path))
+    log.reset()
+    log.append(enrolled(2), ["Ravi_104", "Sita_105"])
+    with open(log.path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    assert log.replay()[1] == ["Ravi_104"]
+
+
+def test_log_of_an_older_store_is_reset(store):
+    path, encodings, names = store
+    log = EncodingLog(path + LOG_SUFFIX, store_id(path))
+    log.reset()
+    log.append(enrolled(1), ["Ravi_104"])
+    before = open(log.path, "rb").read()
+    write_store(path, encodings, names)  # encode_faces.py ka naya run
+
+    stale = EncodingLog(log.path, store_id(path))
+    assert stale.read() == ([], [])
+    assert open(log.path, "rb").read() == before  # read() file ko nahi chhoota
+    assert stale.replay() == ([], [])
+    assert stale.read() == ([], []) and stale.rows == 0
+    stale.append(enrolled(1), ["Sita_105"])
+    assert EncodingLog(log.path, store_id(path)).read()[1] == ["Sita_105"]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from face_matcher import FaceMatcher
+
+
+@pytest.fixture
+def gallery():
+    rng = np.random.default_rng(7)
+    centers = rng.normal(0, 0.35, (300, 128)).astype(np.float32)
+    encodings = np.repeat(centers, 4, axis=0) + rng.normal(0, 0.03, (1200, 128)).astype(np.float32)
+    names = [f"Student_{i // 4}" for i in range(len(encodings))]
+    return rng, centers, encodings, names
+
+
+def test_ivf_probing_every_list_matches_exact(gallery):
+    rng, centers, encodings, names = gallery
+    ivf = FaceMatcher(encodings, names, index="ivf", nlist=20)
+    exact = FaceMatcher(encodings, names, index="exact")
+    ivf.nprobe = 20
+    queries = np.vstack([centers[:50] + rng.normal(0, 0.03, (50, 128)), rng.normal(0, 0.35, (10, 128))])
+
+    idx, dist = ivf.search(queries, k=3)
+    ex_idx, ex_dist = exact.search(queries, k=3)
+    assert np.allclose(dist, ex_dist, atol=1e-4)
+    assert [n for n, _ in ivf.match(queries)] == [n for n, _ in exact.match(queries)]
+
+
+def test_unknown_faces_skip_the_exact_scan_by_default(gallery, monkeypatch):
+    rng, _, encodings, names = gallery
+    matcher = FaceMatcher(encodings, names, index="ivf")
+
+    def no_exact(*args, **kwargs):
+        raise AssertionError("exact scan ran")
+
+    monkeypatch.setattr(matcher.exact_index, "search", no_exact)
+    results = matcher.match(rng.normal(0, 0.35, (5, 128)))
+    assert [name for name, _ in results] == ["Unknown"] * 5
+
+
+def test_sampled_recall_is_reported(gallery):
+    rng, centers, encodings, names = gallery
+    matcher = FaceMatcher(encodings, names, index="ivf", nlist=10, recall_sample=2)
+    matcher.nprobe = 10
+    for _ in range(4):
+        matcher.match(centers[:5] + rng.normal(0, 0.03, (5, 128)))
+    assert matcher.stats()["sampled_recall"] == 1.0
+
+
+def test_recall_and_search_cover_appended_rows(gallery, monkeypatch):
+    rng, centers, encodings, names = gallery
+    matcher = FaceMatcher(encodings, names, index="ivf", nlist=10)
+    new_face = rng.normal(0, 0.35, (1, 128)).astype(np.float32)
+    extended = matcher.extended(new_face, ["Ravi_103"])
+
+    assert extended.match(new_face + 0.01)[0][0] == "Ravi_103"
+    # Base index har baar galat row de: delta row phir bhi dono searches me nearest hai
+    monkeypatch.setattr(extended.index, "search",
+                        lambda q, k=1: (np.zeros((len(q), k), dtype=np.int64), np.full((len(q), k), 9.0, dtype=np.float32)))
+    assert extended.measure_recall(new_face) == 1.0
+    assert extended.measure_recall(centers[:5]) == 0.0
@@ -0,0 +1,119 @@
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from recognition_pool import ProcessPoolRecognitionBackend
+
+# Spawned workers parent ka sys.path lete hain, isliye yeh fake unhe bhi milta hai.
+# Frame ka pehla pixel = detection me kitne deciseconds lagenge.
+FAKE_FACE_RECOGNITION = """
+import time
+
+def face_locations(frame, model="hog"):
+    time.sleep(int(frame[0, 0, 0]) / 10)
+    return [(0, 10, 10, 0)]
+
+def face_encodings(frame, locations):
+    return [[float(frame[0, 0, 0])] * 128 for _ in locations]
+"""
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    (tmp_path / "face_recognition.py").write_text(FAKE_FACE_RECOGNITION)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    backends = []
+
+    def make(**kwargs):
+        kwargs.setdefault("slot_bytes", 64 * 64 * 3)
+        backend = ProcessPoolRecognitionBackend(model="hog", **kwargs)
+        backends.append(backend)
+        return backend
+
+    yield make
+    for backend in backends:
+        backend.shutdown()
+
+
+def frame(delay):
+    image = np.zeros((32, 32, 3), dtype=np.uint8)
+    image[0, 0, 0] = delay
+    return image
+
+
+def wait_for(predicate, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def collect(backend, key, count, timeout=20.0):
+    results = []
+    wait_for(lambda: results.extend(backend.poll(key)) or len(results) >= count, timeout)
+    return results
+
+
+def busy_worker(backend):
+    assert wait_for(lambda: any(w.ticket is not None for w in backend._workers))
+    return next(w for w in backend._workers if w.ticket is not None)
+
+
+def test_killed_worker_is_respawned_and_its_slot_reclaimed(pool):
+    backend = pool(workers=2)
+    assert backend.submit("cam", 1, frame(1))
+    assert [r[0] for r in collect(backend, "cam", 1)] == [1]
+
+    # Kaam karte hue worker ko maar do
+    assert backend.submit("cam", 2, frame(100))
+    victim = busy_worker(backend)
+    os.kill(victim.process.pid, signal.SIGKILL)
+
+    assert wait_for(lambda: backend.stats()["restarts"] == 1 and backend.stats()["alive"] == 2)
+    stats = backend.stats()
+    assert stats["inflight"] == 0 and stats["free_slots"] == backend.slot_count
+
+    for seq in range(3, 3 + backend.slot_count + 2):
+        assert backend.submit("cam", seq, frame(0))
+        assert [r[0] for r in collect(backend, "cam", 1)] == [seq]
+    assert backend.stats()["free_slots"] == backend.slot_count
+
+
+def test_hung_worker_is_restarted(pool):
+    backend = pool(workers=1, hang_timeout=1.0)
+    assert backend.submit("cam", 1, frame(250))
+    busy_worker(backend)
+
+    assert wait_for(lambda: backend.stats()["restarts"] == 1)
+    assert backend.submit("cam", 2, frame(0))
+    assert [r[0] for r in collect(backend, "cam", 1)] == [2]
+    assert backend.stats()["free_slots"] == backend.slot_count
+
+
+def test_stale_task_gives_its_slot_back(pool):
+    backend = pool(workers=1, slots=2, stale_after=0.5)
+    assert backend.submit("cam", 1, frame(20))
+    busy_worker(backend)
+    time.sleep(0.7)
+    assert backend.poll("cam") == []
+    assert backend.stats()["free_slots"] == 2
+
+    # Late result ko koi ticket nahi milta, slot dobara free nahi hota
+    assert wait_for(lambda: backend._workers[0].ticket is None)
+    assert backend.stats()["free_slots"] == 2
+
+
+def test_newer_frame_replaces_pending_one(pool):
+    backend = pool(workers=1, max_inflight=2)
+    assert backend.submit("cam", 1, frame(5))
+    busy_worker(backend)
+    assert backend.submit("cam", 2, frame(0))
+    assert backend.submit("cam", 3, frame(0))
+
+    assert [r[0] for r in collect(backend, "cam", 2)] == [1, 3]
+    assert backend.stats()["dropped"] == 1
@@ -0,0 +1,31 @@
+import pytest
+
+from roster import AmbiguousRollNumber, Roster
+
+
+def test_lookup_is_per_student_and_ignores_case_and_spaces():
+    roster = Roster(["Asha_101", "Asha_101", "Vijay_ab12", "Meena"])
+    assert len(roster) == 3
+    assert roster.lookup(" 101 ") == "Asha_101"
+    assert roster.lookup("AB12") == "Vijay_ab12"
+    assert roster.lookup("Meena") == "Meena"
+    assert roster.lookup("999") is None
+    assert roster.student_id("Vijay_ab12") == "ab12"
+
+
+def test_shared_roll_number_is_rejected_not_guessed():
+    roster = Roster(["Asha_101", "Anil_101", "Vijay_102"])
+    with pytest.raises(AmbiguousRollNumber) as ambiguous:
+        roster.lookup("101")
+    assert ambiguous.value.candidates == ["Anil_101", "Asha_101"]
+    assert roster.lookup("102") == "Vijay_102"
+    assert roster.stats() == {"students": 3, "roll_numbers": 1, "ambiguous": 1}
+
+
+def test_enrollment_can_make_a_roll_number_ambiguous():
+    roster = Roster(["Asha_101"])
+    extended = roster.extended(["Anil_101", "Ravi_104"])
+    assert roster.lookup("101") == "Asha_101"  # Purana roster waisa hi
+    with pytest.raises(AmbiguousRollNumber):
+        extended.lookup("101")
+    assert extended.lookup("104") == "Ravi_104"